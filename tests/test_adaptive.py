@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from scipy.interpolate import NearestNDInterpolator
+
+from tm_solarshift.analysis import adaptive
+
+
+def step(X: np.ndarray) -> np.ndarray:
+    return (np.sqrt(((X - 0.3)**2).sum(axis=1)) < 0.4).astype(float)
+
+
+def contour_error(X: np.ndarray) -> float:
+    X_test = np.random.default_rng(0).random((20000, 2))
+    y_pred = NearestNDInterpolator(X, step(X))(X_test)
+    return np.mean((y_pred > 0.5) != (step(X_test) > 0.5))
+
+
+def test_propose_resolves_contour():
+    grid = np.linspace(0, 1, 3)
+    X = np.array([[a, b] for a in grid for b in grid])
+    while len(X) < 160:
+        (points, scores) = adaptive.propose(
+            X, step(X)[:, np.newaxis], 8, thresholds=[0.5], seed=len(X)
+        )
+        assert points.shape == (8, 2)
+        assert np.all((points >= 0) & (points <= 1))
+        X = np.vstack([X, points])
+
+    grid = np.linspace(0, 1, 40)
+    X_grid = np.array([[a, b] for a in grid for b in grid])
+    assert contour_error(X) < contour_error(X_grid)
+
+
+def test_propose_failed_runs():
+    grid = np.linspace(0, 1, 4)
+    X = np.array([[a, b] for a in grid for b in grid])
+    Y = step(X)[:, np.newaxis]
+    Y_failed = Y.copy()
+    Y_failed[0] = np.nan
+
+    (_, scores) = adaptive.propose(X, Y, 4, thresholds=[0.5], seed=1)
+    (_, scores_failed) = adaptive.propose(X, Y_failed, 4, thresholds=[0.5], seed=1)
+
+    # a single failed run does not drop the output from the refinement
+    assert scores_failed.max() > 0.
+    assert scores_failed.max() == pytest.approx(scores.max(), rel=0.5)
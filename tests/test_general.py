@@ -1,8 +1,10 @@
+import asyncio
 from copy import deepcopy
 import pandas as pd
 import pytest
 
-from tm_solarshift.general import Simulation
+from tm_solarshift.general import (Simulation, run_simulations_async)
+from tm_solarshift.models.gas_heater import GasHeaterInstantaneous
 from tm_solarshift.constants import SIMULATIONS_IO
 from tm_solarshift.utils.units import Variable
 
@@ -20,6 +22,52 @@ def test_load_ts_all(sim_default: Simulation):
     assert len(ts) == expected_len
 
 
+def test_load_ts_parallel(sim_default: Simulation):
+    sim = deepcopy(sim_default)
+    ts_types = ["weather", "HWDP", "economic", "emissions"]
+    ts = sim.load_ts(ts_types = ts_types)
+    ts_parallel = sim.load_ts(ts_types = ts_types, parallel = True)
+
+    assert ts.equals(ts_parallel)
+    assert set(f"ts_{ts_type}" for ts_type in ts_types).issubset(sim.out["timings"])
+
+
+def test_clone(sim_default: Simulation):
+    sim_base = sim_default.clone()
+    sim_base.out = {"df_tm": pd.DataFrame()}
+    sim = sim_base.clone({
+        "household.location": "Melbourne",
+        "DEWH.nom_power": Variable(5.0, "kW"),
+    })
+
+    assert sim.household.location == "Melbourne"
+    assert sim_base.household.location == "Sydney"
+    assert sim_base.DEWH.nom_power.get_value("kW") != 5.0
+    assert sim.out == {}
+    sim.weather.location = "Melbourne"
+    assert sim_base.weather.location == "Sydney"
+
+
+def test_run_simulations_async(sim_default: Simulation):
+    sims = []
+    for i in range(3):
+        sim = deepcopy(sim_default)
+        sim.id = i + 1
+        sim.time_params.STOP = Variable(24, "hr")
+        sim.DEWH = GasHeaterInstantaneous()
+        sims.append(sim)
+    asyncio.run(run_simulations_async(sims, max_concurrent=2))
+
+    sim_sync = deepcopy(sims[0])
+    sim_sync.run_simulation()
+    expected_len = sim_sync.time_params.PERIODS.get_value()
+
+    for sim in sims:
+        assert len(sim.out["df_tm"]) == expected_len
+        assert "thermal_model" in sim.out["timings"]
+    assert sim_sync.out["overall_tm"] == sims[0].out["overall_tm"]
+
+
 # @pytest.mark.parametrize("control_type", [
 #     "GS", "CL1", "CL2", "CL3", "timer", "diverter"
 # ])
@@ -39,3 +87,85 @@ def test_load_ts_all(sim_default: Simulation):
 #     assert (len(df_tm) == expected_len)
 #     assert (set(expected_cols_sim).issubset(set(df_tm.columns.to_list())))
 #     assert (set(expected_keys_tm).issubset(set(overall_tm.keys())))
+
+
+def test_kmedoids():
+    import numpy as np
+    from tm_solarshift.analysis.representative import kmedoids
+    rng = np.random.default_rng(0)
+    centres = np.array([[0., 0.], [10., 0.], [0., 10.]])
+    X = np.concatenate([centre + rng.normal(scale=0.5, size=(20, 2)) for centre in centres])
+    (medoids, labels) = kmedoids(X, 3, seed=1)
+
+    assert list(medoids) == sorted(medoids)
+    assert sorted(np.bincount(labels)) == [20, 20, 20]
+    for c in range(3):
+        assert len(set(labels[20*c:20*(c+1)])) == 1
+
+
+def test_representative_days():
+    from tm_solarshift.analysis.representative import relative_error
+    sim = Simulation()
+    sim.DEWH = GasHeaterInstantaneous()
+    sim.time_params.STOP = Variable(24*28, "hr")
+    sim.run_simulation()
+    sim_rep = sim.clone({"time_params.REP_DAYS": Variable(7, "d")})
+    sim_rep.run_simulation()
+
+    info = sim_rep.out["representative"]
+    errors = relative_error(
+        sim.out["overall_tm"] | sim.out["overall_econ"],
+        sim_rep.out["overall_tm"] | sim_rep.out["overall_econ"],
+    )
+    assert sim_rep.out["df_tm"].index.equals(sim.out["df_tm"].index)
+    assert (len(info["days"]), sum(info["weights"])) == (7, 28)
+    assert errors["heater_heat_acum"] < 0.1
+    assert errors["annual_hw_household_cost"] < 0.1
+    # the error of the daily draws is a good estimate of the error of the results
+    assert errors["E_HWD_acum"] == pytest.approx(info["input_error"]["m_HWD"], abs=0.01)
+
+
+def test_representative_days_dated_inputs():
+    from tm_solarshift.analysis import representative
+    from tm_solarshift.models.solar_thermal import SolarThermalElecAuxiliary
+
+    class CollectorInputs(SolarThermalElecAuxiliary):
+        # the collector inputs the thermal model would receive, without running TRNSYS
+        def run_thermal_model(self, ts: pd.DataFrame, verbose: bool = False) -> pd.DataFrame:
+            self.index = ts.index
+            return self._collector_inputs(ts)
+
+    sim = Simulation()
+    sim.DEWH = CollectorInputs()
+    sim.time_params.STOP = Variable(24*28, "hr")
+    sim.time_params.REP_DAYS = Variable(4, "d")
+    ts_tm = sim.create_ts_tm()
+    df_tm = representative.run_thermal_model(sim, ts_tm)
+    ts_dated = sim.DEWH.dated_inputs(ts_tm)
+
+    # the representative days keep the sun position of their real dates
+    for day in sim.out["representative"]["days"]:
+        rows = slice(day, day + pd.Timedelta(hours=23, minutes=59))
+        assert df_tm.loc[rows, "plane_irrad"].equals(ts_dated.loc[rows, "plane_irrad"])
+        assert df_tm.loc[rows, "cosine_aoi"].equals(ts_dated.loc[rows, "cosine_aoi"])
+    # an index without freq (e.g. read from a csv) gives the same results
+    ts_csv = ts_tm.copy()
+    ts_csv.index = pd.DatetimeIndex(ts_tm.index.to_list())
+    assert ts_csv.index.freq is None
+    assert representative.run_thermal_model(sim, ts_csv).equals(df_tm)
+    assert (sim.DEWH.index[1:] - sim.DEWH.index[:-1] == ts_tm.index[1] - ts_tm.index[0]).all()
+
+
+def test_representative_days_solar_thermal():
+    from tm_solarshift.analysis.representative import relative_error
+    from tm_solarshift.models.solar_thermal import SolarThermalElecAuxiliary
+    sim = Simulation()
+    sim.DEWH = SolarThermalElecAuxiliary()
+    sim.time_params.STOP = Variable(24*28, "hr")
+    sim.run_simulation()
+    sim_rep = sim.clone({"time_params.REP_DAYS": Variable(7, "d")})
+    sim_rep.run_simulation()
+
+    errors = relative_error(sim.out["overall_tm"], sim_rep.out["overall_tm"])
+    assert errors["heater_heat_acum"] < 0.1
+    assert errors["E_HWD_acum"] < 0.1
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from scipy.stats import qmc
+
+from tm_solarshift.general import Simulation
+from tm_solarshift.analysis import optimisation
+from tm_solarshift.models.gas_heater import GasHeaterInstantaneous
+from tm_solarshift.utils.units import (Variable, VariableList)
+
+
+def test_propose_batch_constrained():
+    objective = lambda X: (X[:,0] - 0.7)**2 + (X[:,1] - 0.2)**2
+    X = qmc.LatinHypercube(d=2, seed=1).random(8)
+    for batch in range(6):
+        (points, acquisition) = optimisation.propose_batch(
+            X, objective(X), 4, constraints=[(X[:,0], None, 0.5)], seed=batch,
+        )
+        assert points.shape == (4, 2)
+        assert len(np.unique(points, axis=0)) == 4
+        X = np.vstack([X, points])
+
+    feasible = X[:,0] <= 0.5
+    best = X[feasible][np.argmin(objective(X[feasible]))]
+    assert np.allclose(best, [0.5, 0.2], atol=0.05)
+
+
+def test_optimise():
+    sim_base = Simulation()
+    sim_base.DEWH = GasHeaterInstantaneous()
+    sim_base.time_params.STOP = Variable(24, "hr")
+    params_in = {"DEWH.nom_power": VariableList([120., 160.], "MJ/hr")}
+
+    (best, runs) = optimisation.optimise(
+        params_in, objective="E_HWD_acum",
+        constraints={"E_HWD_acum": (6.0, None)},
+        sim_base=sim_base, n_initial=4, batch_size=2, max_runs=10, seed=1,
+        verbose=False,
+    )
+
+    assert len(runs) <= 10
+    assert runs["feasible"].any()
+    assert best["E_HWD_acum"] >= 6.0
+    assert best["E_HWD_acum"] == runs.loc[runs["feasible"], "E_HWD_acum"].min()
+
+
+def test_optimise_failed_runs():
+    X = qmc.LatinHypercube(d=2, seed=1).random(4)
+    nan = np.full(4, np.nan)
+    # without results of the objective (or of a constraint) the batch is random
+    (points, acquisition) = optimisation.propose_batch(X, nan, 2, seed=1)
+    assert points.shape == (2, 2) and np.isnan(acquisition).all()
+    (points, _) = optimisation.propose_batch(X, X[:,0], 2, constraints=[(nan, None, 0.5)], seed=1)
+    assert points.shape == (2, 2)
+
+    sim_base = Simulation()
+    sim_base.DEWH = GasHeaterInstantaneous()
+    sim_base.time_params.STOP = Variable(24, "hr")
+    sim_base.household.location = "Atlantis"
+    params_in = {"DEWH.nom_power": VariableList([120., 160.], "MJ/hr")}
+    with pytest.warns(UserWarning, match="failed"):
+        with pytest.raises(ValueError, match="none of the 6 runs produced E_HWD_acum"):
+            optimisation.optimise(
+                params_in, objective="E_HWD_acum",
+                constraints={"E_HWD_acum": (6.0, None)},
+                sim_base=sim_base, n_initial=2, batch_size=2, max_runs=6, seed=1,
+                verbose=False,
+            )
+
+
+def test_non_dominated_sort():
+    F = np.array([[1., 4.], [2., 2.], [4., 1.], [3., 3.], [4., 4.], [2., 2.]])
+    rank = optimisation.non_dominated_sort(F)
+    crowding = optimisation.crowding_distance(F[rank == 0])
+
+    assert rank.tolist() == [0, 0, 0, 1, 2, 0]
+    assert np.isinf(crowding).sum() == 2
+
+
+def test_pareto_search():
+    sim_base = Simulation()
+    sim_base.DEWH = GasHeaterInstantaneous()
+    sim_base.time_params.STOP = Variable(24, "hr")
+    params_in = {
+        "DEWH": [GasHeaterInstantaneous()],
+        "DEWH.nom_power": VariableList([120., 160.], "MJ/hr"),
+        "DEWH.deltaT_rise": VariableList([20., 30.], "dgrC"),
+        "household.location": ["Sydney", "Melbourne"],
+    }
+    objectives = {"E_HWD_acum": "min", "heater_heat_acum": "max"}
+
+    (front, runs) = optimisation.pareto_search(
+        params_in, objectives, sim_base=sim_base,
+        pop_size=4, n_generations=2, seed=1, verbose=False,
+    )
+
+    assert len(runs) <= 8
+    assert set(runs["generation"]) <= {0, 1}
+    assert front.index.isin(runs.index).all()
+    F = front[list(objectives)].to_numpy() * np.array([1., -1.])
+    assert (optimisation.non_dominated_sort(F) == 0).all()
+    assert sim_base.DEWH.nom_power.get_value("MJ/hr") == 157.
@@ -0,0 +1,439 @@
+import os
+import sys
+import pytest
+from tempfile import TemporaryDirectory
+
+from tm_solarshift.general import Simulation
+from tm_solarshift.analysis import parametric
+from tm_solarshift.analysis.results import ResultsStore
+from tm_solarshift.models.gas_heater import GasHeaterInstantaneous
+from tm_solarshift.utils.units import (Variable, VariableList)
+
+PARAMS_OUT = ["heater_heat_acum", "heater_power_acum", "annual_hw_household_cost"]
+
+@pytest.fixture(scope="module")
+def sim_base():
+    sim = Simulation()
+    sim.DEWH = GasHeaterInstantaneous()
+    sim.time_params.STOP = Variable(24, "hr")
+    return sim
+
+
+def test_analysis_n_workers(sim_base: Simulation):
+    params_in = {
+        "household.location": ["Sydney", "Melbourne"],
+        "DEWH.nom_power": VariableList([20., 30.], "kW"),
+    }
+    (cases_in, units_in) = parametric.settings(params_in)
+    runs_serial = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, verbose=False,
+    )
+    runs_parallel = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, n_workers=2, verbose=False,
+    )
+
+    assert runs_parallel.index.equals(cases_in.index)
+    assert runs_parallel.equals(runs_serial)
+
+
+def test_execution_options(sim_base: Simulation):
+    execution = parametric.ExecutionOptions(n_workers=2, prefetch=False)
+    assert execution.mode == "pool"
+    assert parametric.execution_options(execution, pipeline=True).mode == "pipeline"
+    assert parametric.execution_options(execution, n_workers=1).mode == "serial"
+    assert execution.n_workers == 2
+    with pytest.raises(ValueError):
+        parametric.execution_options(path_queue="queue.db", pipeline=True).mode
+    with pytest.raises(TypeError):
+        parametric.execution_options(n_threads=2)
+
+    (cases_in, units_in) = parametric.settings({"household.location": ["Sydney", "Melbourne"]})
+    runs_options = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, execution=execution, verbose=False,
+    )
+    runs_kwargs = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, n_workers=2, prefetch=False, verbose=False,
+    )
+    assert runs_options.equals(runs_kwargs)
+
+
+def test_analysis_resume(sim_base: Simulation):
+    params_in = {"DEWH.nom_power": VariableList([20., 25., 30.], "kW")}
+    (cases_in, units_in) = parametric.settings(params_in)
+    with TemporaryDirectory() as tmpdir:
+        path_store = os.path.join(tmpdir, "runs.db")
+        runs_first = parametric.analysis(
+            cases_in.iloc[:2], units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_store=path_store, verbose=False,
+        )
+        runs_all = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_store=path_store, resume=True, verbose=False,
+        )
+        with ResultsStore(path_store) as results_store:
+            stored = results_store.load()
+
+    assert len(stored) == 3
+    assert runs_all.iloc[:2].equals(runs_first)
+    assert runs_all["heater_heat_acum"].notna().all()
+
+
+def test_analysis_resume_tuple_index(sim_base: Simulation):
+    import pandas as pd
+    params_in = {"DEWH.nom_power": VariableList([20., 25., 30.], "kW")}
+    (cases_in, units_in) = parametric.settings(params_in)
+    cases_in.index = pd.MultiIndex.from_tuples([("a", 0), ("a", 1), ("b", 0)])
+    with TemporaryDirectory() as tmpdir:
+        path_store = os.path.join(tmpdir, "runs.db")
+        parametric.analysis(
+            cases_in.iloc[:2], units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_store=path_store, verbose=False,
+        )
+        runs_all = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_store=path_store, resume=True, verbose=False,
+        )
+        with ResultsStore(path_store) as results_store:
+            assert results_store.completed() == {("a", 0), ("a", 1), ("b", 0)}
+            (params_stored, _) = results_store.get(("a", 1))
+
+    assert params_stored["DEWH.nom_power"] == 25.
+    assert runs_all.attrs["thermal_runs"] == 1
+    assert runs_all["heater_heat_acum"].notna().all()
+
+
+def test_analysis_store_components(sim_base: Simulation):
+    heater_large = GasHeaterInstantaneous()
+    heater_large.nom_power = Variable(200., "MJ/hr")
+    params_in = {
+        "DEWH": [GasHeaterInstantaneous(), heater_large],
+        "household.location": ["Sydney", "Melbourne"],
+    }
+    (cases_in, units_in) = parametric.settings(params_in)
+    with TemporaryDirectory() as tmpdir:
+        path_store = os.path.join(tmpdir, "runs.db")
+        runs_first = parametric.analysis(
+            cases_in.iloc[:3], units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_store=path_store, verbose=False,
+        )
+        runs_all = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_store=path_store, resume=True, verbose=False,
+        )
+        with ResultsStore(path_store) as results_store:
+            (params_stored, _) = results_store.get(2)
+
+    assert params_stored["DEWH"]["class"] == "GasHeaterInstantaneous"
+    assert params_stored["DEWH"]["nom_power"] == {"class": "Variable", "value": 200., "unit": "MJ/hr", "type": "scalar"}
+    assert runs_all.attrs["thermal_runs"] == 1
+    assert runs_all[PARAMS_OUT].iloc[:3].equals(runs_first[PARAMS_OUT])
+    assert runs_all["heater_heat_acum"].notna().all()
+
+
+def test_analysis_economic_params(sim_base: Simulation):
+    params_in = {
+        "DEWH.nom_power": VariableList([20., 30.], "kW"),
+        "household.tariff_type": ["flat", "CL"],
+    }
+    (cases_in, units_in) = parametric.settings(params_in)
+    groups = parametric.plan_runs(cases_in)
+    runs_split = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, verbose=False,
+    )
+    runs_full = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, params_economic=None, verbose=False,
+    )
+
+    assert groups == [[0, 1], [2, 3]]
+    assert runs_split.attrs["thermal_runs_saved"] == 2
+    assert runs_full.attrs["thermal_runs_saved"] == 0
+    assert runs_split.equals(runs_full)
+
+
+@pytest.mark.parametrize("method", ["lhs", "sobol", "halton"])
+def test_settings_sampling(method: str):
+    params_in = {
+        "DEWH.nom_power": VariableList([2400., 3600., 4800.], "W"),
+        "DEWH.temp_max": VariableList([55., 65., 75.], "degC"),
+        "household.location": ["Sydney", "Melbourne"],
+    }
+    (runs, units) = parametric.settings(params_in, method=method, n_samples=16, seed=42)
+    (runs2, _) = parametric.settings(params_in, method=method, n_samples=16, seed=42)
+
+    assert len(runs) == 16
+    assert runs.equals(runs2)
+    assert runs["DEWH.nom_power"].between(2400., 4800.).all()
+    assert set(runs["household.location"]) == {"Sydney", "Melbourne"}
+    assert units["DEWH.temp_max"] == "degC"
+
+
+def test_workqueue_leases():
+    import time
+    import pandas as pd
+    from tm_solarshift.analysis.workqueue import WorkQueue
+    jobs = [pd.DataFrame({"x": [1.]}, index=[0]), pd.DataFrame({"x": [2.]}, index=[1])]
+    with TemporaryDirectory() as tmpdir:
+        with WorkQueue(os.path.join(tmpdir, "queue.db"), lease_time=0.05, max_attempts=2) as queue:
+            queue.submit("sweep", {}, jobs)
+            queue.submit("sweep", {}, jobs)
+            assert queue.status("sweep")["pending"] == 2
+
+            job_a = queue.claim("a")
+            job_b = queue.claim("b")
+            assert queue.claim("c") is None
+            assert job_a.id != job_b.id
+
+            # worker "a" crashes: its job is claimed again once the lease expires
+            queue.complete(job_b, {1: {"y": 4.}})
+            time.sleep(0.1)
+            job_c = queue.claim("c")
+            assert (job_c.id, job_c.attempts) == (job_a.id, 2)
+            assert not queue.renew(job_a)
+            # the results of the expired claim are discarded
+            assert not queue.complete(job_a, {0: {"y": 1.}})
+            queue.fail(job_c, "error")
+            assert queue.status("sweep") == {"pending": 0, "running": 0, "done": 1, "failed": 1}
+            assert queue.results("sweep") == {1: {"y": 4.}}
+
+
+def test_analysis_queue(sim_base: Simulation):
+    params_in = {
+        "household.location": ["Sydney", "Melbourne"],
+        "household.tariff_type": ["flat", "CL"],
+    }
+    (cases_in, units_in) = parametric.settings(params_in)
+    runs_serial = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, verbose=False,
+    )
+    with TemporaryDirectory() as tmpdir:
+        path_queue = os.path.join(tmpdir, "queue.db")
+        runs_queue = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_queue=path_queue, verbose=False,
+        )
+        # submitting the same sweep again does not run it again
+        runs_again = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_queue=path_queue, verbose=False,
+        )
+
+    assert runs_queue.equals(runs_serial)
+    assert runs_again.equals(runs_serial)
+
+
+def test_worker_progress(sim_base: Simulation):
+    from tm_solarshift import worker
+    from tm_solarshift.analysis.workqueue import WorkQueue
+    (cases_in, units_in) = parametric.settings({"household.location": ["Sydney", "Melbourne"]})
+    config = {
+        "sim_base": sim_base,
+        "units_in": units_in,
+        "params_out": PARAMS_OUT,
+        "save_timings": False,
+        "dir_detailed": None,
+    }
+    finished = []
+    with TemporaryDirectory() as tmpdir:
+        with WorkQueue(os.path.join(tmpdir, "queue.db")) as queue:
+            queue.submit("sweep", config, [cases_in.loc[[0]], cases_in.loc[[1]]])
+            n_jobs = worker.work(
+                queue, sweep="sweep", poll=0.01, until_done=True,
+                on_progress=lambda: finished.append(len(queue.results("sweep"))),
+                verbose=False,
+            )
+
+    # the results of each job are available as soon as it finishes
+    assert n_jobs == 2
+    assert finished == [1, 2]
+
+
+def test_analysis_status_file(sim_base: Simulation):
+    import json
+    (cases_in, units_in) = parametric.settings({"household.location": ["Sydney", "Melbourne"]})
+    with TemporaryDirectory() as tmpdir:
+        path_status = os.path.join(tmpdir, "status.json")
+        runs = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, path_status=path_status, verbose=False,
+        )
+        with open(path_status) as file:
+            status = json.load(file)
+
+    assert list(runs.columns) == list(cases_in.columns) + PARAMS_OUT
+    assert (status["done"], status["failed"], status["total"]) == (2, 0, 2)
+    assert status["latency"]["total"]["count"] == 2
+
+
+def test_detailed_store(sim_base: Simulation):
+    import numpy as np
+    from tm_solarshift.analysis.results import DetailedStore
+    (cases_in, units_in) = parametric.settings({"DEWH.nom_power": VariableList([120., 160.], "MJ/hr")})
+    with TemporaryDirectory() as tmpdir:
+        parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            save_timings=False, save_results_detailed=True, dir_output=tmpdir, verbose=False,
+        )
+        sim = sim_base.clone({"DEWH.nom_power": Variable(160., "MJ/hr")})
+        sim.run_simulation()
+
+        store = DetailedStore(os.path.join(tmpdir, "detailed"))
+        heater_heat = store.load(1, "heater_heat")
+        df_tm = store.load(1)
+        df_pv = store.load(0, ["pv_power"], group="df_pv")
+        cases = store.cases()
+
+    assert sorted(cases) == [0, 1]
+    assert heater_heat.index.equals(sim.out["df_tm"].index)
+    assert np.allclose(heater_heat, sim.out["df_tm"]["heater_heat"], rtol=1e-6)
+    assert set(df_tm.columns) <= set(sim.out["df_tm"].columns)
+    assert list(df_pv.columns) == ["pv_power"]
+
+
+def test_schedule_longest_first(sim_base: Simulation):
+    from tm_solarshift.analysis.scheduling import (RuntimeModel, longest_first, makespan)
+    (cases_in, units_in) = parametric.settings({"time_params.STOP": VariableList([24., 72.], "hr")})
+    groups = parametric.plan_runs(cases_in)
+    (groups_sorted, sims) = parametric.schedule_runs(cases_in, groups, units_in, sim_base)
+    assert groups_sorted == [[1], [0]]
+
+    with TemporaryDirectory() as tmpdir:
+        path_runtimes = os.path.join(tmpdir, "runtimes.json")
+        model = RuntimeModel(path_runtimes)
+        model.update(sims[0], {0: {"total_wall_time": 1.5}})
+        model.update(sims[1], {1: {"total_wall_time": 3.5}, 2: {"total_wall_time": 0.1}})
+        model.save()
+        model = RuntimeModel(path_runtimes)
+
+        runs = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            path_runtimes=path_runtimes, verbose=False,
+        )
+        refined = RuntimeModel(path_runtimes)
+
+    # 1.5 s for 480 steps and 3.5 s for 1440 steps: 0.5 s + 1/480 s per step
+    (overhead, rate) = model.coefficients("gas_instant")
+    assert overhead == pytest.approx(0.5)
+    assert rate == pytest.approx(1/480.)
+    assert model.estimate(sims[1], n_cases=3) == pytest.approx(3.5 + 2 * 0.1)
+    assert refined.stats["gas_instant"][0] == 4
+    # without timings, heat pumps go before the resistive heaters
+    assert RuntimeModel().coefficients("heat_pump")[1] > RuntimeModel().coefficients("resistive")[1]
+    assert runs["heater_heat_acum"].notna().all()
+    assert longest_first([1., 3., 2.]) == [1, 2, 0]
+    assert makespan([1., 1., 1., 1., 4.], 2) == 6.
+    assert makespan([[1., 1., 1., 1., 4.][i] for i in longest_first([1., 1., 1., 1., 4.])], 2) == 4.
+
+
+def test_memory_limiter(sim_base: Simulation):
+    from tm_solarshift.analysis.scheduling import (MemoryLimiter, WORKER_BASE_MEMORY, estimate_memory)
+    sim_annual = sim_base.clone({"time_params.STOP": Variable(8760, "hr")})
+    assert estimate_memory(sim_annual) == pytest.approx(365 * estimate_memory(sim_base))
+
+    limiter = MemoryLimiter(budget=3 * WORKER_BASE_MEMORY + 300., reserve=0.)
+    assert limiter.max_workers(100.) == 3
+    reserved = [limiter.start(100.) for _ in range(2)]
+    assert limiter.admit(100.)
+    assert not limiter.admit(400.)
+    # the measured peak is twice the estimate: the next estimates are scaled up
+    limiter.finish(reserved[0], 100., WORKER_BASE_MEMORY + 200.)
+    assert limiter.factor == pytest.approx(2.4)
+    assert not limiter.admit(200.)
+    limiter.finish(reserved[1])
+    assert limiter.admit(1e6)       # there is always one run in progress
+
+    (cases_in, units_in) = parametric.settings({"household.location": ["Sydney", "Melbourne", "Brisbane"]})
+    runs = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        n_workers=2, memory_budget=1., verbose=False,
+    )
+    assert runs["heater_heat_acum"].notna().all()
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="the peak can only be reset on Linux")
+def test_peak_rss():
+    import numpy as np
+    from tm_solarshift.analysis.scheduling import (peak_rss, reset_peak_rss)
+    reset_peak_rss()
+    peak_start = peak_rss()
+    aux = np.ones(200 * 2**20 // 8)      # 200 MB
+    del aux
+    assert peak_rss() - peak_start > 150.
+
+
+def test_analysis_pipeline(sim_base: Simulation):
+    (cases_in, units_in) = parametric.settings({
+        "household.location": ["Sydney", "Melbourne"],
+        "DEWH.nom_power": VariableList([120., 160.], "MJ/hr"),
+    })
+    runs_serial = parametric.analysis(
+        cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+        save_timings=False, verbose=False,
+    )
+    with TemporaryDirectory() as tmpdir:
+        runs = parametric.analysis(
+            cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+            pipeline=True, n_workers=2, lookahead=1,
+            save_results_detailed=True, dir_output=tmpdir, verbose=False,
+        )
+        from tm_solarshift.analysis.results import DetailedStore
+        cases_detailed = DetailedStore(os.path.join(tmpdir, "detailed")).cases()
+
+    assert runs[PARAMS_OUT].equals(runs_serial[PARAMS_OUT])
+    assert sorted(cases_detailed) == list(cases_in.index)
+    assert (runs["thermal_model_wall_time"] > 0).all()
+    assert (runs["total_wall_time"] >= runs["thermal_model_wall_time"]).all()
+
+
+def test_analysis_two_phase(sim_base: Simulation):
+    (cases_in, units_in) = parametric.settings({
+        "DEWH.nom_power": VariableList([80., 100., 120., 140., 160.], "MJ/hr"),
+    })
+    (runs, report) = parametric.analysis_two_phase(
+        cases_in, units_in,
+        objective = "annual_hw_household_cost",
+        params_out = ["heater_heat_acum"],
+        sim_base = sim_base,
+        top_k = 2,
+        n_check = 1,
+        seed = 0,
+        save_timings = False,
+        verbose = False,
+    )
+    refined = runs["refined"] != ""
+
+    assert (report["n_coarse"], report["n_fine"]) == (5, 3)
+    assert list(runs.loc[runs["refined"] == "top_k"].index) == [0, 1]
+    assert runs.loc[refined, "annual_hw_household_cost"].notna().all()
+    assert runs.loc[~refined, "annual_hw_household_cost"].isna().all()
+    assert runs["annual_hw_household_cost_coarse"].notna().all()
+    assert report["top_k_overlap"] == 1.
+    assert report["spearman"] == pytest.approx(1.)
+    assert report["missed"] == []
+
+
+@pytest.mark.parametrize("mode", [{}, {"pipeline": True}, {"n_workers": 2}])
+def test_analysis_failed_cases(sim_base: Simulation, mode: dict):
+    import json
+    (cases_in, units_in) = parametric.settings({
+        "household.location": ["Sydney", "Nowhere", "Melbourne"],
+    })
+    with TemporaryDirectory() as tmpdir:
+        path_status = os.path.join(tmpdir, "status.json")
+        with pytest.warns(UserWarning, match="Nowhere"):
+            runs = parametric.analysis(
+                cases_in, units_in, params_out=PARAMS_OUT, sim_base=sim_base,
+                path_status=path_status, verbose=False, **mode,
+            )
+        with open(path_status) as f:
+            status = json.load(f)
+
+    assert runs.attrs["failed"] == 1
+    assert status["failed"] == 1 and status["done"] == 2
+    assert runs["heater_heat_acum"].isna().tolist() == [False, True, False]
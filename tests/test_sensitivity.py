@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tm_solarshift.general import Simulation
+from tm_solarshift.analysis import sensitivity
+from tm_solarshift.models.gas_heater import GasHeaterInstantaneous
+from tm_solarshift.utils.units import (Variable, VariableList)
+
+
+def ishigami(X: np.ndarray, a: float = 7., b: float = 0.1) -> np.ndarray:
+    return np.sin(X[:,0]) + a * np.sin(X[:,1])**2 + b * X[:,2]**4 * np.sin(X[:,0])
+
+
+def test_sobol_indices_ishigami():
+    from SALib.analyze import sobol as sobol_analyze
+    params_in = {f"x{i}": [-np.pi, np.pi] for i in range(3)}
+    (problem, _) = sensitivity.problem_from_params(params_in)
+    X = sensitivity.sample(problem, 1024, seed=1)
+    y = ishigami(X.to_numpy())
+    Y = pd.DataFrame({"y": y, "y2": 2 * y})
+
+    indices = sensitivity.sobol_indices(problem, Y, seed=1)
+    Si = sobol_analyze.analyze(problem, y, calc_second_order=False, seed=1)
+
+    assert np.allclose(indices.loc["y", "S1"], Si["S1"])
+    assert np.allclose(indices.loc["y", "ST"], Si["ST"])
+    assert np.allclose(indices.loc["y", "S1_conf"], Si["S1_conf"], rtol=0.5)
+    assert np.allclose(indices.loc["y", "S1"], indices.loc["y2", "S1"])
+    # analytical values
+    assert np.allclose(indices.loc["y", "S1"], [0.314, 0.442, 0.0], atol=0.05)
+    assert np.allclose(indices.loc["y", "ST"], [0.558, 0.442, 0.244], atol=0.05)
+
+
+def test_sensitivity_analysis():
+    sim_base = Simulation()
+    sim_base.DEWH = GasHeaterInstantaneous()
+    sim_base.time_params.STOP = Variable(24, "hr")
+    params_in = {
+        "DEWH.nom_power": VariableList([120., 160.], "MJ/hr"),
+        "DEWH.deltaT_rise": VariableList([20., 30.], "dgrC"),
+    }
+    params_out = ["heater_heat_acum", "E_HWD_acum"]
+
+    (indices, runs) = sensitivity.analysis(
+        params_in, 4, params_out=params_out, sim_base=sim_base,
+        num_resamples=10, seed=1, verbose=False,
+    )
+
+    assert len(runs) == 4 * (2 + 2)
+    assert indices.shape == (len(params_out) * 2, 4)
+    # the energy delivered only depends on the nominal power
+    assert indices.loc[("E_HWD_acum", "DEWH.nom_power"), "ST"] > 0.
+    assert indices.loc[("E_HWD_acum", "DEWH.deltaT_rise"), "ST"] == 0.
+
+
+def test_sensitivity_analysis_execution(monkeypatch: pytest.MonkeyPatch):
+    from tm_solarshift.analysis import parametric
+    calls = []
+
+    def analysis(cases_in, units_in, **kwargs):
+        calls.append(kwargs)
+        return pd.DataFrame({"y": np.arange(len(cases_in), dtype=float)}, index=cases_in.index)
+
+    monkeypatch.setattr(parametric, "analysis", analysis)
+    params_in = {"x0": [0., 1.], "x1": [0., 1.]}
+    execution = parametric.ExecutionOptions(n_workers=8)
+
+    sensitivity.analysis(params_in, 4, params_out=["y"], execution=execution, num_resamples=10, verbose=False)
+    sensitivity.analysis(params_in, 4, params_out=["y"], execution=execution, n_workers=2, num_resamples=10, verbose=False)
+
+    # n_workers only replaces the one of execution if it is given
+    assert "n_workers" not in calls[0] and calls[0]["execution"] is execution
+    assert calls[1]["n_workers"] == 2
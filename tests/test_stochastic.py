@@ -0,0 +1,189 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tm_solarshift.general import Simulation
+from tm_solarshift.analysis import stochastic
+from tm_solarshift.models.gas_heater import GasHeaterInstantaneous
+from tm_solarshift.timeseries import weather
+from tm_solarshift.utils.units import Variable
+
+
+def test_running_stats():
+    rng = np.random.default_rng(1)
+    x = rng.lognormal(size=5000)
+    stats = stochastic.RunningStats(quantiles=[0.05, 0.5, 0.95])
+    for (i, value) in enumerate(x):
+        stats.add({"x": value, "y": np.nan if i % 2 else 2 * value})
+    summary = stats.summary()
+
+    assert summary.loc["x", "count"] == len(x)
+    assert np.isclose(summary.loc["x", "mean"], x.mean())
+    assert np.isclose(summary.loc["x", "std"], x.std(ddof=1))
+    assert np.isclose(summary.loc["x", "sem"], x.std(ddof=1) / np.sqrt(len(x)))
+    assert (summary.loc["x", "min"], summary.loc["x", "max"]) == (x.min(), x.max())
+    for p in [0.05, 0.5, 0.95]:
+        assert np.isclose(summary.loc["x", f"q{100*p:g}"], np.quantile(x, p), rtol=0.05)
+    # NaN values are ignored
+    assert summary.loc["y", "count"] == len(x) // 2
+    assert np.isclose(summary.loc["y", "mean"], 2 * x[::2].mean())
+
+
+def test_replica_seeds():
+    seeds = stochastic.replica_seeds(7, 3)
+    assert seeds == stochastic.replica_seeds(7, 3)
+    assert list(seeds.keys()) == stochastic.STREAMS
+    assert len(set(seeds.values())) == len(seeds)
+    assert seeds != stochastic.replica_seeds(7, 4)
+    assert seeds != stochastic.replica_seeds(8, 3)
+
+
+def test_replica_uniforms():
+    assert stochastic.replica_uniforms(7, 0, 5, "random") is None
+    u0 = stochastic.replica_uniforms(7, 0, 5, "antithetic")
+    u1 = stochastic.replica_uniforms(7, 1, 5, "antithetic")
+    assert np.allclose(u0["HWD"] + u1["HWD"], 1.) and np.allclose(u0["weather"] + u1["weather"], 1.)
+    assert not np.allclose(u0["HWD"], stochastic.replica_uniforms(7, 2, 5, "antithetic")["HWD"])
+
+    size = stochastic.SAMPLINGS["sobol"]
+    block = np.array([stochastic.replica_uniforms(7, i, 5, "sobol")["HWD"] for i in range(size)])
+    assert np.allclose(block[3], stochastic.replica_uniforms(7, 3, 5, "sobol")["HWD"])
+    # each dimension of a block is stratified: one point in each interval of width 1/size
+    for dim in range(block.shape[1]):
+        assert sorted((block[:, dim] * size).astype(int)) == list(range(size))
+
+    # an unknown sampling is rejected before running any replica
+    scenarios = {"base": Simulation()}
+    with pytest.raises(ValueError, match="sampling"):
+        stochastic.montecarlo(scenarios["base"], 4, seed=1, sampling="lhs", verbose=False)
+    with pytest.raises(ValueError, match="sampling"):
+        stochastic.compare(scenarios, 4, seed=1, sampling="lhs", verbose=False)
+    with pytest.raises(ValueError, match="sampling"):
+        stochastic.converge(scenarios, {"heater_heat_acum": 1.}, seed=1, sampling="lhs", verbose=False)
+
+
+def test_uniforms_drive_draws():
+    HWDInfo = Simulation().HWDInfo
+    u = np.array([0.1, 0.5, 0.9])
+    m_HWD_day = HWDInfo.inverse_cdf(u, 3)
+    assert np.all(np.diff(m_HWD_day) > 0)
+    assert np.isclose(m_HWD_day[1], HWDInfo.daily_avg.get_value("L/d"))
+    HWDInfo.daily_uniforms = u
+    dates = pd.date_range("2022-01-01", periods=3, freq="D")
+    assert np.allclose(HWDInfo.interday_distribution(dates)["HWD_day"], m_HWD_day)
+
+    # weather days are sorted by temperature: low uniforms pick cold days
+    idx_sample = pd.date_range("2022-01-01", periods=3*24, freq="h")
+    df_sample = pd.DataFrame({col: 0. for col in weather.TS_WEATHER}, index=idx_sample)
+    df_sample["temp_amb"] = np.repeat([20., 10., 30.], 24)
+    ts = pd.DataFrame(index=pd.date_range("2023-01-01", periods=2*24, freq="h"), columns=weather.TS_WEATHER)
+    ts = weather.random_days_from_dataframe(ts, df_sample, uniforms=np.array([0.05, 0.95]))
+    assert ts["temp_amb"].iloc[0] == 10. and ts["temp_amb"].iloc[-1] == 30.
+
+
+def test_montecarlo():
+    sim_base = Simulation()
+    sim_base.DEWH = GasHeaterInstantaneous()
+    sim_base.time_params.STOP = Variable(24, "hr")
+    metrics = ["heater_heat_acum", "E_HWD_acum"]
+
+    (summary, stats) = stochastic.montecarlo(sim_base, 6, seed=5, metrics=metrics, verbose=False)
+    assert summary.attrs == {"seed": 5, "n_replicas": 6, "sampling": "random"}
+    assert (summary["count"] == 6).all()
+    assert summary.loc["E_HWD_acum", "std"] > 0.
+    assert stats.mean("heater_heat_acum") == summary.loc["heater_heat_acum", "mean"]
+
+    # the replicas only depend on the seed, not on the workers
+    (summary_par, _) = stochastic.montecarlo(sim_base, 6, seed=5, metrics=metrics, n_workers=2, verbose=False)
+    cols = ["mean", "std", "min", "max"]
+    assert np.allclose(summary[cols].to_numpy(), summary_par.loc[summary.index, cols].to_numpy())
+    # sim_base is not modified
+    assert sim_base.HWDInfo.seed_id == Simulation().HWDInfo.seed_id
+    assert sim_base.weather.seed is None
+
+
+def test_compare_common_random_numbers():
+    sim_A = Simulation()
+    sim_A.DEWH = GasHeaterInstantaneous()
+    sim_A.time_params.STOP = Variable(24, "hr")
+    sim_B = sim_A.clone({"DEWH.flow_water": Variable(15., "L/min")})
+    metrics = ["heater_heat_acum", "E_HWD_acum"]
+
+    (summary, differences) = stochastic.compare(
+        {"A": sim_A, "B": sim_B}, 4, seed=3, metrics=metrics, sampling="antithetic", verbose=False,
+    )
+    assert summary.attrs["reference"] == "A" and summary.attrs["sampling"] == "antithetic"
+    assert list(differences.index) == [("B", metric) for metric in metrics]
+    for metric in metrics:
+        assert np.isclose(
+            differences.loc[("B", metric), "mean"],
+            summary.loc[("B", metric), "mean"] - summary.loc[("A", metric), "mean"],
+        )
+    # the scenarios share the daily draws, so the noise cancels out in the differences
+    assert (differences["sem"] <= differences["sem_independent"] + 1e-9).all()
+
+
+def test_converge():
+    sim_base = Simulation()
+    sim_base.DEWH = GasHeaterInstantaneous()
+    sim_base.time_params.STOP = Variable(24, "hr")
+    scenarios = {"base": sim_base}
+
+    (summary, _, report) = stochastic.converge(
+        scenarios, {"heater_heat_acum": 2.}, seed=2, metrics=["heater_heat_acum"], batch_size=4, verbose=False,
+    )
+    assert report.loc["base", "converged"]
+    assert report.loc["base", "halfwidth_heater_heat_acum"] <= 2.
+    assert report.loc["base", "n_replicas"] == summary.loc[("base", "heater_heat_acum"), "count"] >= 8
+    assert report.attrs["n_runs"] == report["n_replicas"].sum()
+
+    # unreachable target: it stops at max_replicas
+    (_, _, report) = stochastic.converge(
+        scenarios, {"heater_heat_acum": 1e-6}, seed=2, min_replicas=4, max_replicas=6, batch_size=2, verbose=False,
+    )
+    assert not report.loc["base", "converged"]
+    assert report.loc["base", "n_replicas"] == 6
+
+    with pytest.raises(ValueError):
+        stochastic.converge(scenarios, {"not_a_metric": 1.}, seed=2, min_replicas=2, verbose=False)
+
+
+def test_tilted_uniforms_unbiased():
+    draws = [stochastic.tilted_uniforms(1, replica, 1, {"HWD": 3., "weather": -3.}) for replica in range(1000)]
+    u_HWD = np.array([uniforms["HWD"][0] for (uniforms, _) in draws])
+    u_weather = np.array([uniforms["weather"][0] for (uniforms, _) in draws])
+    assert np.all((u_HWD >= 0.) & (u_HWD < 1.))
+    assert u_HWD.mean() > 0.6 and u_weather.mean() < 0.4
+
+    draws = [stochastic.tilted_uniforms(1, replica, 1, {"HWD": 3., "weather": 0.}) for replica in range(4000)]
+    u_HWD = np.array([uniforms["HWD"][0] for (uniforms, _) in draws])
+    weights = np.array([weight for (_, weight) in draws])
+    assert np.isclose(weights.mean(), 1., atol=0.05)
+    # P(u > 0.98) = 0.02: the tilted draws see the event more often, the weights correct it
+    event = u_HWD > 0.98
+    assert event.mean() > 0.04
+    assert np.isclose((weights * event).mean(), 0.02, atol=0.005)
+    assert stochastic.tilted_uniforms(1, 0, 1, {"HWD": 0., "weather": 0.})[1] == 1.
+
+
+def test_importance_sampling():
+    sim_base = Simulation()
+    sim_base.DEWH = GasHeaterInstantaneous()
+    sim_base.time_params.STOP = Variable(24, "hr")
+    # the hot water demand only depends on the daily draw, so E_HWD_acum > threshold has probability 0.02
+    sim_ref = sim_base.clone()
+    sim_ref.HWDInfo.daily_uniforms = np.array([0.98])
+    sim_ref.run_simulation()
+    threshold = sim_ref.out["overall_tm"]["E_HWD_acum"]
+
+    (estimates, runs) = stochastic.importance_sampling(
+        {"base": sim_base}, 32, event_metric="E_HWD_acum", threshold=threshold,
+        tilts={"HWD": 4., "weather": -2.}, seed=3, verbose=False,
+    )
+    row = estimates.loc["base"]
+    assert row["ci_low"] <= 0.02 <= row["ci_high"]
+    assert row["n_events"] >= 3
+    assert row["ess"] < 32
+    assert len(runs) == 32 and runs["event"].sum() == row["n_events"]
+    # tmy weather is not random, so it is not tilted
+    assert estimates.attrs["tilts"]["weather"] == 0.
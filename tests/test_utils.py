@@ -0,0 +1,184 @@
+import io
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from tempfile import TemporaryDirectory
+
+from tm_solarshift.utils import cache
+from tm_solarshift.utils.pipeline import Pipeline
+from tm_solarshift.utils.progress import ProgressTracker
+from tm_solarshift.utils.profiling import (Profiler, stage, flatten_timings, TIMING_METRICS)
+
+
+def test_cache_read_csv():
+    cache_test = cache.DatasetCache()
+    with TemporaryDirectory() as tmpdir:
+        file_path = os.path.join(tmpdir, "sample.csv")
+        pd.DataFrame({"x": np.arange(10)}).to_csv(file_path)
+        key = cache.file_key(file_path, "csv")
+        df1 = cache_test.get(key, lambda: pd.read_csv(file_path, index_col=0))
+        df2 = cache_test.get(key, lambda: pd.read_csv(file_path, index_col=0))
+
+    assert df1 is df2
+    assert cache_test.stats() == {"hits": 1, "misses": 1, "prefetched": 0, "size": 1}
+
+
+def test_profiler_nested_stages():
+    profiler = Profiler(trace_memory=True)
+    with profiler.activate(), profiler.stage("total"):
+        with stage("inner"):
+            aux = np.ones(100_000)
+        del aux
+    timings = profiler.timings
+    flat = flatten_timings(timings)
+
+    assert set(timings.keys()) == {"total", "inner"}
+    assert timings["total"]["wall_time"] >= timings["inner"]["wall_time"]
+    assert timings["total"]["mem_peak"] >= timings["inner"]["mem_peak"] > 0.
+    assert len(flat) == 2 * len(TIMING_METRICS)
+
+
+def test_profiler_cache_counts_per_thread():
+    datasets = cache.DATASETS
+    key = ("test_profiler_cache_counts_per_thread",)
+    datasets.get(key, lambda: 1)
+    started = threading.Barrier(2)
+
+    def other_thread():
+        started.wait()
+        for _ in range(50):
+            datasets.get(key, lambda: 1)
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+
+    profiler = Profiler()
+    with profiler.activate(), profiler.stage("total"):
+        started.wait()
+        datasets.get(key, lambda: 1)
+        thread.join()
+    
+    assert profiler.timings["total"]["cache_hits"] == 1
+    assert profiler.timings["total"]["cache_misses"] == 0
+    assert profiler.timings["total"]["mem_peak"] == 0.
+
+
+def test_prefetcher_lookahead():
+    warmed = []
+    prefetcher = cache.Prefetcher(list(range(10)), warmed.append, lookahead=2)
+    prefetcher.advance(0)
+    with prefetcher:
+        for _ in range(100):
+            if len(warmed) == 2:
+                break
+            time.sleep(0.01)
+        prefetcher.advance(5)
+        for _ in range(100):
+            if len(warmed) == 4:
+                break
+            time.sleep(0.01)
+
+    assert warmed == [1, 2, 6, 7]
+
+
+def test_prefetcher_not_counted():
+    datasets = cache.DATASETS
+    keys = [("test_prefetcher_not_counted", i) for i in range(4)]
+    stats_start = datasets.stats()
+    prefetcher = cache.Prefetcher(keys, lambda key: datasets.get(key, lambda: 1), lookahead=4)
+    with cache.count_requests() as counter:
+        with prefetcher.paused():
+            prefetcher.start()
+            time.sleep(0.05)
+            assert prefetcher.warmed == 0
+        for _ in range(100):
+            if prefetcher.warmed == 4:
+                break
+            time.sleep(0.01)
+        prefetcher.stop()
+        value = datasets.get(keys[0], lambda: 2)
+    stats = datasets.stats()
+
+    assert value == 1
+    assert counter == [1, 0]
+    assert prefetcher.requests == [0, 4]
+    assert stats["prefetched"] - stats_start["prefetched"] == 4
+    assert stats["misses"] == stats_start["misses"]
+
+
+def test_prefetcher_errors():
+    from tm_solarshift.general import Simulation
+    sim = Simulation()
+    sim.weather.type_sim = "historical"
+    prefetcher = cache.Prefetcher([sim, None], lambda sim: sim.prefetch_datasets())
+    with TemporaryDirectory() as tmpdir:
+        sim.weather.file_path = os.path.join(tmpdir, "weather.csv")
+        sim.time_params.idx.to_frame().to_csv(sim.weather.file_path)
+        prefetcher.advance(-1)
+        with pytest.warns(UserWarning, match="prefetch of item 1 failed"):
+            with prefetcher:
+                for _ in range(100):
+                    if prefetcher.errors:
+                        break
+                    time.sleep(0.01)
+        in_cache = cache.file_key(sim.weather.file_path, "csv", (("index_col", 0),)) in cache.DATASETS
+
+    # the historical weather file is prefetched, an error is reported
+    assert in_cache
+    assert list(prefetcher.errors) == [1]
+    assert "AttributeError" in prefetcher.errors[1]
+
+
+def test_progress_tracker():
+    stream = io.StringIO()
+    with TemporaryDirectory() as tmpdir:
+        path_status = os.path.join(tmpdir, "status.json")
+        with ProgressTracker(4, path_status=path_status, interval=0., show_bar=True, stream=stream) as tracker:
+            tracker.update({
+                0: {"total_wall_time": 1.0, "total_cache_hits": 3, "total_cache_misses": 1},
+                1: {"total_wall_time": 3.0, "total_cache_hits": 4, "total_cache_misses": 0},
+            })
+            tracker.update(failed=1)
+        with open(path_status) as file:
+            status = json.load(file)
+
+    assert (status["done"], status["failed"], status["total"]) == (2, 1, 4)
+    assert status["latency"]["total"]["p50"] == 2.0
+    assert status["cache_hit_rate"] == 7 / 8
+    assert status["runs_per_min"] > 0 and status["eta"] is not None
+    assert "3/4 (75%)" in stream.getvalue()
+
+
+def test_pipeline_stages_overlap():
+    def prepare(x: int) -> int:
+        time.sleep(0.05)
+        return x
+    def simulate(x: int) -> int:
+        time.sleep(0.2)
+        return 2 * x
+    def postprocess(x: int) -> int:
+        time.sleep(0.05)
+        return x + 1
+
+    pipeline = Pipeline(
+        [("prepare", prepare, 1), ("simulate", simulate, 4), ("postprocess", postprocess, 1)],
+        maxsize=2,
+    )
+    start = time.perf_counter()
+    outputs = list(pipeline.run(range(8)))
+    elapsed = time.perf_counter() - start
+
+    assert sorted(outputs) == [2 * x + 1 for x in range(8)]
+    # sequential: 8 * 0.3 s. The simulations run four at a time, overlapped with the other stages
+    assert elapsed < 1.2
+    assert pipeline.busy["simulate"] == pytest.approx(8 * 0.2, rel=0.2)
+
+    def fails(x: int) -> int:
+        if x == 3:
+            raise ValueError("wrong item")
+        return x
+    with pytest.raises(ValueError, match="wrong item"):
+        list(Pipeline([("a", fails, 2), ("b", postprocess, 1)]).run(range(100)))
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pandas as pd
+from scipy.interpolate import RBFInterpolator
+from scipy.spatial import cKDTree
+
+import tm_solarshift.general as general
+from tm_solarshift.utils.units import VariableList
+from tm_solarshift.analysis import parametric
+
+#-------------
+def propose(
+        X: np.ndarray,
+        Y: np.ndarray,
+        n_points: int,
+        thresholds: list[float | None] | None = None,
+        n_candidates: int = 2000,
+        seed: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Propose new points where the outputs change fastest or cross a threshold.
+
+    A radial basis function interpolant is fitted to each output, and evaluated in a set of random candidates. The score of a candidate is the difference between the interpolant and its nearest existing sample (large where the output changes fast and there are no samples yet), plus, for outputs with a threshold, the distance to the nearest sample if the threshold is crossed between the candidate and it. The points are chosen greedily, reducing the score of the candidates close to the already chosen ones.
+
+    Args:
+        X (np.ndarray): Existing samples in the unit hypercube, shape (n, dims).
+        Y (np.ndarray): Outputs of the existing samples, shape (n, k). Non-finite values (failed runs) are left out of the interpolant of their output, which needs more than dims finite samples.
+        n_points (int): Number of points to propose.
+        thresholds (list[float | None] | None, optional): Threshold of each output (None for no threshold). Defaults to None.
+        n_candidates (int, optional): Number of random candidates evaluated. Defaults to 2000.
+        seed (int | None, optional): Seed for the candidates. Defaults to None.
+
+    Returns:
+        np.ndarray: New points, shape (n_points, dims).
+        np.ndarray: Score of each new point.
+    """
+    X = np.asarray(X, dtype=float)
+    Y = np.asarray(Y, dtype=float).reshape(len(X), -1)
+    if thresholds is None:
+        thresholds = [None] * Y.shape[1]
+    rng = np.random.default_rng(seed)
+    candidates = rng.random((n_candidates, X.shape[1]))
+
+    (dist, _) = cKDTree(X).query(candidates)
+
+    score = np.zeros(n_candidates)
+    for k in range(Y.shape[1]):
+        # the runs without this output (e.g. failed) are left out of its interpolant
+        valid = np.isfinite(Y[:, k])
+        (X_k, y) = (X[valid], Y[valid, k])
+        (X_unique, idx_unique) = np.unique(X_k, axis=0, return_index=True)
+        if len(X_unique) <= X.shape[1]:
+            continue
+        scale = y.std()
+        if scale == 0.:
+            continue
+        y_pred = RBFInterpolator(X_unique, y[idx_unique] / scale)(candidates) * scale
+        (dist_k, nearest) = cKDTree(X_k).query(candidates)
+        y_near = y[nearest]
+        score += np.abs(y_pred - y_near) / scale
+        if thresholds[k] is not None:
+            crossed = np.sign(y_pred - thresholds[k]) != np.sign(y_near - thresholds[k])
+            score += crossed * dist_k / np.sqrt(X.shape[1])
+
+    points = []
+    scores = []
+    dist_current = dist.copy()
+    for _ in range(min(n_points, n_candidates)):
+        weighted = score * np.minimum(1., dist_current / np.maximum(dist, 1e-12))
+        best = int(np.argmax(weighted))
+        points.append(candidates[best])
+        scores.append(weighted[best])
+        dist_current = np.minimum(
+            dist_current, np.linalg.norm(candidates - candidates[best], axis=1)
+        )
+    return (np.array(points), np.array(scores))
+
+
+def analysis(
+        params_in: dict[str, VariableList | list[float]],
+        params_out: list[str] = parametric.PARAMS_OUT,
+        params_refine: list[str] | None = None,
+        thresholds: dict[str, float] | None = None,
+        sim_base: general.Simulation = general.Simulation(),
+        n_runs: int = 100,
+        batch_size: int = 8,
+        tol: float = 0.,
+        n_candidates: int = 2000,
+        seed: int | None = None,
+        verbose: bool = True,
+        **kwargs,
+) -> pd.DataFrame:
+    """Adaptive parametric sweep over continuous parameters.
+
+    It starts with the coarse grid given by params_in (the cross product of its values, see parametric.settings), and then adds batches of runs inside the parameters' ranges where the outputs in params_refine change faster or cross the thresholds (see propose). Each batch is run with parametric.analysis.
+
+    Args:
+        params_in (dict[str, VariableList | list[float]]): dictionary with (parameter : values). The values are the initial coarse grid, and their minimum and maximum the range of the refinement.
+        params_out (list[str], optional): Outputs to store. Defaults to parametric.PARAMS_OUT.
+        params_refine (list[str] | None, optional): Outputs used to place the new runs. If None, the outputs in thresholds (or all params_out if there are no thresholds). Defaults to None.
+        thresholds (dict[str, float] | None, optional): Values of interest of some outputs (e.g. {"t_SOC0": 0.}), so the contour where they are crossed is resolved. Defaults to None.
+        sim_base (general.Simulation, optional): Simulation instance used as base case. Defaults to general.Simulation().
+        n_runs (int, optional): Total budget of runs (including the initial grid). Defaults to 100.
+        batch_size (int, optional): Runs added in each iteration. Defaults to 8.
+        tol (float, optional): Stop when the best score of a batch is lower than tol. Defaults to 0.
+        n_candidates (int, optional): Candidates evaluated in each iteration (see propose). Defaults to 2000.
+        seed (int | None, optional): Seed for the candidates. Defaults to None.
+        verbose (bool, optional): Defaults to True.
+        **kwargs: Other arguments passed to parametric.analysis (e.g. n_workers).
+
+    Returns:
+        pd.DataFrame: All the runs, with the inputs, outputs and the "iteration" in which they were added (0 for the initial grid).
+    """
+    if thresholds is None:
+        thresholds = {}
+    if params_refine is None:
+        params_refine = list(thresholds.keys()) if thresholds else list(params_out)
+    for lbl in params_refine:
+        if lbl not in params_out:
+            raise ValueError(f"{lbl} is in params_refine but not in params_out")
+
+    (cases_in, units_in) = parametric.settings(params_in)
+    cols_in = list(cases_in.columns)
+    try:
+        bounds = cases_in.astype(float).agg(["min", "max"])
+    except (TypeError, ValueError):
+        raise ValueError("adaptive.analysis only accepts parameters with numerical values")
+    (low, high) = (bounds.loc["min"].to_numpy(), bounds.loc["max"].to_numpy())
+    if np.any(high <= low):
+        raise ValueError("each parameter requires at least two different values")
+
+    def run(cases: pd.DataFrame, iteration: int) -> pd.DataFrame:
+        runs = parametric.analysis(
+            cases, units_in, params_out=params_out, sim_base=sim_base,
+            save_timings=False, verbose=False, **kwargs,
+        )
+        runs["iteration"] = iteration
+        return runs
+
+    runs = run(cases_in, 0)
+    iteration = 0
+    while len(runs) < n_runs:
+        iteration += 1
+        X = (runs[cols_in].to_numpy(dtype=float) - low) / (high - low)
+        (points, scores) = propose(
+            X,
+            runs[params_refine].to_numpy(dtype=float),
+            min(batch_size, n_runs - len(runs)),
+            thresholds=[thresholds.get(lbl) for lbl in params_refine],
+            n_candidates=n_candidates,
+            seed=None if seed is None else seed + iteration,
+        )
+        if len(points) == 0 or scores.max() <= tol:
+            break
+        cases_new = pd.DataFrame(low + points * (high - low), columns=cols_in)
+        cases_new.index = cases_new.index + runs.index.max() + 1
+        runs = pd.concat([runs, run(cases_new, iteration)])
+        if verbose:
+            print(f"ITERATION {iteration}: {len(runs)} runs, max score {scores.max():.3g}")
+    return runs
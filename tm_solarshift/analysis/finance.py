@@ -13,6 +13,7 @@ from tm_solarshift.constants import (
     SIMULATIONS_IO
 )
 from tm_solarshift.utils.units import conversion_factor as CF
+from tm_solarshift.utils import cache
 from tm_solarshift.models.dewh import (ResistiveSingle, HeatPump)
 from tm_solarshift.models.gas_heater import (GasHeaterInstantaneous, GasHeaterStorage)
 from tm_solarshift.models.solar_thermal import SolarThermalElecAuxiliary
@@ -172,8 +173,7 @@ def calculate_daily_supply_cost(sim: Simulation) -> float:
         file_path = os.path.join(DIR_TARIFFS, f"{dnsp.lower()}_{tariff_type}_plan.json")
         if tariff_type == "gas":
             file_path = DIRECTORY.FILES_GAS_TARIFF[location]
-        with open(file_path) as f:
-            plan = json.load(f)
+        plan = cache.read_json(file_path)
         daily_supply_charge = plan["charges"]["service_charges"][0]["rate"]
     else:
         daily_supply_charge = 0.
@@ -189,13 +189,16 @@ def analysis(
     verbose: bool = True,
     save_details: bool = False,
     use_cache: bool = True,
-    dir_cache: str = "cache/index.csv"
+    dir_cache: str = "cache/index.csv",
+    run_simulation: bool = True,
 ) -> tuple[dict,np.ndarray]:
 
     #retrieving data
     old_heater = sim.household.old_heater
 
-    sim.run_simulation(verbose=verbose)
+    # run_simulation=False reuses sim.out from a previous run (e.g. in parametric.run_cases)
+    if run_simulation:
+        sim.run_simulation(verbose=verbose)
     energy_HWD_annual = sim.out["overall_tm"]["E_HWD_acum"]
     annual_energy_cost = sim.out["overall_econ"]["annual_hw_household_cost"]
     annual_fit_opp_cost = sim.out["overall_econ"]["annual_fit_opp_cost"]
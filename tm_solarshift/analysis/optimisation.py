@@ -0,0 +1,480 @@
+# -*- coding: utf-8 -*-
+
+import warnings
+import numpy as np
+import pandas as pd
+from scipy.stats import (norm, qmc)
+
+import tm_solarshift.general as general
+from tm_solarshift.utils.units import VariableList
+from tm_solarshift.analysis import parametric
+from tm_solarshift.analysis.sensitivity import problem_from_params
+
+#-------------
+def probability_feasible(
+        mean: np.ndarray,
+        std: np.ndarray,
+        low: float | None,
+        high: float | None,
+) -> np.ndarray:
+    """Probability that a normal variable (mean, std) is within [low, high]. None means no bound."""
+    std = np.maximum(std, 1e-12)
+    p_high = norm.cdf((high - mean) / std) if high is not None else 1.
+    p_low = norm.cdf((low - mean) / std) if low is not None else 0.
+    return p_high - p_low
+
+
+def expected_improvement(
+        mean: np.ndarray,
+        std: np.ndarray,
+        best: float,
+) -> np.ndarray:
+    """Expected improvement (for minimisation) over the best value found."""
+    std = np.maximum(std, 1e-12)
+    z = (best - mean) / std
+    return (best - mean) * norm.cdf(z) + std * norm.pdf(z)
+
+
+def _fit_gp(X: np.ndarray, y: np.ndarray):
+    from sklearn.gaussian_process import GaussianProcessRegressor
+    from sklearn.gaussian_process.kernels import (ConstantKernel, Matern, WhiteKernel)
+    from sklearn.exceptions import ConvergenceWarning
+    kernel = (
+        ConstantKernel(1.0, (1e-3, 1e3))
+        * Matern(length_scale=np.full(X.shape[1], 0.3), length_scale_bounds=(1e-2, 1e2), nu=2.5)
+        + WhiteKernel(1e-6, (1e-10, 1e-1))
+    )
+    gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=2, random_state=0)
+    # with few points the hyperparameters usually end up in their bounds
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", ConvergenceWarning)
+        return gp.fit(X, y)
+
+
+def propose_batch(
+        X: np.ndarray,
+        y: np.ndarray,
+        n_points: int,
+        constraints: list[tuple[np.ndarray, float | None, float | None]] | None = None,
+        n_candidates: int = 2000,
+        seed: int | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Propose a batch of candidates with Bayesian optimisation (minimisation).
+
+    A Gaussian process is fitted to the objective and to each constraint. The acquisition function is the expected improvement times the probability of satisfying the constraints, evaluated on random candidates. The batch is built with the "kriging believer" strategy: after choosing a point, its predicted mean is added as an observation, so the next point is chosen elsewhere.
+
+    Args:
+        X (np.ndarray): Evaluated points in the unit hypercube, shape (n, dims).
+        y (np.ndarray): Objective values, shape (n,). Non-finite values (failed runs) are ignored. If there are no finite values, the batch is made of random candidates.
+        n_points (int): Number of points in the batch.
+        constraints (list[tuple[np.ndarray, float | None, float | None]] | None, optional): For each constraint, (values, low, high), with values of shape (n,). A constraint without finite values is ignored. Defaults to None.
+        n_candidates (int, optional): Number of random candidates. Defaults to 2000.
+        seed (int | None, optional): Seed for the candidates. Defaults to None.
+
+    Returns:
+        np.ndarray: Batch of points, shape (n_points, dims).
+        np.ndarray: Acquisition value of each point (when it was chosen).
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    constraints = [] if constraints is None else constraints
+    rng = np.random.default_rng(seed)
+    candidates = rng.random((n_candidates, X.shape[1]))
+    n_points = min(n_points, n_candidates)
+    if not np.isfinite(y).any():
+        # nothing to fit (e.g. all the runs failed): explore
+        return (candidates[:n_points], np.full(n_points, np.nan))
+
+    pof = np.ones(n_candidates)
+    for (values, low, high) in constraints:
+        values = np.asarray(values, dtype=float)
+        valid = np.isfinite(values)
+        if not valid.any():
+            continue
+        (mean, std) = _fit_gp(X[valid], values[valid]).predict(candidates, return_std=True)
+        pof *= probability_feasible(mean, std, low, high)
+
+    feasible = np.isfinite(y)
+    for (values, low, high) in constraints:
+        values = np.asarray(values, dtype=float)
+        if low is not None:
+            feasible &= values >= low
+        if high is not None:
+            feasible &= values <= high
+
+    valid = np.isfinite(y)
+    (X_obs, y_obs) = (X[valid], y[valid])
+    gp = _fit_gp(X_obs, y_obs)
+    # without feasible points, the search looks for feasibility first
+    best = y[feasible].min() if feasible.any() else None
+
+    points = []
+    acquisition = []
+    for _ in range(n_points):
+        (mean, std) = gp.predict(candidates, return_std=True)
+        if best is None:
+            values = pof
+        else:
+            values = expected_improvement(mean, std, best) * pof
+        i = int(np.argmax(values))
+        points.append(candidates[i])
+        acquisition.append(values[i])
+        # kriging believer: keep the fitted kernel, add the prediction as an observation
+        X_obs = np.vstack([X_obs, candidates[i]])
+        y_obs = np.append(y_obs, mean[i])
+        gp = gp.__class__(kernel=gp.kernel_, normalize_y=True, optimizer=None).fit(X_obs, y_obs)
+        candidates = np.delete(candidates, i, axis=0)
+        pof = np.delete(pof, i)
+    return (np.array(points), np.array(acquisition))
+
+
+def optimise(
+        params_in: dict[str, VariableList | list[float]],
+        objective: str = "LCOHW",
+        constraints: dict[str, tuple[float | None, float | None]] | None = None,
+        maximise: bool = False,
+        sim_base: general.Simulation = general.Simulation(),
+        n_initial: int = 8,
+        batch_size: int = 4,
+        max_runs: int = 40,
+        tol: float = 1e-3,
+        patience: int = 2,
+        n_candidates: int = 2000,
+        seed: int | None = None,
+        verbose: bool = True,
+        **kwargs,
+) -> tuple[pd.Series, pd.DataFrame]:
+    """Find the parameters that minimise (or maximise) an output, with a budget of runs.
+
+    It starts with a Latin hypercube of n_initial runs, and then runs batches of candidates proposed with Bayesian optimisation (see propose_batch). Each batch is evaluated with parametric.analysis, so it can be run in parallel with n_workers. The objective can be any output of the simulation, including the financial ones (e.g. "LCOHW", see parametric.PARAMS_FINANCE).
+
+    Args:
+        params_in (dict[str, VariableList | list[float]]): dictionary with (parameter : values). Only the minimum and maximum values are used (continuous ranges), e.g. "DEWH.vol", "DEWH.temp_max", "controller.time_start".
+        objective (str, optional): Output to optimise. Defaults to "LCOHW".
+        constraints (dict[str, tuple[float | None, float | None]] | None, optional): Outputs that must be within (low, high), with None for no bound. E.g. {"t_SOC0": (None, 0.)} for t_SOC0 == 0. Defaults to None.
+        maximise (bool, optional): Maximise the objective instead of minimising it. Defaults to False.
+        sim_base (general.Simulation, optional): Simulation instance used as base case. Defaults to general.Simulation().
+        n_initial (int, optional): Runs of the initial design. Defaults to 8.
+        batch_size (int, optional): Runs per batch. Set it to n_workers to use all the workers. Defaults to 4.
+        max_runs (int, optional): Budget of runs (including the initial design). Defaults to 40.
+        tol (float, optional): Minimum relative improvement of the best feasible objective. Defaults to 1e-3.
+        patience (int, optional): Stop after this number of consecutive batches without improvement larger than tol. Defaults to 2.
+        n_candidates (int, optional): Candidates evaluated by the acquisition function. Defaults to 2000.
+        seed (int | None, optional): Seed for the initial design and the candidates. Defaults to None.
+        verbose (bool, optional): Defaults to True.
+        **kwargs: Other arguments passed to parametric.analysis (e.g. n_workers, path_store).
+
+    Returns:
+        pd.Series: Best feasible run (inputs and outputs). If no run is feasible, the one with best objective.
+        pd.DataFrame: All the runs, with columns "batch" (0 for the initial design) and "feasible".
+
+    Raises:
+        ValueError: If no run produced the objective (e.g. all of them failed).
+    """
+    constraints = {} if constraints is None else constraints
+    (problem, units_in) = problem_from_params(params_in)
+    cols_in = problem["names"]
+    (low, high) = np.array(problem["bounds"]).T
+    params_out = [objective] + [lbl for lbl in constraints if lbl != objective]
+    sign = -1. if maximise else 1.
+
+    def run(points: np.ndarray, batch: int, index_start: int) -> pd.DataFrame:
+        cases = pd.DataFrame(low + points * (high - low), columns=cols_in)
+        cases.index = cases.index + index_start
+        runs = parametric.analysis(
+            cases, units_in, params_out=params_out, sim_base=sim_base,
+            save_timings=False, verbose=False, **kwargs,
+        )
+        runs["batch"] = batch
+        return runs
+
+    def is_feasible(runs: pd.DataFrame) -> pd.Series:
+        feasible = runs[objective].notna()
+        for (lbl, (c_low, c_high)) in constraints.items():
+            if c_low is not None:
+                feasible &= runs[lbl] >= c_low
+            if c_high is not None:
+                feasible &= runs[lbl] <= c_high
+        return feasible
+
+    def best_value(runs: pd.DataFrame) -> float:
+        values = sign * runs.loc[is_feasible(runs), objective]
+        return values.min() if len(values) > 0 else np.inf
+
+    initial = qmc.LatinHypercube(d=len(cols_in), seed=seed).random(min(n_initial, max_runs))
+    runs = run(initial, 0, 0)
+    best = best_value(runs)
+    batch = 0
+    without_improvement = 0
+    while len(runs) < max_runs and without_improvement < patience:
+        batch += 1
+        X = (runs[cols_in].to_numpy(dtype=float) - low) / (high - low)
+        (points, _) = propose_batch(
+            X,
+            sign * runs[objective].to_numpy(dtype=float),
+            min(batch_size, max_runs - len(runs)),
+            constraints=[
+                (runs[lbl].to_numpy(dtype=float), c_low, c_high)
+                for (lbl, (c_low, c_high)) in constraints.items()
+            ],
+            n_candidates=n_candidates,
+            seed=None if seed is None else seed + batch,
+        )
+        runs = pd.concat([runs, run(points, batch, len(runs))])
+        best_new = best_value(runs)
+        if np.isfinite(best_new) and (
+            not np.isfinite(best) or best - best_new > tol * abs(best)
+        ):
+            without_improvement = 0
+        else:
+            without_improvement += 1
+        best = min(best, best_new)
+        if verbose:
+            print(f"BATCH {batch}: {len(runs)} runs, best {objective} = {sign*best:.4g}")
+
+    runs["feasible"] = is_feasible(runs)
+    if runs[objective].isna().all():
+        raise ValueError(f"none of the {len(runs)} runs produced {objective} (see the warnings of the failed runs)")
+    candidates = runs[runs["feasible"]] if runs["feasible"].any() else runs
+    idx_best = (sign * candidates[objective]).idxmin()
+    return (runs.loc[idx_best], runs)
+
+
+#-------------
+def non_dominated_sort(F: np.ndarray) -> np.ndarray:
+    """Rank of each point in a non-dominated sorting (minimisation). Rank 0 is the Pareto front.
+
+    Args:
+        F (np.ndarray): Objectives, shape (n, n_objectives).
+
+    Returns:
+        np.ndarray: Rank of each point, shape (n,).
+    """
+    F = np.asarray(F, dtype=float)
+    # dominates[i,j]: i dominates j
+    dominates = (
+        (F[:, np.newaxis, :] <= F[np.newaxis, :, :]).all(axis=2)
+        & (F[:, np.newaxis, :] < F[np.newaxis, :, :]).any(axis=2)
+    )
+    n_dominating = dominates.sum(axis=0)
+    rank = np.full(len(F), -1)
+    current = 0
+    remaining = np.ones(len(F), dtype=bool)
+    while remaining.any():
+        front = remaining & (n_dominating == 0)
+        rank[front] = current
+        remaining &= ~front
+        n_dominating -= dominates[front].sum(axis=0)
+        current += 1
+    return rank
+
+
+def crowding_distance(F: np.ndarray) -> np.ndarray:
+    """Crowding distance of the points of a front. The extreme points have infinite distance.
+
+    Args:
+        F (np.ndarray): Objectives of the front, shape (n, n_objectives).
+
+    Returns:
+        np.ndarray: Crowding distance of each point, shape (n,).
+    """
+    F = np.asarray(F, dtype=float)
+    (n, m) = F.shape
+    distance = np.zeros(n)
+    if n <= 2:
+        return np.full(n, np.inf)
+    for k in range(m):
+        order = np.argsort(F[:, k])
+        values = F[order, k]
+        span = values[-1] - values[0]
+        distance[order[[0, -1]]] = np.inf
+        if span > 0:
+            distance[order[1:-1]] += (values[2:] - values[:-2]) / span
+    return distance
+
+
+def _rank_population(
+        F: np.ndarray,
+        violation: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Rank and crowding distance, with the constrained-domination rule: feasible points are ranked by non-dominated sorting, and the infeasible ones after them, by their violation."""
+    rank = np.zeros(len(F), dtype=int)
+    crowding = np.zeros(len(F))
+    feasible = violation <= 0.
+    if feasible.any():
+        rank[feasible] = non_dominated_sort(F[feasible])
+        for r in np.unique(rank[feasible]):
+            members = np.flatnonzero(feasible & (rank == r))
+            crowding[members] = crowding_distance(F[members])
+    infeasible = np.flatnonzero(~feasible)
+    start = rank[feasible].max() + 1 if feasible.any() else 0
+    rank[infeasible[np.argsort(violation[infeasible], kind="stable")]] = start + np.arange(len(infeasible))
+    return (rank, crowding)
+
+
+def pareto_search(
+        params_in: dict[str, VariableList | list],
+        objectives: dict[str, str],
+        constraints: dict[str, tuple[float | None, float | None]] | None = None,
+        sim_base: general.Simulation = general.Simulation(),
+        pop_size: int = 20,
+        n_generations: int = 10,
+        crossover_prob: float = 0.9,
+        eta_crossover: float = 15.,
+        eta_mutation: float = 20.,
+        seed: int | None = None,
+        verbose: bool = True,
+        **kwargs,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Multi-objective search (NSGA-II) of the Pareto front between several outputs.
+
+    Each VariableList in params_in is a continuous range (simulated binary crossover and polynomial mutation), and each plain list is a categorical parameter (uniform crossover and random mutation), e.g. "DEWH" with heater instances, "household.control_type" or "controller.time_start". The population of each generation is evaluated as one batch with parametric.analysis (so it can be run in parallel with n_workers). Cases already evaluated in previous generations are not run again.
+
+    Args:
+        params_in (dict[str, VariableList | list]): dictionary with (parameter : values). Keys replacing a whole component (e.g. "DEWH") must be before the keys modifying it (e.g. "DEWH.vol").
+        objectives (dict[str, str]): Outputs to optimise, with "min" or "max". E.g. {"annual_hw_household_cost": "min", "annual_emissions_marginal": "min"}.
+        constraints (dict[str, tuple[float | None, float | None]] | None, optional): Outputs that must be within (low, high), with None for no bound. Defaults to None.
+        sim_base (general.Simulation, optional): Simulation instance used as base case. Defaults to general.Simulation().
+        pop_size (int, optional): Population size. Defaults to 20.
+        n_generations (int, optional): Number of generations (including the initial population). Defaults to 10.
+        crossover_prob (float, optional): Probability of crossover of each pair of parents. Defaults to 0.9.
+        eta_crossover (float, optional): Distribution index of the simulated binary crossover. Defaults to 15.
+        eta_mutation (float, optional): Distribution index of the polynomial mutation. Defaults to 20.
+        seed (int | None, optional): Seed of the search. Defaults to None.
+        verbose (bool, optional): Defaults to True.
+        **kwargs: Other arguments passed to parametric.analysis (e.g. n_workers, save_results_detailed and dir_output to keep the simulations).
+
+    Returns:
+        pd.DataFrame: Pareto front (feasible non-dominated runs among all the evaluated), sorted by the first objective.
+        pd.DataFrame: All the runs, with columns "generation", "feasible" and "rank" (0 for the Pareto front).
+    """
+    constraints = {} if constraints is None else constraints
+    for (lbl, sense) in objectives.items():
+        if sense not in ["min", "max"]:
+            raise ValueError(f"objective {lbl} must be 'min' or 'max', not {sense}")
+    signs = np.array([1. if sense == "min" else -1. for sense in objectives.values()])
+    params_out = list(objectives) + [lbl for lbl in constraints if lbl not in objectives]
+    rng = np.random.default_rng(seed)
+
+    cols_in = list(params_in.keys())
+    units_in = {}
+    genes = []          # (low, high) for continuous, list of values for categorical
+    for lbl in cols_in:
+        values = params_in[lbl]
+        if type(values)==VariableList:
+            units_in[lbl] = values.unit
+            values = values.get_values(values.unit)
+            genes.append((float(min(values)), float(max(values))))
+        else:
+            units_in[lbl] = None
+            genes.append(list(values))
+    categorical = np.array([isinstance(gene, list) for gene in genes])
+    n_options = np.array([len(gene) if isinstance(gene, list) else 0 for gene in genes])
+
+    def decode(genome: np.ndarray) -> list:
+        row = []
+        for (gene, x) in zip(genes, genome):
+            if isinstance(gene, list):
+                row.append(gene[int(x)])
+            else:
+                row.append(gene[0] + x * (gene[1] - gene[0]))
+        return row
+
+    def key(genome: np.ndarray) -> tuple:
+        return tuple(np.round(genome, 9))
+
+    evaluated: dict[tuple, int] = {}        # genome key: index in runs
+    runs = pd.DataFrame()
+
+    def evaluate(population: np.ndarray, generation: int) -> np.ndarray:
+        nonlocal runs
+        new = {}
+        for genome in population:
+            if key(genome) not in evaluated and key(genome) not in new:
+                new[key(genome)] = genome
+        if new:
+            cases = pd.DataFrame([decode(g) for g in new.values()], columns=cols_in)
+            cases.index = cases.index + len(runs)
+            runs_new = parametric.analysis(
+                cases, units_in, params_out=params_out, sim_base=sim_base,
+                save_timings=False, verbose=False, **kwargs,
+            )
+            runs_new["generation"] = generation
+            runs = pd.concat([runs, runs_new])
+            evaluated.update(zip(new.keys(), runs_new.index))
+        return np.array([evaluated[key(genome)] for genome in population])
+
+    def fitness(indexes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        values = runs.loc[indexes]
+        F = values[list(objectives)].to_numpy(dtype=float) * signs
+        violation = np.zeros(len(values))
+        for (lbl, (c_low, c_high)) in constraints.items():
+            g = values[lbl].to_numpy(dtype=float)
+            if c_low is not None:
+                violation += np.maximum(0., c_low - g)
+            if c_high is not None:
+                violation += np.maximum(0., g - c_high)
+        violation[~np.isfinite(F).all(axis=1) | ~np.isfinite(violation)] = np.inf
+        return (F, violation)
+
+    def random_population(n: int) -> np.ndarray:
+        population = rng.random((n, len(genes)))
+        population[:, categorical] = np.floor(population[:, categorical] * n_options[categorical])
+        return population
+
+    def offspring(parents: np.ndarray) -> np.ndarray:
+        children = parents.copy()
+        for i in range(0, len(parents) - 1, 2):
+            if rng.random() > crossover_prob:
+                continue
+            (p1, p2) = (parents[i], parents[i+1])
+            u = rng.random(len(genes))
+            beta = np.where(
+                u <= 0.5,
+                (2 * u)**(1 / (eta_crossover + 1)),
+                (1 / (2 * (1 - u)))**(1 / (eta_crossover + 1)),
+            )
+            swap = rng.random(len(genes)) < 0.5
+            children[i] = np.where(categorical, np.where(swap, p2, p1), 0.5 * ((1 + beta) * p1 + (1 - beta) * p2))
+            children[i+1] = np.where(categorical, np.where(swap, p1, p2), 0.5 * ((1 - beta) * p1 + (1 + beta) * p2))
+        mutate = rng.random(children.shape) < 1. / len(genes)
+        u = rng.random(children.shape)
+        delta = np.where(
+            u < 0.5,
+            (2 * u)**(1 / (eta_mutation + 1)) - 1,
+            1 - (2 * (1 - u))**(1 / (eta_mutation + 1)),
+        )
+        reset = random_population(len(children))
+        children = np.where(mutate & ~categorical, children + delta, children)
+        children = np.where(mutate & categorical, reset, children)
+        return np.clip(children, 0., np.where(categorical, n_options - 1, 1.))
+
+    population = random_population(pop_size)
+    indexes = evaluate(population, 0)
+    for generation in range(1, n_generations):
+        (F, violation) = fitness(indexes)
+        (rank, crowding) = _rank_population(F, violation)
+        # binary tournament
+        (a, b) = rng.integers(pop_size, size=(2, pop_size))
+        a_wins = (rank[a] < rank[b]) | ((rank[a] == rank[b]) & (crowding[a] > crowding[b]))
+        parents = population[np.where(a_wins, a, b)]
+        children = offspring(parents)
+        indexes_children = evaluate(children, generation)
+
+        # survivors: best pop_size of parents and children
+        population_all = np.vstack([population, children])
+        indexes_all = np.concatenate([indexes, indexes_children])
+        (F, violation) = fitness(indexes_all)
+        (rank, crowding) = _rank_population(F, violation)
+        survivors = np.lexsort((-crowding, rank))[:pop_size]
+        (population, indexes) = (population_all[survivors], indexes_all[survivors])
+        if verbose:
+            print(f"GENERATION {generation}: {len(runs)} runs, {int((rank[survivors] == 0).sum())} in the first front")
+
+    (F, violation) = fitness(runs.index.to_numpy())
+    (rank, _) = _rank_population(F, violation)
+    runs["feasible"] = violation <= 0.
+    runs["rank"] = rank
+    front = runs[runs["feasible"] & (runs["rank"] == 0)]
+    front = front.sort_values(list(objectives)[0], ascending=(signs[0] > 0))
+    return (front, runs)
@@ -2,8 +2,18 @@
 
 import os
 import copy
+import hashlib
+import json
 import itertools
 import pickle
+import traceback
+import warnings
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import (dataclass, fields, replace)
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor, wait)
+from concurrent.futures.process import BrokenProcessPool
+from typing import (Any, Callable)
 import numpy as np
 import pandas as pd
 
@@ -11,22 +21,48 @@ import tm_solarshift.general as general
 from tm_solarshift.models import postprocessing
 from tm_solarshift.constants import (DIRECTORY, SIMULATIONS_IO)
 from tm_solarshift.utils.units import (Variable, VariableList)
+from tm_solarshift.utils.profiling import (Profiler, flatten_timings)
+from tm_solarshift.utils.cache import Prefetcher
+from tm_solarshift.utils.progress import ProgressTracker
+from tm_solarshift.utils.pipeline import Pipeline
+from tm_solarshift.analysis.results import (ResultsStore, DetailedStore, to_builtin, to_json)
+from tm_solarshift.analysis.scheduling import (
+    RuntimeModel, MemoryLimiter, estimate_memory, longest_first, peak_rss, reset_peak_rss,
+)
 from tm_solarshift.models.dewh import ResistiveSingle
 from tm_solarshift.models.gas_heater import GasHeaterInstantaneous
 
 PARAMS_OUT = SIMULATIONS_IO.OUTPUT_ANALYSIS_TM
+# parameters that only affect the economic postprocessing (not the thermal simulation)
+PARAMS_ECONOMIC = [
+    "household.tariff_type",
+    "household.old_heater",
+    "household.new_system",
+]
+# outputs of finance.analysis, calculated only if they are in params_out
+PARAMS_FINANCE = SIMULATIONS_IO.OUTPUT_ANALYSIS_FIN
+SAMPLING_METHODS = ["full", "lhs", "sobol", "halton"]
+# cheap settings of the first phase of analysis_two_phase
+COARSE_SETTINGS = {"time_params.STEP": Variable(30, "min")}
 showfig = False
 
 #-------------
 def settings(
         params_in : dict[str, VariableList] = {},
+        method: str = "full",
+        n_samples: int | None = None,
+        seed: int | None = None,
         ) -> tuple[pd.DataFrame, dict]:
     """ 
-    This function creates a parametric run. A pandas dataframe with all the runs required. In practice, it is a cross product between the variables values.
-    The order of running for params_in is "first=outer".
+    This function creates a parametric run. A pandas dataframe with all the runs required. By default (method="full"), it is a cross product between the variables values, and the order of running for params_in is "first=outer".
+
+    With method "lhs" (Latin hypercube), "sobol" or "halton", n_samples runs are taken from a space-filling design instead, so the number of runs does not grow with the number of parameters. In this case, each VariableList is a continuous range between its minimum and maximum values, while plain lists are categorical (each value is equally likely).
 
     Args:
         params_in (dict[str, VariableList], optional): dictionary with (parameter : values) parameters.
+        method (str, optional): One of SAMPLING_METHODS: "full", "lhs", "sobol" or "halton". Defaults to "full".
+        n_samples (int | None, optional): Number of runs. Required if method is not "full". For "sobol", powers of 2 are recommended. Defaults to None.
+        seed (int | None, optional): Seed for the sampler (scrambling for "sobol" and "halton"). Defaults to None.
 
     Returns:
         pd.DataFrame: set with simulation runs to be performed in the parametric analysis
@@ -36,22 +72,120 @@ def settings(
     cols_in = params_in.keys()
     params_values = []
     params_units = {}
+    continuous = []
     for lbl in params_in:
         values = params_in[lbl]
         if type(values)==VariableList:
             params_units[lbl] = values.unit
             values = values.get_values(values.unit)
+            continuous.append(True)
         else:
             params_units[lbl] = None
+            continuous.append(False)
         params_values.append(values)
 
-    runs = pd.DataFrame(
-        list(itertools.product(*params_values)), 
-        columns=cols_in,
-        )
+    if method == "full":
+        runs = pd.DataFrame(
+            list(itertools.product(*params_values)), 
+            columns=cols_in,
+            )
+        return (runs, params_units)
+
+    if method not in SAMPLING_METHODS:
+        raise ValueError(f"{method=} is not a valid value. Options: {SAMPLING_METHODS}")
+    if n_samples is None:
+        raise ValueError(f"n_samples is required for {method=}")
+
+    samples = _unit_samples(method, len(params_values), n_samples, seed)
+    columns = {}
+    for (i, lbl) in enumerate(cols_in):
+        values = list(params_values[i])
+        if continuous[i]:
+            (low, high) = (min(values), max(values))
+            columns[lbl] = low + samples[:,i] * (high - low)
+        else:
+            idx = np.minimum((samples[:,i] * len(values)).astype(int), len(values)-1)
+            columns[lbl] = [values[j] for j in idx]
+    runs = pd.DataFrame(columns, columns=cols_in)
     return (runs, params_units)
 
+
+def _unit_samples(
+        method: str,
+        dims: int,
+        n_samples: int,
+        seed: int | None = None,
+) -> np.ndarray:
+    """Samples in the unit hypercube [0,1)^dims, with shape (n_samples, dims)."""
+    from scipy.stats import qmc
+    if method == "lhs":
+        sampler = qmc.LatinHypercube(d=dims, seed=seed)
+    elif method == "sobol":
+        sampler = qmc.Sobol(d=dims, scramble=True, seed=seed)
+    elif method == "halton":
+        sampler = qmc.Halton(d=dims, scramble=True, seed=seed)
+    else:
+        raise ValueError(f"{method=} is not a valid value. Options: {SAMPLING_METHODS}")
+    return sampler.random(n_samples)
+
 #-----------------------------
+@dataclass
+class ExecutionOptions():
+    """How the runs of a parametric analysis are executed, scheduled and reported. The mode is given by path_queue, pipeline and n_workers (see mode).
+
+    Parameters:
+        n_workers (int): Number of worker processes. If larger than 1, the runs are distributed in a process pool. Each worker builds its simulation from sim_base and the case, and only the output values are sent back. With pipeline, number of thermal simulations in flight. Defaults to 1 (serial).
+        pipeline (bool): Run the sweep in this process as a pipeline of three stages connected by bounded queues (see utils.pipeline.Pipeline): input preparation (weather, HWD, PV and control timeseries), thermal model (n_workers simulations in flight, useful for TRNSYS heaters, which run as external processes), and postprocessing (thermal, economic and financial analysis, and storing the results). The inputs of the next runs and the postprocessing of the finished ones run while other runs are being simulated. lookahead is the size of the queues. Defaults to False.
+        path_queue (str | None): SQLite file of a work queue (see analysis.workqueue.WorkQueue). The runs are submitted as jobs, so workers in other processes or machines (``python -m tm_solarshift.worker path_queue``) can run them. This process also works on the sweep until all its jobs are finished. n_workers and prefetch are not used. Defaults to None.
+        sweep_id (str | None): Identifier of the sweep in the work queue. Defaults to a hash of the cases, units, outputs, base simulation and detailed results folder, so submitting the same sweep again resumes it.
+        prefetch (bool): Read the datasets of the next runs in a background thread (see utils.cache.Prefetcher), while the current run is simulated. Only used in serial mode. Defaults to True.
+        lookahead (int): Number of runs prefetched ahead of the current one. Defaults to 2.
+        path_runtimes (str | None): JSON file with the run time model (see analysis.scheduling.RuntimeModel). With n_workers > 1 or path_queue, the thermal simulations are dispatched longest first, according to their estimated time, so the sweep does not end with a long run alone. The model is refined with the timings of the sweep and saved at the end. If None, the estimates use the model's priors and are not saved. Defaults to None.
+        memory_budget (float | None): Memory for the runs of the pool [MB] (see analysis.scheduling.MemoryLimiter). A run only starts if the estimated peaks of the runs in progress fit in the budget, so fewer than n_workers may run at once with long horizons or small timesteps. The estimates are corrected with the peak resident memory measured in the runs already finished (TRNSYS included). If a worker is killed (e.g. by the out-of-memory killer), the pool is restarted with fewer runs at once and the lost runs are repeated. Only used in pool mode. Defaults to None (80% of the memory available at the start).
+        trace_memory (bool): Measure the memory peak of each stage ("{stage}_mem_peak") with tracemalloc. It slows down the runs, and the background prefetching is paused while a run is traced. Not used in pipeline and queue modes (the runs share the process, or the workers are configured apart). Defaults to False (mem_peak is 0).
+        path_status (str | None): JSON file with the progress of the sweep (runs per minute, ETA, latency percentiles per stage, failures and cache hit rate), updated every status_interval seconds (see utils.progress.ProgressTracker). Defaults to None.
+        progress_bar (bool): Show a progress bar with the same metrics in the terminal. Defaults to False.
+        status_interval (float): Seconds between updates of path_status, the progress bar and the progress lines printed with verbose. Defaults to 5.
+    """
+    n_workers: int = 1
+    pipeline: bool = False
+    path_queue: str | None = None
+    sweep_id: str | None = None
+    prefetch: bool = True
+    lookahead: int = 2
+    path_runtimes: str | None = None
+    memory_budget: float | None = None
+    trace_memory: bool = False
+    path_status: str | None = None
+    progress_bar: bool = False
+    status_interval: float = 5.
+
+    @property
+    def mode(self) -> str:
+        """One of EXECUTION_MODES: "queue" (path_queue is given), "pipeline", "pool" (n_workers > 1) or "serial". Raises ValueError if both path_queue and pipeline are given."""
+        if self.path_queue is not None:
+            if self.pipeline:
+                raise ValueError("path_queue and pipeline cannot be used together")
+            return "queue"
+        if self.pipeline:
+            return "pipeline"
+        if self.n_workers > 1:
+            return "pool"
+        return "serial"
+
+
+EXECUTION_MODES = ["serial", "pool", "pipeline", "queue"]
+
+
+def execution_options(
+        execution: ExecutionOptions | None = None,
+        **options,
+) -> ExecutionOptions:
+    """Return a copy of execution (ExecutionOptions() if None) with the fields in options replaced. Raises TypeError if an option is not a field of ExecutionOptions."""
+    execution = ExecutionOptions() if execution is None else execution
+    return replace(execution, **options)
+
+
 def analysis(
     cases_in: pd.DataFrame,
     units_in: dict[str,str],
@@ -60,7 +194,13 @@ def analysis(
     save_results_detailed: bool = False,
     dir_output: str | None = None,
     path_results: str | None = None,
+    save_timings: bool = True,
+    path_store: str | None = None,
+    resume: bool = False,
+    params_economic: list[str] | None = PARAMS_ECONOMIC,
+    execution: ExecutionOptions | None = None,
     verbose: bool = True,
+    **options,
     ) -> pd.DataFrame:
     """Run the parametric analysis
     Parametric.analysis performs a set of simulations changing a set of parameters (params_in).
@@ -71,69 +211,778 @@ def analysis(
         units_in (dict): list of units with params_units[key] = unit
         params_out (List): list of labels of expected output. Defaults to PARAMS_OUT.
         sim_base (_type_, optional): Simulation instance used as base case. Defaults to general.Simulation().
-        save_results_detailed (bool, optional): Defaults to False.
+        save_results_detailed (bool, optional): Store the detailed results (df_tm and df_pv) of each case in "{dir_output}/detailed" (see analysis.results.DetailedStore). Requires dir_output. Defaults to False.
         dir_output (bool, optional): Defaults to None.
-        save_results_general (bool, optional): Defaults to False.
-        path_results (str, optional): Defaults to None.
-        verbose (bool, optional): Defaults to True.
+        path_results (str, optional): csv file where the results table is written at the end. Defaults to None.
+        save_timings (bool, optional): Add the resources used by each stage (Simulation.out["timings"]) as columns "{stage}_{metric}". Use utils.profiling.summary to aggregate them. Defaults to True.
+        path_store (str | None, optional): SQLite file where each case is appended as soon as it finishes (see analysis.results.ResultsStore). Defaults to None.
+        resume (bool, optional): Skip the cases already stored in path_store (their results are loaded from it). Defaults to False.
+        params_economic (list[str] | None, optional): Parameters that only affect the economic analysis (see classify_parameters). Cases that only differ in these parameters share one thermal simulation, and only the economic analysis is repeated. If None, every case is fully simulated. Defaults to PARAMS_ECONOMIC.
+        execution (ExecutionOptions | None, optional): How the runs are executed (serial, process pool, pipeline or work queue), scheduled and reported. Defaults to None (ExecutionOptions()).
+        verbose (bool, optional): Print a summary at the start and a progress line every status_interval seconds (if progress_bar is False). Defaults to True.
+        **options: Fields of ExecutionOptions that replace those of execution, e.g. ``n_workers=8`` (see execution_options).
 
     Returns:
-        pd.DataFrame: An updated version of the runs_in dataframe, with the output values.
+        pd.DataFrame: An updated version of the runs_in dataframe, with the output values (in the same order as cases_in). ``runs_out.attrs`` contains "thermal_runs" (thermal simulations performed), "thermal_runs_saved" (cases that reused another case's thermal simulation) and "failed" (cases that raised an exception; the sweep continues, their outputs are left empty and a warning is issued).
     """
+    execution = execution_options(execution, **options)
+    mode = execution.mode
 
     params_in = cases_in.columns
     runs_out = cases_in.copy()
     for col in params_out:
         runs_out[col] = np.nan
-      
-    for (index, row) in runs_out.iterrows():
-        
+    if dir_output is not None:
+        os.makedirs(dir_output, exist_ok=True)
+
+    results_store = ResultsStore(path_store) if path_store is not None else None
+    pending = list(runs_out.index)
+    if resume:
+        if results_store is None:
+            raise ValueError("resume=True requires a path_store")
+        completed = _load_completed(results_store, cases_in, runs_out)
+        pending = [index for index in pending if index not in completed]
         if verbose:
-            print(f'RUNNING SIMULATION {index+1}/{len(runs_out)}')
-        sim = copy.copy(sim_base)
-        updating_parameters( simulation=sim, row_in = row[params_in], units_in = units_in )
-        sim.run_simulation(verbose=verbose)
-        df_tm = sim.out['df_tm']
-        overall_tm = sim.out["overall_tm"]
-        overall_econ = sim.out["overall_econ"]
-        overall_all = overall_tm | overall_econ
-
-        values_out = [overall_all[lbl] for lbl in params_out]
-        runs_out.loc[index, params_out] = values_out
-        
-        #----------------
-        #General results?
-        if dir_output is not None:
-            if not os.path.exists(dir_output):
-                os.mkdir(dir_output)
-            runs_out.to_csv(path_results)
-                
-        #-----------------
-        #Detailed results?
-        if df_tm is None:
-            continue
-        
-        if save_results_detailed:
-            pickle_path = os.path.join(dir_output, f'sim_{index}.plk')
-            with open(pickle_path, "wb") as file:
-                pickle.dump(sim, file, protocol=pickle.HIGHEST_PROTOCOL)
-    
-        # if gen_plots_detailed:
-        #     postprocessing.detailed_plots(
-        #         sim, df_tm,
-        #         fldr_results_detailed = os.path.join(
-        #             DIR_RESULTS,
-        #             fldr_results_detailed
-        #         ),
-        #         save_plots_detailed = save_plots_detailed,
-        #         case = case,
-        #         showfig = showfig
-        #         )
+            print(f"RESUMING: {len(completed)} cases already in {path_store}")
+
+    groups = plan_runs(cases_in.loc[pending], params_economic)
+    runs_out.attrs["thermal_runs"] = len(groups)
+    runs_out.attrs["thermal_runs_saved"] = len(pending) - len(groups)
+    if verbose:
+        print(f"{len(pending)} cases, {len(groups)} thermal simulations ({len(pending) - len(groups)} saved)")
+
+    dir_detailed = None
+    if save_results_detailed and dir_output is not None:
+        dir_detailed = os.path.join(dir_output, "detailed")
+
+    runtimes = RuntimeModel(execution.path_runtimes)
+    sims_groups = {}
+    if mode in ["queue", "pool"] or execution.path_runtimes is not None:
+        (groups, sims_groups) = schedule_runs(cases_in, groups, units_in, sim_base, runtimes)
+
+    tracker = ProgressTracker(
+        len(pending),
+        path_status = execution.path_status,
+        interval = execution.status_interval,
+        show_bar = execution.progress_bar,
+        log = verbose and not execution.progress_bar,
+    )
+
+    # the runs always return their timings (used by the tracker and the run time model), they are only stored with save_timings
+    wall_times = {}
+    def store(results: dict[Any, dict[str, float]]) -> None:
+        tracker.update(results)
+        for (index, values_out) in results.items():
+            wall_times[index] = {"total_wall_time": values_out.get("total_wall_time", np.nan)}
+            if not save_timings:
+                values_out = {lbl: values_out[lbl] for lbl in params_out}
+            for (lbl, value) in values_out.items():
+                runs_out.loc[index, lbl] = value
+            if results_store is not None:
+                results_store.append(index, cases_in.loc[index].to_dict(), values_out)
+
+    # a failed group does not stop the sweep, its cases are left empty in runs_out
+    def fail(group: list, error: BaseException) -> None:
+        tracker.update(failed=len(group))
+        warnings.warn(
+            f"cases {group} failed: " + "".join(traceback.format_exception_only(error)).strip()
+        )
+
+    try:
+        if mode == "queue":
+            n_failed = _analysis_queue(
+                cases_in, groups, units_in, params_out, sim_base,
+                True, dir_detailed, store, execution.path_queue, execution.sweep_id, verbose,
+            )
+            tracker.update(failed=n_failed)
+        elif mode == "pipeline":
+            n_failed = _analysis_pipeline(
+                cases_in, groups, units_in, params_out, sim_base, execution.n_workers,
+                True, dir_detailed, store, fail, execution.lookahead, verbose,
+            )
+        elif mode == "pool":
+            memory = {
+                group[0]: estimate_memory(sims_groups[group[0]], dir_detailed is not None)
+                for group in groups
+            }
+            limiter = MemoryLimiter(execution.memory_budget)
+            if verbose:
+                n_fit = limiter.max_workers(max(memory.values(), default=0.))
+                if n_fit < execution.n_workers:
+                    print(f"MEMORY BUDGET OF {limiter.budget:.0f} MB: {n_fit} RUNS AT ONCE (estimated)")
+            n_failed = _analysis_pool(
+                cases_in, groups, units_in, params_out, sim_base, execution.n_workers,
+                True, dir_detailed, store, fail, limiter, memory, execution.trace_memory, verbose,
+            )
+        else:
+            n_failed = _analysis_serial(
+                cases_in, groups, units_in, params_out, sim_base,
+                True, dir_detailed, store, fail, execution.prefetch, execution.lookahead,
+                execution.trace_memory,
+            )
+        runs_out.attrs["failed"] = n_failed
             
-        print(runs_out.loc[index])
-        
+    finally:
+        tracker.close()
+        if results_store is not None:
+            results_store.close()
+        if execution.path_runtimes is not None:
+            for group in groups:
+                if group[0] in wall_times and group[0] in sims_groups:
+                    runtimes.update(
+                        sims_groups[group[0]],
+                        {index: wall_times[index] for index in group if index in wall_times},
+                    )
+            runtimes.save()
+
+    if path_results is not None:
+        runs_out.to_csv(path_results)
     return runs_out
 
+
+def _analysis_serial(
+        cases_in: pd.DataFrame,
+        groups: list[list],
+        units_in: dict[str,str],
+        params_out: list,
+        sim_base: general.Simulation,
+        save_timings: bool,
+        dir_detailed: str | None,
+        store: Callable[[dict[Any, dict[str, float]]], None],
+        fail: Callable[[list, BaseException], None],
+        prefetch: bool,
+        lookahead: int,
+        trace_memory: bool = False,
+) -> int:
+    """Run the groups one after the other, reading the datasets of the next ones in the background. Returns the number of cases that failed."""
+    
+    def prefetch_run(group: list) -> None:
+        sim = sim_base.clone()
+        updating_parameters( simulation=sim, row_in = cases_in.loc[group[0]], units_in = units_in )
+        sim.prefetch_datasets()
+
+    prefetcher = Prefetcher(groups, prefetch_run, lookahead=lookahead)
+    n_failed = 0
+    if prefetch:
+        prefetcher.start()
+    try:
+        for (position, group) in enumerate(groups):
+            if prefetch:
+                prefetcher.advance(position)
+            # the allocations of the prefetcher's thread would be traced as part of the run
+            with prefetcher.paused() if (prefetch and trace_memory) else nullcontext():
+                try:
+                    results = run_cases(
+                        sim_base, cases_in.loc[group], units_in, params_out,
+                        save_timings = save_timings,
+                        dir_detailed = dir_detailed,
+                        trace_memory = trace_memory,
+                    )
+                except Exception as error:
+                    fail(group, error)
+                    n_failed += len(group)
+                    continue
+            store(results)
+    finally:
+        if prefetch:
+            prefetcher.stop()
+    return n_failed
+
+
+def _analysis_pool(
+        cases_in: pd.DataFrame,
+        groups: list[list],
+        units_in: dict[str,str],
+        params_out: list,
+        sim_base: general.Simulation,
+        n_workers: int,
+        save_timings: bool,
+        dir_detailed: str | None,
+        store: Callable[[dict[Any, dict[str, float]]], None],
+        fail: Callable[[list, BaseException], None],
+        limiter: MemoryLimiter | None = None,
+        memory: dict[Any, float] | None = None,
+        trace_memory: bool = False,
+        verbose: bool = False,
+) -> int:
+    """Run the groups in a process pool. With a limiter, a group is only submitted when its estimated memory (memory, by the group's first index) fits, and the peak resident memory of the finished runs corrects the estimates. If a worker dies, the pool is restarted with at most half the runs at once, and the lost groups are submitted again (a group that kills the only worker fails). Returns the number of cases that failed."""
+    limiter = MemoryLimiter(np.inf) if limiter is None else limiter
+    memory = {} if memory is None else memory
+    pending = deque(groups)
+    max_running = n_workers
+    n_failed = 0
+    while pending:
+        running = {}
+        try:
+            with ProcessPoolExecutor(
+                max_workers = max_running,
+                initializer = _init_worker,
+                initargs = (sim_base,),
+            ) as executor:
+                while pending or running:
+                    while (
+                        pending and len(running) < max_running
+                        and limiter.admit(memory.get(pending[0][0], 0.))
+                    ):
+                        group = pending.popleft()
+                        estimate = memory.get(group[0], 0.)
+                        future = executor.submit(
+                            _run_cases_worker,
+                            cases_in.loc[group], units_in, params_out, save_timings,
+                            dir_detailed, trace_memory,
+                        )
+                        running[future] = (group, estimate, limiter.start(estimate))
+                    (done, _) = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        error = future.exception()
+                        if isinstance(error, BrokenProcessPool):
+                            raise error
+                        (group, estimate, reserved) = running.pop(future)
+                        if error is not None:
+                            limiter.finish(reserved)
+                            fail(group, error)
+                            n_failed += len(group)
+                            continue
+                        (results, peak) = future.result()
+                        limiter.finish(reserved, estimate, peak)
+                        store(results)
+        except BrokenProcessPool as error:
+            lost = [group for (group, _, _) in running.values()]
+            for (_, _, reserved) in running.values():
+                limiter.finish(reserved)
+            if max_running == 1:
+                # the run killed the worker on its own, it would kill it again
+                for group in lost:
+                    fail(group, error)
+                    n_failed += len(group)
+                continue
+            pending.extendleft(reversed(lost))
+            max_running = max(len(lost) // 2, 1)
+            if verbose:
+                print(f"A WORKER WAS KILLED: RESTARTING THE POOL WITH {max_running} WORKERS ({len(lost)} runs repeated)")
+    return n_failed
+
+
+def _analysis_pipeline(
+        cases_in: pd.DataFrame,
+        groups: list[list],
+        units_in: dict[str,str],
+        params_out: list,
+        sim_base: general.Simulation,
+        n_workers: int,
+        save_timings: bool,
+        dir_detailed: str | None,
+        store: Callable[[dict[Any, dict[str, float]]], None],
+        fail: Callable[[list, BaseException], None],
+        maxsize: int,
+        verbose: bool,
+) -> int:
+    """Run the groups as a pipeline: prepare (one thread) -> thermal model (n_workers threads) -> postprocess (one thread). Memory is not traced, as tracemalloc cannot separate concurrent runs. A group that fails in any stage is passed through the next ones as a _GroupFailure. Returns the number of cases that failed."""
+    from tm_solarshift.models import postprocessing
+    store_detailed = DetailedStore(dir_detailed) if dir_detailed is not None else None
+
+    def guarded(function: Callable[[Any], Any]) -> Callable[[Any], Any]:
+        def stage(item: Any) -> Any:
+            if isinstance(item, _GroupFailure):
+                return item
+            try:
+                return function(item)
+            except Exception as error:
+                group = item if isinstance(item, list) else item[0]
+                return _GroupFailure(group, error)
+        return stage
+
+    def prepare(group: list) -> tuple:
+        sim = sim_base.clone()
+        updating_parameters( simulation=sim, row_in = cases_in.loc[group[0]], units_in = units_in )
+        sim.out = {"timings": {}}
+        profiler = Profiler(timings=sim.out["timings"], trace_memory=False)
+        with profiler.activate(), profiler.stage("total"):
+            ts_tm = sim.create_ts_tm()
+        return (group, sim, profiler, ts_tm)
+
+    def simulate(item: tuple) -> tuple:
+        (group, sim, profiler, ts_tm) = item
+        with profiler.activate(), profiler.stage("total"), profiler.stage("thermal"):
+            with profiler.stage("thermal_model"):
+                sim.out["df_tm"] = sim.run_thermal_model(ts_tm, verbose=False)
+        return (group, sim, profiler)
+
+    def postprocess(item: tuple) -> dict[Any, dict[str, float]]:
+        (group, sim, profiler) = item
+        with profiler.activate(), profiler.stage("total"):
+            with profiler.stage("thermal"), profiler.stage("thermal_analysis"):
+                sim.out["overall_tm"] = postprocessing.thermal_analysis(sim, sim.out["df_tm"])
+            with profiler.stage("economics_analysis"):
+                sim.out["overall_econ"] = postprocessing.economics_analysis(sim)
+        return _group_results(
+            sim, cases_in.loc[group], units_in, params_out, save_timings, store_detailed,
+            trace_memory = False,
+        )
+
+    runner = Pipeline(
+        [
+            ("prepare", guarded(prepare), 1),
+            ("simulate", guarded(simulate), n_workers),
+            ("postprocess", guarded(postprocess), 1),
+        ],
+        maxsize = maxsize,
+    )
+    n_failed = 0
+    for results in runner.run(groups):
+        if isinstance(results, _GroupFailure):
+            fail(results.group, results.error)
+            n_failed += len(results.group)
+            continue
+        store(results)
+    if verbose:
+        print("PIPELINE BUSY TIME [s]: " + ", ".join(
+            f"{name} {busy:.1f}" for (name, busy) in runner.busy.items()
+        ))
+    return n_failed
+
+
+@dataclass
+class _GroupFailure():
+    """A group of cases that raised an exception in a stage of _analysis_pipeline."""
+    group: list
+    error: BaseException
+
+
+def _analysis_queue(
+        cases_in: pd.DataFrame,
+        groups: list[list],
+        units_in: dict[str,str],
+        params_out: list,
+        sim_base: general.Simulation,
+        save_timings: bool,
+        dir_detailed: str | None,
+        store: Callable[[dict[Any, dict[str, float]]], None],
+        path_queue: str,
+        sweep_id: str | None,
+        verbose: bool,
+) -> int:
+    """Run the groups through a WorkQueue. The results of each job (of this or other workers) are stored as soon as the job is finished. Returns the number of cases that failed."""
+    from tm_solarshift import worker
+    from tm_solarshift.analysis.workqueue import WorkQueue
+
+    config = {
+        "sim_base": sim_base,
+        "units_in": units_in,
+        "params_out": list(params_out),
+        "save_timings": save_timings,
+        "dir_detailed": dir_detailed,
+    }
+    if sweep_id is None:
+        # the base simulation is hashed as json, so equal instances give the same id in every process
+        sweep_id = hashlib.sha1(pickle.dumps((
+            cases_in, units_in, list(params_out), save_timings, to_json(sim_base), dir_detailed,
+        ))).hexdigest()[:16]
+    pending = [index for group in groups for index in group]
+    stored = set()
+    with WorkQueue(path_queue) as queue:
+
+        def collect() -> None:
+            results = queue.results(sweep_id)
+            finished = [index for index in pending if index in results and index not in stored]
+            if finished:
+                stored.update(finished)
+                store({index: results[index] for index in finished})
+
+        queue.submit(sweep_id, config, [cases_in.loc[group] for group in groups])
+        if verbose:
+            print(f"SWEEP {sweep_id} SUBMITTED TO {path_queue}: {queue.status(sweep_id)}")
+        worker.work(
+            queue, sweep=sweep_id, poll=1., until_done=True,
+            on_progress=collect, verbose=verbose,
+        )
+        collect()
+        errors = queue.errors(sweep_id)
+    if verbose and errors:
+        print(f"{len(errors)} JOBS FAILED in sweep {sweep_id}:")
+        for (job_id, error) in errors.items():
+            print(f"job {job_id}: {error}")
+    return len(pending) - len(stored)
+
+
+def analysis_two_phase(
+    cases_in: pd.DataFrame,
+    units_in: dict[str,str],
+    objective: str,
+    params_out: list = PARAMS_OUT,
+    sim_base = general.Simulation(),
+    coarse: dict[str, Any] | None = None,
+    top_k: int = 10,
+    maximise: bool = False,
+    constraints: dict[str, tuple[float | None, float | None]] | None = None,
+    margin: float = 0.05,
+    n_check: int = 0,
+    seed: int | None = None,
+    verbose: bool = True,
+    **kwargs,
+) -> tuple[pd.DataFrame, dict[str, Any]]:
+    """Coarse-to-fine parametric analysis. All the cases are first simulated with cheap settings (coarse, e.g. a 30-min timestep), and only the most promising ones are simulated again with sim_base's settings:
+
+    - the top_k cases by objective among the ones that satisfy the constraints,
+    - the cases whose constrained outputs are within margin of a bound (the coarse result could be on the wrong side),
+    - n_check random cases of the rest, to check the prescreen.
+
+    The report compares the rankings of both phases on the refined cases: Spearman's rank correlation of the objective, and the overlap between the top_k of each phase. If the coarse phase ranked the cases well, the correlation and overlap are close to 1 and no check case enters the fine top_k.
+
+    Args:
+        cases_in (pd.DataFrame): a dataframe with all the inputs.
+        units_in (dict[str,str]): units of the parameters (see updating_parameters).
+        objective (str): Output used to rank the cases.
+        params_out (list, optional): list of labels of expected output. The objective and the constrained outputs are added if missing. Defaults to PARAMS_OUT.
+        sim_base (general.Simulation, optional): Simulation instance used as base case, with the full resolution settings. Defaults to general.Simulation().
+        coarse (dict[str, Any] | None, optional): Overrides of sim_base for the first phase (see Simulation.clone). E.g. ``{"time_params.STEP": Variable(30, "min")}`` or a lumped heater model as ``{"DEWH": ...}``. Parameters in cases_in are applied after them. Defaults to COARSE_SETTINGS.
+        top_k (int, optional): Number of best cases refined. Defaults to 10.
+        maximise (bool, optional): Maximise the objective instead of minimising it. Defaults to False.
+        constraints (dict[str, tuple[float | None, float | None]] | None, optional): Outputs that must be within (low, high), with None for no bound. Defaults to None.
+        margin (float, optional): Cases whose coarse value of a constrained output is within margin * (range of the output in the coarse phase) of a bound are refined. Defaults to 0.05.
+        n_check (int, optional): Number of random cases refined to check the prescreen. Defaults to 0.
+        seed (int | None, optional): Seed of the check cases. Defaults to None.
+        verbose (bool, optional): Defaults to True.
+        **kwargs: Other arguments of analysis (e.g. execution, n_workers or path_store), used in both phases. The files and the dir_output of the first phase get a "_coarse" suffix.
+
+    Returns:
+        tuple[pd.DataFrame, dict[str, Any]]:
+            runs: cases_in with the outputs of the fine phase (NaN for the cases not refined), the outputs of the coarse phase as "{output}_coarse", "refined" (why the case was refined: "top_k", "constraint", "check" or "") and "feasible" (according to the latest phase).
+            report: "n_coarse" and "n_fine" (cases of each phase), "time_coarse" and "time_fine" [s], "spearman" (rank correlation of the objective between phases on the refined cases), "top_k_overlap" (fraction of the fine top_k that was in the coarse top_k) and "missed" (cases in the fine top_k that were not in the coarse top_k).
+    """
+    import time
+    from scipy.stats import spearmanr
+
+    coarse = COARSE_SETTINGS if coarse is None else coarse
+    constraints = {} if constraints is None else constraints
+    params_out = list(params_out)
+    for lbl in [objective] + list(constraints):
+        if lbl not in params_out:
+            params_out.append(lbl)
+
+    def feasible(values: pd.DataFrame) -> pd.Series:
+        ok = values[objective].notna()
+        for (lbl, (low, high)) in constraints.items():
+            if low is not None:
+                ok &= values[lbl] >= low
+            if high is not None:
+                ok &= values[lbl] <= high
+        return ok
+
+    def ranking(values: pd.DataFrame) -> pd.Index:
+        ok = values.loc[feasible(values)]
+        return ok[objective].sort_values(ascending=not maximise, kind="stable").index
+
+    def coarse_path(path: str) -> str:
+        (root, ext) = os.path.splitext(path)
+        return f"{root}_coarse{ext}"
+
+    execution = execution_options(
+        kwargs.pop("execution", None),
+        **{field.name: kwargs.pop(field.name) for field in fields(ExecutionOptions) if field.name in kwargs},
+    )
+    kwargs_coarse = dict(kwargs)
+    for key in ["path_results", "path_store", "dir_output"]:
+        if kwargs.get(key) is not None:
+            kwargs_coarse[key] = coarse_path(kwargs[key])
+    execution_coarse = execution
+    if execution.path_status is not None:
+        execution_coarse = replace(execution_coarse, path_status=coarse_path(execution.path_status))
+    if execution.path_queue is not None:
+        execution_coarse = replace(execution_coarse, sweep_id="coarse-" + hashlib.sha1(
+            pickle.dumps((cases_in, units_in, params_out, coarse, to_json(sim_base)))
+        ).hexdigest()[:16])
+
+    # phase 1: every case with the cheap settings
+    time_start = time.time()
+    runs_coarse = analysis(
+        cases_in, units_in,
+        params_out = params_out,
+        sim_base = sim_base.clone(coarse),
+        execution = execution_coarse,
+        verbose = verbose,
+        **kwargs_coarse,
+    )
+    time_coarse = time.time() - time_start
+
+    refined = pd.Series("", index=cases_in.index, dtype=object)
+    refined.loc[ranking(runs_coarse)[:top_k]] = "top_k"
+    for (lbl, bounds) in constraints.items():
+        values = runs_coarse[lbl]
+        scale = values.max() - values.min()
+        for bound in bounds:
+            if bound is None:
+                continue
+            tol = margin * (scale if np.isfinite(scale) and scale > 0 else max(abs(bound), 1.))
+            near = (values - bound).abs() <= tol
+            refined.loc[near & (refined == "")] = "constraint"
+    rest = refined.index[refined == ""]
+    if n_check > 0 and len(rest) > 0:
+        rng = np.random.default_rng(seed)
+        check = rng.choice(len(rest), size=min(n_check, len(rest)), replace=False)
+        refined.loc[rest[np.sort(check)]] = "check"
+    cases_fine = cases_in.loc[refined != ""]
+    if verbose:
+        print(f"REFINING {len(cases_fine)} OF {len(cases_in)} CASES: {refined[refined != ''].value_counts().to_dict()}")
+
+    # phase 2: the selected cases with the full settings
+    time_start = time.time()
+    runs_fine = analysis(
+        cases_fine, units_in,
+        params_out = params_out,
+        sim_base = sim_base,
+        execution = execution,
+        verbose = verbose,
+        **kwargs,
+    )
+    time_fine = time.time() - time_start
+
+    runs = cases_in.copy()
+    cols_out = [col for col in runs_coarse.columns if col not in cases_in.columns]
+    for col in cols_out:
+        runs[col] = runs_fine[col] if col in runs_fine.columns else np.nan
+    for col in cols_out:
+        runs[f"{col}_coarse"] = runs_coarse[col]
+    runs["refined"] = refined
+    values_latest = runs_coarse[params_out].copy()
+    values_latest.loc[cases_fine.index] = runs_fine[params_out]
+    runs["feasible"] = feasible(values_latest)
+
+    # rankings of both phases over the refined cases
+    rank_coarse = ranking(runs_coarse.loc[cases_fine.index])
+    rank_fine = ranking(runs_fine)
+    both = runs_fine[objective].notna() & runs_coarse.loc[cases_fine.index, objective].notna()
+    spearman = np.nan
+    if both.sum() > 2:
+        spearman = float(spearmanr(
+            runs_coarse.loc[cases_fine.index, objective][both],
+            runs_fine[objective][both],
+        ).statistic)
+    k = min(top_k, len(rank_fine))
+    top_fine = list(rank_fine[:k])
+    top_coarse = set(rank_coarse[:top_k])
+    report = {
+        "n_coarse": len(cases_in),
+        "n_fine": len(cases_fine),
+        "time_coarse": time_coarse,
+        "time_fine": time_fine,
+        "spearman": spearman,
+        "top_k_overlap": len(top_coarse.intersection(top_fine)) / k if k > 0 else np.nan,
+        "missed": [index for index in top_fine if index not in top_coarse],
+    }
+    if verbose:
+        print(
+            f"PRESCREEN: spearman={report['spearman']:.3f}, top_k_overlap={report['top_k_overlap']:.2f}, "
+            f"missed={report['missed']}, time coarse/fine={time_coarse:.1f}/{time_fine:.1f} s"
+        )
+    return (runs, report)
+
+
+def classify_parameters(
+        params_in: list[str],
+        params_economic: list[str] | None = PARAMS_ECONOMIC,
+) -> dict[str, str]:
+    """Classify the parameters of a parametric analysis by the stage of the simulation they affect.
+
+    Args:
+        params_in (list[str]): Parameters (as in cases_in's columns).
+        params_economic (list[str] | None, optional): Parameters that only affect the economic analysis. Defaults to PARAMS_ECONOMIC.
+
+    Returns:
+        dict[str, str]: {param: "thermal" or "economic"}. Parameters not in params_economic are "thermal", as they could affect any stage.
+    """
+    params_economic = [] if params_economic is None else params_economic
+    return {
+        param: ("economic" if param in params_economic else "thermal")
+        for param in params_in
+    }
+
+
+def plan_runs(
+        cases_in: pd.DataFrame,
+        params_economic: list[str] | None = PARAMS_ECONOMIC,
+) -> list[list]:
+    """Group the cases that share the same thermal configuration (i.e. only differ in economic parameters, see classify_parameters).
+
+    Args:
+        cases_in (pd.DataFrame): cases of the parametric analysis.
+        params_economic (list[str] | None, optional): Parameters that only affect the economic analysis. If None, each case is a group. Defaults to PARAMS_ECONOMIC.
+
+    Returns:
+        list[list]: groups of cases_in's indexes, in order of first appearance. One thermal simulation is required per group.
+    """
+    if params_economic is None:
+        return [[index] for index in cases_in.index]
+    stages = classify_parameters(list(cases_in.columns), params_economic)
+    params_thermal = [param for (param, stage) in stages.items() if stage == "thermal"]
+    groups: dict[tuple, list] = {}
+    for (index, row) in cases_in.iterrows():
+        # components (e.g. "DEWH") are compared by their attributes, as they are stored in ResultsStore
+        key = tuple(to_json(row[param]) for param in params_thermal)
+        groups.setdefault(key, []).append(index)
+    return list(groups.values())
+
+
+def schedule_runs(
+        cases_in: pd.DataFrame,
+        groups: list[list],
+        units_in: dict[str,str],
+        sim_base: general.Simulation,
+        runtimes: RuntimeModel | None = None,
+) -> tuple[list[list], dict[Any, general.Simulation]]:
+    """Sort the groups of a sweep (see plan_runs) by their estimated run time, longest first. With a pool of workers, this minimises the time the sweep is waiting for the last runs (longest-processing-time-first rule).
+
+    Args:
+        cases_in (pd.DataFrame): cases of the parametric analysis.
+        groups (list[list]): groups of cases_in's indexes.
+        units_in (dict[str,str]): units of the parameters (see updating_parameters).
+        sim_base (general.Simulation): Simulation instance used as base case. It is not modified.
+        runtimes (RuntimeModel | None, optional): Run time model. Defaults to None (priors only).
+
+    Returns:
+        tuple[list[list], dict[Any, general.Simulation]]: the sorted groups, and the simulation of each group (by its first index, without results) used for the estimates.
+    """
+    runtimes = RuntimeModel() if runtimes is None else runtimes
+    sims = {}
+    costs = []
+    for group in groups:
+        sim = sim_base.clone()
+        updating_parameters( simulation=sim, row_in = cases_in.loc[group[0]], units_in = units_in )
+        sims[group[0]] = sim
+        costs.append(runtimes.estimate(sim, n_cases=len(group)))
+    return ([groups[i] for i in longest_first(costs)], sims)
+
+
+def _load_completed(
+        results_store: ResultsStore,
+        cases_in: pd.DataFrame,
+        runs_out: pd.DataFrame,
+) -> set:
+    """Copy the cases already in results_store into runs_out and return their indexes. Raises ValueError if a stored case has different inputs than cases_in (i.e. the store belongs to other sweep)."""
+    stored = results_store.rows()
+    completed = set(stored.keys()) & set(cases_in.index)
+    for index in completed:
+        (params_stored, values_out) = stored[index]
+        params_case = json.loads(to_json(cases_in.loc[index].to_dict()))
+        if params_stored != params_case:
+            raise ValueError(
+                f"case {index} in {results_store.path} has different inputs ({params_stored}) than cases_in ({params_case})"
+            )
+        for (lbl, value) in values_out.items():
+            runs_out.loc[index, lbl] = value
+    return completed
+
+
+def run_cases(
+        sim_base: general.Simulation,
+        cases: pd.DataFrame,
+        units_in: dict[str,str],
+        params_out: list = PARAMS_OUT,
+        save_timings: bool = True,
+        dir_detailed: str | None = None,
+        trace_memory: bool = False,
+        verbose: bool = False,
+) -> dict[Any, dict[str, float]]:
+    """Run cases of a parametric analysis that share the same thermal configuration (see plan_runs). The first case is fully simulated, the rest reuse its thermal simulation (df_pv, df_tm and overall_tm) and only repeat the economic analysis. If params_out includes financial outputs (PARAMS_FINANCE, e.g. "LCOHW"), finance.analysis is calculated from the simulation results.
+
+    Args:
+        sim_base (general.Simulation): Simulation instance used as base case. It is not modified.
+        cases (pd.DataFrame): values of the cases parameters.
+        units_in (dict[str,str]): units of the parameters (see updating_parameters).
+        params_out (list, optional): list of labels of expected output. Defaults to PARAMS_OUT.
+        save_timings (bool, optional): Include the timings of each stage as "{stage}_{metric}". Defaults to True.
+        dir_detailed (str | None, optional): If given, the detailed results (df_tm and df_pv) of each case are stored in this folder (see analysis.results.DetailedStore). Defaults to None.
+        trace_memory (bool, optional): Measure the memory peak of each stage ("{stage}_mem_peak", see utils.profiling.Profiler). It slows down the runs. Defaults to False.
+        verbose (bool, optional): Defaults to False.
+
+    Returns:
+        dict[Any, dict[str, float]]: output values (params_out and timings) for each case index.
+    """
+    sim = sim_base.clone()
+    updating_parameters( simulation=sim, row_in = cases.iloc[0], units_in = units_in )
+    sim.run_simulation(verbose=verbose, trace_memory=trace_memory)
+    store_detailed = DetailedStore(dir_detailed) if dir_detailed is not None else None
+    return _group_results(
+        sim, cases, units_in, params_out, save_timings, store_detailed,
+        trace_memory = trace_memory,
+    )
+
+
+def _group_results(
+        sim_thermal: general.Simulation,
+        cases: pd.DataFrame,
+        units_in: dict[str,str],
+        params_out: list,
+        save_timings: bool,
+        store_detailed: DetailedStore | None,
+        trace_memory: bool = False,
+) -> dict[Any, dict[str, float]]:
+    """Output values of a group of cases, given the simulation of its first case (already run). The rest of the cases reuse its thermal simulation (df_pv, df_tm and overall_tm) and only repeat the economic analysis."""
+    from tm_solarshift.models import postprocessing
+    results = {}
+    for (position, (index, row)) in enumerate(cases.iterrows()):
+        if position == 0:
+            sim = sim_thermal
+        else:
+            sim = sim_thermal.clone()
+            updating_parameters( simulation=sim, row_in = row, units_in = units_in )
+            sim.out = {
+                "df_pv": sim_thermal.out["df_pv"],
+                "df_tm": sim_thermal.out["df_tm"],
+                "overall_tm": sim_thermal.out["overall_tm"],
+                "timings": {},
+            }
+            profiler = Profiler(timings=sim.out["timings"], trace_memory=trace_memory)
+            with profiler.activate(), profiler.stage("total"), profiler.stage("economics_analysis"):
+                sim.out["overall_econ"] = postprocessing.economics_analysis(sim)
+        overall_all = sim.out["overall_tm"] | sim.out["overall_econ"]
+        if any(lbl not in overall_all for lbl in params_out if lbl in PARAMS_FINANCE):
+            from tm_solarshift.analysis import finance
+            profiler = Profiler(timings=sim.out.setdefault("timings", {}), trace_memory=trace_memory)
+            with profiler.activate(), profiler.stage("finance_analysis"):
+                (overall_fin, _) = finance.analysis(sim, run_simulation=False, verbose=False)
+            overall_all = overall_fin | overall_all
+
+        values_out = {lbl: overall_all[lbl] for lbl in params_out}
+        if save_timings:
+            values_out.update(flatten_timings(sim.out["timings"]))
+        results[index] = values_out
+    
+        if store_detailed is not None:
+            store_detailed.append(
+                index, {group: sim.out[group] for group in DetailedStore.GROUPS if group in sim.out}
+            )
+    return results
+
+
+# base simulation of each worker process, set once by _init_worker to avoid sending it with every case
+_WORKER_SIM_BASE: general.Simulation | None = None
+
+def _init_worker(sim_base: general.Simulation) -> None:
+    global _WORKER_SIM_BASE
+    _WORKER_SIM_BASE = sim_base
+
+
+def _run_cases_worker(
+        cases: pd.DataFrame,
+        units_in: dict[str,str],
+        params_out: list,
+        save_timings: bool,
+        dir_detailed: str | None,
+        trace_memory: bool = False,
+) -> tuple[dict[Any, dict[str, float]], float | None]:
+    """Run cases in a worker of the pool. Returns the results and the peak resident memory of the worker during the run [MB] (see scheduling.peak_rss)."""
+    if _WORKER_SIM_BASE is None:
+        raise RuntimeError("worker not initialised, use _init_worker as ProcessPoolExecutor initializer")
+    reset_peak_rss()
+    results = run_cases(
+        _WORKER_SIM_BASE, cases, units_in, params_out,
+        save_timings = save_timings,
+        dir_detailed = dir_detailed,
+        trace_memory = trace_memory,
+    )
+    return (results, peak_rss())
+
 #-------------
 def updating_parameters(
         simulation: general.Simulation,
@@ -141,7 +990,7 @@ def updating_parameters(
         units_in: dict = {},
 ) -> None:
     """Updating parameters for those of the specific run.
-    This function update the simulation object. It takes the string and converts it into GS attributes.
+    This function update the simulation object. It takes the string and converts it into GS attributes. Keys without "." replace a whole attribute (e.g. "DEWH" with a heater instance), so they must be before the keys that modify it (e.g. "DEWH.vol").
 
     Args:
         simulation (general.Simulation): Simulation instance.
@@ -167,35 +1016,34 @@ def updating_parameters(
             setattr(simulation, obj_name, object)
 
         else:
+            # components (e.g. "DEWH": ResistiveSingle()) are copied, so the cases do not share them
+            if key in simulation.COMPONENTS and value is not None:
+                value = copy.copy(value)
             setattr(simulation, key, value)
     return None
 
 #------------------------------
 def test_parametric_run():
     
-    GS_base = general.Simulation()
-    GS_base.DEWH = ResistiveSingle.from_model_file(model="491315")
+    sim_base = general.Simulation()
+    sim_base.DEWH = ResistiveSingle.from_model_file(model="491315")
 
     params_in = {
         'household.location' : ["Sydney",],
-        'household.control_load'  : [0,1,2],
+        'household.control_type'  : ["GS", "CL1", "timer_SS"],
         }
     params_out = SIMULATIONS_IO.OUTPUT_ANALYSIS_TM
-    (runs, params_units) = settings(params_in)
+    (cases_in, units_in) = settings(params_in)
+    dir_output = os.path.join(DIRECTORY.DIR_RESULTS, "parametric_test")
 
     runs = analysis(
-        cases_in = runs,
-        params_in = params_units,
+        cases_in = cases_in,
+        units_in = units_in,
         params_out = params_out,
-        GS_base = GS_base,
+        sim_base = sim_base,
         save_results_detailed = True,
-        gen_plots_detailed    = True,
-        save_plots_detailed   = True,
-        save_results_general  = True,
-        fldr_results_detailed = 'parametric_test',
-        fldr_results_general  = 'parametric_test',
-        file_results_general  = '0-parametric_test.csv',
-        append_results_general = False       #If false, create new file
+        dir_output = dir_output,
+        path_results = os.path.join(dir_output, "0-parametric_test.csv"),
         )
     
     print(runs)
@@ -0,0 +1,218 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+
+if TYPE_CHECKING:
+    from tm_solarshift.general import Simulation
+
+# daily features used to cluster the days: (column of ts_tm, aggregation)
+FEATURES_DAILY = {
+    "GHI": ("GHI", "sum"),
+    "temp_amb": ("temp_amb", "mean"),
+    "temp_mains": ("temp_mains", "mean"),
+    "m_HWD": ("m_HWD", "sum"),
+    "CS": ("CS", "mean"),
+}
+# days simulated before the first representative day, so it does not start with the tank's initial state
+WARMUP_DAYS = 1
+
+#-------------------------
+@dataclass
+class RepresentativeDays():
+    """Representative days of a simulation horizon.
+
+    Parameters:
+        days (np.ndarray): Positions of the representative days (medoids) in the horizon, in chronological order.
+        labels (np.ndarray): For each day of the horizon, the position in days of its representative day.
+        weights (np.ndarray): Number of days represented by each of days.
+        features (pd.DataFrame): Daily features used for the clustering (one row per day).
+    """
+    days: np.ndarray
+    labels: np.ndarray
+    weights: np.ndarray
+    features: pd.DataFrame
+
+    def input_error(self) -> dict[str, float]:
+        """Relative error of the total of each daily feature when each day is replaced by its representative day. It is a cheap estimate of the error of the reconstructed results, available without the full simulation."""
+        errors = {}
+        for (col, values) in self.features.items():
+            total = values.sum()
+            rebuilt = values.to_numpy()[self.days][self.labels].sum()
+            errors[col] = float(abs(rebuilt - total) / abs(total)) if total != 0 else float(abs(rebuilt))
+        return errors
+
+
+def kmedoids(
+        X: np.ndarray,
+        n_clusters: int,
+        seed: int | None = None,
+        max_iter: int = 100,
+) -> tuple[np.ndarray, np.ndarray]:
+    """k-medoids clustering (alternating algorithm, with k-means++ initialisation) with euclidean distances.
+
+    Args:
+        X (np.ndarray): Points, shape (n, d).
+        n_clusters (int): Number of clusters. If larger than n, every point is its own medoid.
+        seed (int | None, optional): Seed of the initialisation. Defaults to None.
+        max_iter (int, optional): Maximum number of iterations. Defaults to 100.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: (medoids, labels) = (sorted positions of the medoids in X, position in medoids of the cluster of each point).
+    """
+    n = len(X)
+    if n_clusters >= n:
+        return (np.arange(n), np.arange(n))
+    dist = np.sqrt(((X[:, None, :] - X[None, :, :])**2).sum(axis=2))
+    rng = np.random.default_rng(seed)
+    medoids = [int(rng.integers(n))]
+    for _ in range(1, n_clusters):
+        d2 = dist[:, medoids].min(axis=1)**2
+        if d2.sum() == 0:
+            candidates = np.setdiff1d(np.arange(n), medoids)
+            medoids.append(int(rng.choice(candidates)))
+        else:
+            medoids.append(int(rng.choice(n, p=d2 / d2.sum())))
+    medoids = np.array(medoids)
+    for _ in range(max_iter):
+        labels = dist[:, medoids].argmin(axis=1)
+        updated = medoids.copy()
+        for c in range(n_clusters):
+            members = np.flatnonzero(labels == c)
+            if len(members) > 0:
+                updated[c] = members[dist[np.ix_(members, members)].sum(axis=1).argmin()]
+        if np.array_equal(updated, medoids):
+            break
+        medoids = updated
+    medoids = np.sort(medoids)
+    labels = dist[:, medoids].argmin(axis=1)
+    return (medoids, labels)
+
+
+def daily_features(
+        sim: Simulation,
+        ts_tm: pd.DataFrame,
+) -> pd.DataFrame:
+    """Daily features of the inputs of a simulation (see FEATURES_DAILY), plus the daily mean of the import tariff (if it is not a gas tariff).
+
+    Args:
+        sim (Simulation): The simulation.
+        ts_tm (pd.DataFrame): Its input timeseries (Simulation.create_ts_tm).
+
+    Returns:
+        pd.DataFrame: One row per day of the horizon.
+    """
+    steps_day = steps_per_day(sim, ts_tm)
+    day = np.arange(len(ts_tm)) // steps_day
+    columns = {
+        label: ts_tm[col].groupby(day).agg(agg)
+        for (label, (col, agg)) in FEATURES_DAILY.items() if col in ts_tm.columns
+    }
+    if sim.household.tariff_type != "gas":
+        from tm_solarshift.timeseries import market
+        ts_mkt = market.load_household_import_rate(
+            ts_tm.index,
+            tariff_type = sim.household.tariff_type,
+            dnsp = sim.household.DNSP,
+            control_type = sim.household.control_type,
+        )
+        columns["tariff"] = pd.Series(ts_mkt["tariff"].to_numpy()).groupby(day).mean()
+    return pd.DataFrame(columns)
+
+
+def steps_per_day(sim: Simulation, ts_tm: pd.DataFrame) -> int:
+    """Timesteps per day. Raises ValueError if the horizon is not made of whole days."""
+    STEP = sim.time_params.STEP.get_value("min")
+    steps_day = 24 * 60 / STEP
+    if steps_day != int(steps_day) or len(ts_tm) % int(steps_day) != 0:
+        raise ValueError("representative days require whole days in the horizon and a STEP that divides a day")
+    return int(steps_day)
+
+
+def select_days(
+        sim: Simulation,
+        ts_tm: pd.DataFrame,
+        n_days: int,
+        seed: int | None = 0,
+) -> RepresentativeDays:
+    """Cluster the days of the horizon by their (standardised) daily features with k-medoids.
+
+    Args:
+        sim (Simulation): The simulation.
+        ts_tm (pd.DataFrame): Its input timeseries (Simulation.create_ts_tm).
+        n_days (int): Number of representative days.
+        seed (int | None, optional): Seed of kmedoids. Defaults to 0.
+
+    Returns:
+        RepresentativeDays: The representative days.
+    """
+    features = daily_features(sim, ts_tm)
+    values = features.to_numpy(dtype=float)
+    std = values.std(axis=0)
+    X = (values - values.mean(axis=0)) / np.where(std > 0, std, 1.)
+    (days, labels) = kmedoids(X, n_days, seed=seed)
+    weights = np.bincount(labels, minlength=len(days))
+    return RepresentativeDays(days=days, labels=labels, weights=weights, features=features)
+
+
+def run_thermal_model(
+        sim: Simulation,
+        ts_tm: pd.DataFrame,
+        verbose: bool = False,
+) -> pd.DataFrame:
+    """Run the thermal model only on the representative days (sim.time_params.REP_DAYS) and reconstruct the results of the whole horizon.
+
+    The representative days are simulated in chronological order as one continuous run (preceded by WARMUP_DAYS), so each day starts from the tank state left by the previous representative day. The run has consecutive dates from the start of the horizon, so the inputs that depend on the real dates are calculated before, if the heater has a ``dated_inputs`` method (e.g. the collector irradiance of SolarThermalElecAuxiliary). Then every day of the horizon takes the results of its representative day, so the thermal and economic analyses are done as usual on the reconstructed df_tm. The clustering is stored in sim.out["representative"] with the relative errors of the daily features ("input_error", see RepresentativeDays.input_error).
+
+    Args:
+        sim (Simulation): The simulation.
+        ts_tm (pd.DataFrame): Its input timeseries (Simulation.create_ts_tm).
+        verbose (bool, optional): Defaults to False.
+
+    Returns:
+        pd.DataFrame: df_tm of the whole horizon (with ts_tm's index).
+    """
+    n_days = int(sim.time_params.REP_DAYS.get_value("d"))
+    steps_day = steps_per_day(sim, ts_tm)
+    reps = select_days(sim, ts_tm, n_days)
+
+    first = int(reps.days[0])
+    warmup = [max(first - WARMUP_DAYS + i, 0) for i in range(WARMUP_DAYS)]
+    sequence = np.concatenate([warmup, reps.days])
+    rows = (sequence[:, None] * steps_day + np.arange(steps_day)[None, :]).ravel()
+    # inputs that depend on the dates (e.g. the sun position for solar collectors) are calculated before the days are moved
+    dated_inputs = getattr(sim.DEWH, "dated_inputs", None)
+    ts_dated = dated_inputs(ts_tm) if dated_inputs is not None else ts_tm
+    ts_seq = ts_dated.iloc[rows].copy()
+    # the thermal models need a regular index. ts_tm's index may not have a freq (e.g. read from a csv), so it comes from STEP
+    STEP = sim.time_params.STEP.get_value("min")
+    ts_seq.index = pd.date_range(ts_tm.index[0], periods=len(ts_seq), freq=f"{STEP}min")
+    df_seq = sim.DEWH.run_thermal_model(ts_seq, verbose=verbose)
+
+    # every day takes the results of its representative day
+    day_rows = (np.arange(len(reps.days)) + WARMUP_DAYS)[reps.labels]
+    rows = (day_rows[:, None] * steps_day + np.arange(steps_day)[None, :]).ravel()
+    df_tm = df_seq.iloc[rows].copy()
+    df_tm.index = ts_tm.index
+    sim.out["representative"] = {
+        "days": [ts_tm.index[int(d) * steps_day] for d in reps.days],
+        "weights": reps.weights.tolist(),
+        "input_error": reps.input_error(),
+    }
+    return df_tm
+
+
+def relative_error(
+        out_full: dict[str, float],
+        out_rep: dict[str, float],
+) -> dict[str, float]:
+    """Relative error of the results with representative days against the full simulation, for the labels in both dictionaries (e.g. overall_tm | overall_econ)."""
+    errors = {}
+    for (lbl, value) in out_full.items():
+        if lbl not in out_rep or not np.isfinite(value):
+            continue
+        diff = abs(out_rep[lbl] - value)
+        errors[lbl] = float(diff / abs(value)) if value != 0 else float(diff)
+    return errors
@@ -0,0 +1,287 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Hashable
+
+import numpy as np
+import pandas as pd
+
+#-------------------------
+def to_builtin(value: Any) -> Any:
+    """Convert numpy scalars into python types, so they can be stored as json."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def case_from_json(text: str) -> Hashable:
+    """Decode a case identifier stored as json. json stores tuples (e.g. the index of a MultiIndex) as lists, which are not hashable, so they are converted back into tuples."""
+    return _to_tuple(json.loads(text))
+
+
+def _to_tuple(value: Any) -> Any:
+    if isinstance(value, list):
+        return tuple(_to_tuple(item) for item in value)
+    return value
+
+
+def to_json(value: Any) -> str:
+    """Convert value into a json string. The values that json cannot store (e.g. a component instance in a cases_in column, such as "DEWH" or "household") are stored as a dictionary with their class and attributes, so equal components give the same string in every process."""
+    return json.dumps(value, default=_json_default)
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, "__dict__"):
+        return {"class": type(value).__name__} | vars(value)
+    return repr(value)
+
+
+class ResultsStore():
+    """Append-only storage of the results of a parametric analysis, in a SQLite file.
+
+    Each case is written (and committed) as soon as it finishes, so a sweep interrupted by a crash or a restart keeps all the finished cases, and it can be resumed (see parametric.analysis(resume=True)). The file uses SQLite's write-ahead log, so it can be read while the sweep is running.
+
+    Parameters:
+        path (str): Path to the SQLite file. It is created if it does not exist.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                case_id TEXT NOT NULL,
+                params_in TEXT NOT NULL,
+                values_out TEXT NOT NULL,
+                finished REAL NOT NULL
+            )"""
+        )
+        self._conn.commit()
+
+    def __enter__(self) -> "ResultsStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.completed())
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def append(
+            self,
+            case: Hashable,
+            params_in: dict[str, Any],
+            values_out: dict[str, Any],
+    ) -> None:
+        """Write the results of one case.
+
+        Args:
+            case (Hashable): Case identifier (the index in cases_in).
+            params_in (dict[str, Any]): Input parameters of the case. The values that json cannot store are converted with to_json.
+            values_out (dict[str, Any]): Output values of the case.
+        """
+        row = (
+            json.dumps(to_builtin(case)),
+            to_json(params_in),
+            to_json(values_out),
+            time.time(),
+        )
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO results (case_id, params_in, values_out, finished) VALUES (?,?,?,?)",
+                row,
+            )
+            self._conn.commit()
+
+    def rows(self) -> dict[Hashable, tuple[dict[str, Any], dict[str, Any]]]:
+        """All the stored cases as {case: (params_in, values_out)}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT case_id, params_in, values_out FROM results ORDER BY id"
+            ).fetchall()
+        # if a case was written more than once, the last one is kept
+        return {
+            case_from_json(case): (json.loads(params_in), json.loads(values_out))
+            for (case, params_in, values_out) in rows
+        }
+
+    def completed(self) -> set[Hashable]:
+        """Identifiers of the cases already stored."""
+        return set(self.rows().keys())
+
+    def get(self, case: Hashable) -> tuple[dict[str, Any], dict[str, Any]]:
+        """Return (params_in, values_out) of a stored case. Raises KeyError if it is not stored."""
+        return self.rows()[to_builtin(case)]
+
+    def load(self) -> pd.DataFrame:
+        """Return the stored results as a dataframe (one row per case, with input and output columns).
+        """
+        rows = self.rows()
+        return pd.DataFrame.from_dict(
+            {case: params_in | values_out for (case, (params_in, values_out)) in rows.items()},
+            orient="index",
+        ).sort_index()
+
+
+class DetailedStore():
+    """Columnar storage of the detailed results (timeseries) of a parametric analysis, as compressed netCDF files.
+
+    Each group of columns (e.g. Simulation.out["df_tm"] and out["df_pv"]) is stored in the folder ``{path}/{group}/``, with one file per writer process (so several processes or machines can write at the same time without locks). In each file, every column is a variable with dimensions (run, time), stored as a compressed float array with one chunk per run. Then, a single column of a single run can be read without reading (or unpickling) anything else.
+
+    All the runs of a group must have the same time index.
+
+    Parameters:
+        path (str): Folder of the store. It is created if it does not exist.
+        writer (str | None, optional): Identifier of the writer, used as file name. Defaults to "{hostname}-{pid}".
+        dtype (str, optional): Type of the stored values. "f4" (float32) takes half the space of "f8" with 7 significant digits. Defaults to "f4".
+        complevel (int, optional): zlib compression level (1-9). Defaults to 4.
+    """
+
+    GROUPS = ["df_tm", "df_pv"]
+
+    def __init__(
+            self,
+            path: str,
+            writer: str | None = None,
+            dtype: str = "f4",
+            complevel: int = 4,
+    ):
+        self.path = path
+        self.writer = f"{socket.gethostname()}-{os.getpid()}" if writer is None else writer
+        self.dtype = dtype
+        self.complevel = complevel
+        self._index: dict[str, dict[Hashable, tuple[str, int]]] = {}
+        os.makedirs(path, exist_ok=True)
+
+    def append(
+            self,
+            case: Hashable,
+            frames: dict[str, pd.DataFrame],
+    ) -> None:
+        """Write the detailed results of one case.
+
+        Args:
+            case (Hashable): Case identifier (the index in cases_in).
+            frames (dict[str, pd.DataFrame]): Dataframes with a DatetimeIndex, by group (e.g. {"df_tm": sim.out["df_tm"]}). Non-numerical columns are not stored.
+        """
+        import netCDF4
+        for (group, df) in frames.items():
+            folder = os.path.join(self.path, group)
+            os.makedirs(folder, exist_ok=True)
+            file_path = os.path.join(folder, f"{self.writer}.nc")
+            index = pd.DatetimeIndex(df.index)
+            exists = os.path.exists(file_path)
+            with netCDF4.Dataset(file_path, "a" if exists else "w") as nc:
+                if not exists:
+                    nc.createDimension("run", None)
+                    nc.createDimension("time", len(index))
+                    time_var = nc.createVariable("time", "i8", ("time",))
+                    time_var.tz = "" if index.tz is None else str(index.tz)
+                    time_var.freq = "" if index.freq is None else index.freq.freqstr
+                    time_var.units = "nanoseconds since 1970-01-01"
+                    time_var[:] = (index.tz_convert(None) if index.tz is not None else index).as_unit("ns").asi8
+                    nc.createVariable("case", str, ("run",))
+                elif len(nc.dimensions["time"]) != len(index):
+                    raise ValueError(
+                        f"{group} of case {case} has {len(index)} timesteps, the store has {len(nc.dimensions['time'])}"
+                    )
+                run = len(nc.dimensions["run"])
+                nc.variables["case"][run] = json.dumps(to_builtin(case))
+                for column in df.columns:
+                    if not pd.api.types.is_numeric_dtype(df[column]):
+                        continue
+                    name = str(column)
+                    if name not in nc.variables:
+                        nc.createVariable(
+                            name, self.dtype, ("run", "time"),
+                            zlib=True, complevel=self.complevel, shuffle=True,
+                            chunksizes=(1, len(index)), fill_value=np.nan,
+                        )
+                    nc.variables[name][run, :] = df[column].to_numpy(dtype=float)
+            self._index.setdefault(group, {})[to_builtin(case)] = (file_path, run)
+
+    def _locate(self, group: str, case: Hashable) -> tuple[str, int]:
+        case = to_builtin(case)
+        if case not in self._index.get(group, {}):
+            self._refresh(group)
+        try:
+            return self._index[group][case]
+        except KeyError:
+            raise KeyError(f"case {case} is not stored in {self.path}/{group}")
+
+    def _refresh(self, group: str) -> None:
+        """Build the index {case: (file, run)} of a group, reading only the case variable of each file."""
+        import netCDF4
+        folder = os.path.join(self.path, group)
+        index = {}
+        if os.path.isdir(folder):
+            for file_name in sorted(os.listdir(folder)):
+                if not file_name.endswith(".nc"):
+                    continue
+                file_path = os.path.join(folder, file_name)
+                with netCDF4.Dataset(file_path, "r") as nc:
+                    for (run, case) in enumerate(nc.variables["case"][:]):
+                        index[case_from_json(case)] = (file_path, run)
+        self._index[group] = index
+
+    def cases(self, group: str = "df_tm") -> list[Hashable]:
+        """Cases stored in a group."""
+        self._refresh(group)
+        return list(self._index[group].keys())
+
+    def columns(self, group: str = "df_tm") -> list[str]:
+        """Columns stored in a group."""
+        import netCDF4
+        self._refresh(group)
+        columns: list[str] = []
+        for file_path in sorted({file_path for (file_path, _) in self._index[group].values()}):
+            with netCDF4.Dataset(file_path, "r") as nc:
+                columns += [v for v in nc.variables if v not in ["time", "case"] and v not in columns]
+        return columns
+
+    def load(
+            self,
+            case: Hashable,
+            columns: str | list[str] | None = None,
+            group: str = "df_tm",
+    ) -> pd.Series | pd.DataFrame:
+        """Read the detailed results of one case. Only the requested columns of that case are read from the file.
+
+        Args:
+            case (Hashable): Case identifier.
+            columns (str | list[str] | None, optional): A column (returns a Series), a list of columns, or None for all the columns (returns a DataFrame). Defaults to None.
+            group (str, optional): Group of columns. Defaults to "df_tm".
+
+        Returns:
+            pd.Series | pd.DataFrame: Results with the original DatetimeIndex.
+        """
+        import netCDF4
+        (file_path, run) = self._locate(group, case)
+        with netCDF4.Dataset(file_path, "r") as nc:
+            time_var = nc.variables["time"]
+            index = pd.DatetimeIndex(time_var[:].astype("datetime64[ns]"))
+            if time_var.tz:
+                index = index.tz_localize("UTC").tz_convert(time_var.tz)
+            if time_var.freq:
+                index.freq = time_var.freq
+            names = [v for v in nc.variables if v not in ["time", "case"]] if columns is None else columns
+            if isinstance(names, str):
+                return pd.Series(nc.variables[names][run, :].filled(np.nan), index=index, name=names)
+            return pd.DataFrame(
+                {name: nc.variables[name][run, :].filled(np.nan) for name in names},
+                index=index,
+            )
@@ -0,0 +1,241 @@
+import json
+import os
+import sys
+from typing import (Any, Hashable)
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:     # not available on Windows
+    resource = None  # type: ignore[assignment]
+
+# Prior run time of a thermal simulation: (overhead [s], seconds per timestep), used until a heater has recorded timings.
+# Heaters simulated with TRNSYS (tank heaters and solar thermal) are one order of magnitude slower than the python models, and the heat pump (with its performance map) is the slowest of them.
+RUNTIME_PRIORS = {
+    "resistive": (5., 3e-4),
+    "heat_pump": (8., 9e-4),
+    "gas_storage": (5., 3e-4),
+    "solar_thermal": (8., 5e-4),
+    "gas_instant": (0.5, 2e-5),
+}
+RUNTIME_PRIOR_DEFAULT = (5., 3e-4)
+ECONOMIC_PRIOR = 0.5
+
+#-------------------------
+class RuntimeModel():
+    """Estimates the wall time of the runs of a parametric analysis, to schedule the longest ones first.
+
+    The time of a thermal simulation is modelled as overhead + rate * timesteps for each heater (DEWH.label), where the timesteps come from the horizon (START, STOP) and STEP of the simulation. Both coefficients are fitted by least squares on the timings of previous runs ("total_wall_time"); only the sums of the fit are kept, so the model is refined with every sweep at no cost. Heaters without timings use RUNTIME_PRIORS. Cases that reuse a thermal simulation (see parametric.plan_runs) only repeat the economic analysis, whose time is the mean of the previous ones.
+
+    Parameters:
+        path (str | None, optional): JSON file where the model is persisted. It is read if it exists. Defaults to None (in memory).
+    """
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.stats: dict[str, list[float]] = {}
+        self.economic = [0., 0.]        # [count, sum of times]
+        if path is not None and os.path.isfile(path):
+            with open(path, "r") as file:
+                data = json.load(file)
+            self.stats = {label: list(values) for (label, values) in data["thermal"].items()}
+            self.economic = list(data["economic"])
+
+    @staticmethod
+    def features(sim: Any) -> tuple[str, float]:
+        """Heater label and number of timesteps of a simulation."""
+        START = sim.time_params.START.get_value("hr")
+        STOP = sim.time_params.STOP.get_value("hr")
+        STEP = sim.time_params.STEP.get_value("min")
+        return (sim.DEWH.label, (STOP - START) * 60. / STEP)
+
+    def coefficients(self, label: str) -> tuple[float, float]:
+        """Overhead [s] and seconds per timestep of a heater."""
+        if label not in self.stats:
+            return RUNTIME_PRIORS.get(label, RUNTIME_PRIOR_DEFAULT)
+        (n, sx, sy, sxx, sxy) = self.stats[label]
+        var = n * sxx - sx * sx
+        if var <= 1e-9 * max(n * sxx, 1.):
+            # only one horizon observed: the time is proportional to the timesteps
+            return (0., sy / sx if sx > 0 else 0.)
+        rate = (n * sxy - sx * sy) / var
+        overhead = (sy - rate * sx) / n
+        if rate < 0. or overhead < 0.:
+            return (0., sy / sx if sx > 0 else 0.)
+        return (overhead, rate)
+
+    def estimate(self, sim: Any, n_cases: int = 1) -> float:
+        """Estimated wall time [s] of a group of n_cases sharing the thermal simulation of sim."""
+        (label, steps) = self.features(sim)
+        (overhead, rate) = self.coefficients(label)
+        (count, total) = self.economic
+        economic = total / count if count > 0 else ECONOMIC_PRIOR
+        return overhead + rate * steps + (n_cases - 1) * economic
+
+    def update(
+            self,
+            sim: Any,
+            results: dict[Hashable, dict[str, Any]],
+    ) -> None:
+        """Add the timings of a group (output of parametric.run_cases). The first case is the thermal simulation, the rest only the economic analysis."""
+        times = [values.get("total_wall_time", np.nan) for values in results.values()]
+        if len(times) == 0 or not np.isfinite(times[0]):
+            return None
+        (label, steps) = self.features(sim)
+        stats = self.stats.setdefault(label, [0., 0., 0., 0., 0.])
+        for (i, value) in enumerate([1., steps, times[0], steps * steps, steps * times[0]]):
+            stats[i] += value
+        for value in times[1:]:
+            if np.isfinite(value):
+                self.economic[0] += 1
+                self.economic[1] += value
+        return None
+
+    def save(self) -> None:
+        """Write the model to path (atomically)."""
+        if self.path is None:
+            return None
+        path_tmp = f"{self.path}.tmp"
+        with open(path_tmp, "w") as file:
+            json.dump({"thermal": self.stats, "economic": self.economic}, file, indent=2)
+        os.replace(path_tmp, self.path)
+        return None
+
+
+def longest_first(costs: list[float]) -> list[int]:
+    """Order of the jobs for a longest-processing-time-first schedule: positions of costs in descending order (ties keep their order)."""
+    return sorted(range(len(costs)), key=lambda i: -costs[i])
+
+
+def makespan(
+        costs: list[float],
+        n_workers: int,
+) -> float:
+    """Makespan of running the jobs in the given order on n_workers, each job going to the first worker that is free."""
+    loads = np.zeros(max(n_workers, 1))
+    for cost in costs:
+        loads[np.argmin(loads)] += cost
+    return float(loads.max())
+
+
+#-------------------------
+# Memory of a worker process without a run (interpreter, imports and cached datasets) [MB]
+WORKER_BASE_MEMORY = 250.
+# Timeseries columns held at the peak of a run (weather and demand timeseries, df_tm, df_pv and intermediate copies)
+COLUMNS_PER_STEP = 80
+
+def available_memory() -> float | None:
+    """Memory available for new processes [MB] (MemAvailable in /proc/meminfo). None if it cannot be read (non Linux systems)."""
+    try:
+        with open("/proc/meminfo", "r") as file:
+            for line in file:
+                if line.startswith("MemAvailable:"):
+                    return float(line.split()[1]) / 1024.
+    except OSError:
+        return None
+    return None
+
+
+def reset_peak_rss() -> None:
+    """Reset the peak resident memory of this process (VmHWM), so peak_rss measures the next run only. It only works on Linux, elsewhere peak_rss keeps the peak since the process started."""
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+    return None
+
+
+def peak_rss() -> float | None:
+    """Peak resident memory [MB] of this process (since it started or since reset_peak_rss), plus the peak of its largest finished child process (e.g. TRNSYS). Unlike tracemalloc, it includes native buffers and external processes. The peak of the children cannot be reset, so it may belong to a previous run (a conservative value). None if it cannot be read (e.g. on Windows)."""
+    if resource is None:
+        return None
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    scale = 2**20 if sys.platform == "darwin" else 2**10
+    peak_self = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    try:
+        with open("/proc/self/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    peak_self = float(line.split()[1]) / 1024.
+    except OSError:
+        pass
+    peak_children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return peak_self + peak_children
+
+
+def estimate_memory(
+        sim: Any,
+        save_results_detailed: bool = False,
+) -> float:
+    """Estimated peak memory of a run [MB], from its number of timesteps (see RuntimeModel.features). Storing the detailed results requires an extra copy of the timeseries."""
+    (_, steps) = RuntimeModel.features(sim)
+    columns = COLUMNS_PER_STEP * (1.5 if save_results_detailed else 1.)
+    return steps * columns * 8 / 2**20
+
+
+class MemoryLimiter():
+    """Admission control for a pool of workers, so the runs in progress fit in a memory budget.
+
+    Each run needs WORKER_BASE_MEMORY plus its peak memory. The peak is estimated before the run (e.g. with estimate_memory), and corrected with the peak resident memory measured in the finished runs (see peak_rss, it includes TRNSYS and native buffers): the estimates are scaled by the largest measured/estimated ratio. The correction only comes from finished runs, so the runs started before the first ones finish (and a first run much larger than the rest) rely on the estimates alone; keep a margin in the budget. A new run is only started if it fits in the budget, and if the system still has reserve MB available (otherwise the pool shrinks until other runs finish). There is always at least one run in progress, so the sweep progresses even if a run does not fit.
+
+    Parameters:
+        budget (float | None, optional): Memory for the runs [MB]. Defaults to None (80% of the memory available when it is created, or no limit if it cannot be read).
+        reserve (float, optional): Minimum memory available in the system to start a new run [MB]. Defaults to 500.
+        safety (float, optional): Factor applied to the measured peaks. Defaults to 1.2.
+    """
+    def __init__(
+            self,
+            budget: float | None = None,
+            reserve: float = 500.,
+            safety: float = 1.2,
+    ):
+        if budget is None:
+            available = available_memory()
+            budget = 0.8 * available if available is not None else np.inf
+        self.budget = budget
+        self.reserve = reserve
+        self.safety = safety
+        self.factor = 1.
+        self.in_use = 0.
+        self.running = 0
+
+    def required(self, estimate: float) -> float:
+        """Memory reserved for a run with an estimated peak [MB]."""
+        return WORKER_BASE_MEMORY + estimate * self.factor
+
+    def admit(self, estimate: float) -> bool:
+        """Whether a run with an estimated peak [MB] can start now."""
+        if self.running == 0:
+            return True
+        if self.in_use + self.required(estimate) > self.budget:
+            return False
+        available = available_memory()
+        return available is None or available >= self.reserve
+
+    def start(self, estimate: float) -> float:
+        """Register a run that started. Returns the memory reserved for it (to be given to finish)."""
+        required = self.required(estimate)
+        self.in_use += required
+        self.running += 1
+        return required
+
+    def finish(
+            self,
+            reserved: float,
+            estimate: float | None = None,
+            peak: float | None = None,
+    ) -> None:
+        """Release a run. If its measured peak (peak_rss of the worker, WORKER_BASE_MEMORY included) [MB] is given, it corrects the next estimates."""
+        self.in_use = max(self.in_use - reserved, 0.)
+        self.running = max(self.running - 1, 0)
+        if peak is None or not np.isfinite(peak) or estimate is None or estimate <= 0:
+            return None
+        self.factor = max(self.factor, self.safety * (peak - WORKER_BASE_MEMORY) / estimate)
+        return None
+
+    def max_workers(self, estimate: float) -> int:
+        """Number of runs with an estimated peak [MB] that fit in the budget (at least 1)."""
+        if not np.isfinite(self.budget):
+            return np.iinfo(np.int32).max
+        return max(int(self.budget // self.required(estimate)), 1)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+from typing import Any
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+
+import tm_solarshift.general as general
+from tm_solarshift.constants import SIMULATIONS_IO
+from tm_solarshift.utils.units import VariableList
+from tm_solarshift.analysis import parametric
+
+PARAMS_OUT = SIMULATIONS_IO.OUTPUT_ANALYSIS_TM + SIMULATIONS_IO.OUTPUT_ANALYSIS_ECON
+SA_METHODS = ["sobol", "morris"]
+
+#-------------
+def problem_from_params(
+        params_in: dict[str, VariableList | list[float]],
+) -> tuple[dict[str, Any], dict[str, str | None]]:
+    """Create the SALib problem from a dictionary of parameters.
+    Each parameter is a continuous range between the minimum and maximum of its values.
+
+    Args:
+        params_in (dict[str, VariableList | list[float]]): dictionary with (parameter : values). The keys are Simulation attributes (e.g. "DEWH.vol").
+
+    Returns:
+        dict[str, Any]: SALib problem ("num_vars", "names", "bounds").
+        dict[str, str | None]: units of each parameter.
+    """
+    names = []
+    bounds = []
+    units = {}
+    for (lbl, values) in params_in.items():
+        if type(values)==VariableList:
+            units[lbl] = values.unit
+            values = values.get_values(values.unit)
+        else:
+            units[lbl] = None
+        try:
+            (low, high) = (float(min(values)), float(max(values)))
+        except (TypeError, ValueError):
+            raise ValueError(f"{lbl} must have numerical values for a sensitivity analysis")
+        if low == high:
+            raise ValueError(f"{lbl} has an empty range [{low}, {high}]")
+        names.append(lbl)
+        bounds.append([low, high])
+    problem = {"num_vars": len(names), "names": names, "bounds": bounds}
+    return (problem, units)
+
+
+def sample(
+        problem: dict[str, Any],
+        n_samples: int,
+        method: str = "sobol",
+        num_levels: int = 4,
+        seed: int | None = None,
+) -> pd.DataFrame:
+    """Generate the cases for a global sensitivity analysis.
+
+    Args:
+        problem (dict[str, Any]): SALib problem (see problem_from_params).
+        n_samples (int): Base samples (N). "sobol" generates N*(D+2) cases (Saltelli's scheme, a power of 2 is required), "morris" generates N*(D+1) cases (N trajectories). D is the number of parameters.
+        method (str, optional): One of SA_METHODS. Defaults to "sobol".
+        num_levels (int, optional): Number of grid levels for "morris". Defaults to 4.
+        seed (int | None, optional): Seed of the sampler. Defaults to None.
+
+    Returns:
+        pd.DataFrame: cases_in, in the order expected by sobol_indices/morris_indices. It can be run with parametric.analysis.
+    """
+    if method == "sobol":
+        from SALib.sample import sobol as sobol_sample
+        samples = sobol_sample.sample(
+            problem, n_samples, calc_second_order=False, seed=seed
+        )
+    elif method == "morris":
+        from SALib.sample import morris as morris_sample
+        samples = morris_sample.sample(
+            problem, n_samples, num_levels=num_levels, seed=seed
+        )
+    else:
+        raise ValueError(f"{method=} is not a valid value. Options: {SA_METHODS}")
+    return pd.DataFrame(samples, columns=problem["names"])
+
+
+def sobol_indices(
+        problem: dict[str, Any],
+        Y: pd.DataFrame,
+        num_resamples: int = 100,
+        conf_level: float = 0.95,
+        seed: int | None = None,
+) -> pd.DataFrame:
+    """First-order (S1) and total (ST) Sobol indices of several outputs at once.
+
+    S1 is estimated with Saltelli et al. (2010) and ST with Jansen's estimator, the same used by SALib. Instead of resampling each output and each parameter in a loop, all the bootstrap resamples are taken as a (num_resamples, N) matrix of indexes, and the indices are evaluated for all the parameters, resamples and outputs in one array operation.
+
+    Args:
+        problem (dict[str, Any]): SALib problem (see problem_from_params).
+        Y (pd.DataFrame): Outputs (one column per output), in the order generated by sample(method="sobol").
+        num_resamples (int, optional): Number of bootstrap resamples. Defaults to 100.
+        conf_level (float, optional): Confidence level of the intervals. Defaults to 0.95.
+        seed (int | None, optional): Seed for the bootstrap resamples. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Indices with a (output, parameter) multiindex, and columns "S1", "S1_conf", "ST", "ST_conf". The "_conf" columns are the half-widths of the confidence intervals.
+    """
+    D = problem["num_vars"]
+    step = D + 2
+    values = np.asarray(Y, dtype=float)
+    if values.ndim == 1:
+        values = values[:, np.newaxis]
+    if values.shape[0] % step != 0:
+        raise ValueError(f"Y has {values.shape[0]} rows, it must be a multiple of D+2={step}")
+    N = values.shape[0] // step
+    # outputs are standardised, as the S1 estimator is not invariant to shifts
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values = (values - values.mean(axis=0)) / values.std(axis=0)
+
+    # A, B: (N, K); AB: (D, N, K)
+    blocks = values.reshape(N, step, -1)
+    A = blocks[:, 0, :]
+    B = blocks[:, -1, :]
+    AB = np.moveaxis(blocks[:, 1:-1, :], 1, 0)
+
+    (S1, ST) = _sobol_estimators(A, B, AB)
+
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(N, size=(num_resamples, N))
+    (S1_boot, ST_boot) = _sobol_estimators(A[idx], B[idx], AB[:, idx])
+    z = norm.ppf(0.5 + conf_level / 2.)
+    S1_conf = z * S1_boot.std(axis=1, ddof=1)
+    ST_conf = z * ST_boot.std(axis=1, ddof=1)
+
+    outputs = Y.columns if isinstance(Y, pd.DataFrame) else ["Y"]
+    index = pd.MultiIndex.from_product(
+        [outputs, problem["names"]], names=["output", "parameter"]
+    )
+    return pd.DataFrame(
+        {
+            "S1": S1.T.ravel(),
+            "S1_conf": S1_conf.T.ravel(),
+            "ST": ST.T.ravel(),
+            "ST_conf": ST_conf.T.ravel(),
+        },
+        index=index,
+    )
+
+
+def _sobol_estimators(
+        A: np.ndarray,
+        B: np.ndarray,
+        AB: np.ndarray,
+) -> tuple[np.ndarray, np.ndarray]:
+    """S1 and ST for arrays A, B with shape (..., N, K) and AB with shape (D, ..., N, K).
+    The sample axis (N) is reduced, the results have shape (D, ..., K)."""
+    var = np.concatenate([A, B], axis=-2).var(axis=-2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        S1 = (B * (AB - A)).mean(axis=-2) / var
+        ST = 0.5 * ((A - AB)**2).mean(axis=-2) / var
+    return (S1, ST)
+
+
+def morris_indices(
+        problem: dict[str, Any],
+        X: pd.DataFrame,
+        Y: pd.DataFrame,
+        num_resamples: int = 100,
+        conf_level: float = 0.95,
+        num_levels: int = 4,
+        seed: int | None = None,
+) -> pd.DataFrame:
+    """Morris elementary effects (mu_star, sigma) of several outputs, using SALib.
+
+    Args:
+        problem (dict[str, Any]): SALib problem (see problem_from_params).
+        X (pd.DataFrame): Cases generated by sample(method="morris").
+        Y (pd.DataFrame): Outputs (one column per output), in the same order as X.
+        num_resamples (int, optional): Number of bootstrap resamples for mu_star_conf. Defaults to 100.
+        conf_level (float, optional): Confidence level. Defaults to 0.95.
+        num_levels (int, optional): Number of grid levels used in sample(). Defaults to 4.
+        seed (int | None, optional): Seed for the bootstrap resamples. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Indices with a (output, parameter) multiindex, and columns "mu", "mu_star", "sigma", "mu_star_conf".
+    """
+    from SALib.analyze import morris as morris_analyze
+    results = {}
+    for col in Y.columns:
+        Si = morris_analyze.analyze(
+            problem, np.asarray(X, dtype=float), Y[col].to_numpy(dtype=float),
+            num_resamples=num_resamples, conf_level=conf_level,
+            num_levels=num_levels, seed=seed,
+        )
+        results[col] = pd.DataFrame(
+            {key: Si[key] for key in ["mu", "mu_star", "sigma", "mu_star_conf"]},
+            index=pd.Index(problem["names"], name="parameter"),
+        )
+    return pd.concat(results, names=["output"])
+
+
+#-----------------------------
+def analysis(
+        params_in: dict[str, VariableList | list[float]],
+        n_samples: int,
+        method: str = "sobol",
+        params_out: list[str] = PARAMS_OUT,
+        sim_base: general.Simulation = general.Simulation(),
+        n_workers: int | None = None,
+        num_resamples: int = 100,
+        conf_level: float = 0.95,
+        seed: int | None = None,
+        verbose: bool = True,
+        **kwargs,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Global sensitivity analysis of a set of Simulation parameters.
+
+    The cases are generated with sample() and evaluated with parametric.analysis (so they can be distributed in a pool of processes with n_workers, stored in a ResultsStore and resumed). Then, the indices are calculated for all the outputs.
+
+    Args:
+        params_in (dict[str, VariableList | list[float]]): dictionary with (parameter : values). Only the minimum and maximum values are used.
+        n_samples (int): Base samples (see sample).
+        method (str, optional): One of SA_METHODS. Defaults to "sobol".
+        params_out (list[str], optional): Outputs to analyse. Defaults to PARAMS_OUT (thermal and economic outputs).
+        sim_base (general.Simulation, optional): Simulation instance used as base case. Defaults to general.Simulation().
+        n_workers (int | None, optional): Number of worker processes. If given, it replaces the one of an execution argument (see parametric.ExecutionOptions). Defaults to None (the one of execution, 1 if it is not given).
+        num_resamples (int, optional): Bootstrap resamples for the confidence intervals. Defaults to 100.
+        conf_level (float, optional): Confidence level. Defaults to 0.95.
+        seed (int | None, optional): Seed for the sampler and the bootstrap. Defaults to None.
+        verbose (bool, optional): Defaults to True.
+        **kwargs: Other arguments passed to parametric.analysis (e.g. path_store, resume, execution).
+
+    Returns:
+        pd.DataFrame: Sensitivity indices (see sobol_indices and morris_indices).
+        pd.DataFrame: Cases with their outputs (as returned by parametric.analysis).
+    """
+    (problem, units_in) = problem_from_params(params_in)
+    cases_in = sample(problem, n_samples, method=method, seed=seed)
+    if n_workers is not None:
+        kwargs["n_workers"] = n_workers
+    runs = parametric.analysis(
+        cases_in, units_in,
+        params_out=params_out,
+        sim_base=sim_base,
+        save_timings=False,
+        verbose=verbose,
+        **kwargs,
+    )
+    Y = runs[params_out]
+    if method == "sobol":
+        indices = sobol_indices(
+            problem, Y, num_resamples=num_resamples, conf_level=conf_level, seed=seed
+        )
+    else:
+        indices = morris_indices(
+            problem, cases_in, Y, num_resamples=num_resamples,
+            conf_level=conf_level, seed=seed
+        )
+    return (indices, runs)
@@ -0,0 +1,751 @@
+from __future__ import annotations
+from concurrent.futures import (FIRST_COMPLETED, ProcessPoolExecutor, wait)
+from typing import (Any, Callable, TYPE_CHECKING)
+
+import numpy as np
+import pandas as pd
+
+from tm_solarshift.constants import SIMULATIONS_IO
+
+if TYPE_CHECKING:
+    from tm_solarshift.general import Simulation
+
+MC_METRICS = SIMULATIONS_IO.OUTPUT_ANALYSIS_TM + SIMULATIONS_IO.OUTPUT_ANALYSIS_ECON
+QUANTILES = [0.05, 0.5, 0.95]
+# random streams of a replica, each one seeds a component of the simulation
+STREAMS = ["HWD", "control", "weather"]
+# sampling of the daily draws and weather days: replicas per group (see replica_uniforms)
+SAMPLINGS = {"random": 1, "antithetic": 2, "sobol": 16}
+# importance sampling: default tilts of the uniforms of the daily draws (toward high consumption) and the weather days (toward cold days)
+TILTS = {"HWD": 2., "weather": -2.}
+
+#-------------------------
+class P2Quantile():
+    """Streaming estimate of a quantile with the P² algorithm (Jain and Chlamtac, 1985). It keeps five markers, so memory is constant regardless of the number of values.
+
+    Parameters:
+        p (float): Quantile (between 0 and 1).
+        count (int): Number of values added.
+    """
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self._heights: list[float] = []
+        self._positions = [1., 2., 3., 4., 5.]
+        self._desired = [1., 1. + 2*p, 1. + 4*p, 3. + 2*p, 5.]
+        self._increments = [0., p/2, p, (1+p)/2, 1.]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        q = self._heights
+        if len(q) < 5:
+            q.append(x)
+            q.sort()
+            return None
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i+1])
+        n = self._positions
+        for i in range(k+1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i+1] - n[i] > 1) or (d <= -1 and n[i-1] - n[i] < -1):
+                d = 1. if d > 0 else -1.
+                parabolic = q[i] + d / (n[i+1] - n[i-1]) * (
+                    (n[i] - n[i-1] + d) * (q[i+1] - q[i]) / (n[i+1] - n[i])
+                    + (n[i+1] - n[i] - d) * (q[i] - q[i-1]) / (n[i] - n[i-1])
+                )
+                if q[i-1] < parabolic < q[i+1]:
+                    q[i] = parabolic
+                else:
+                    j = i + int(d)
+                    q[i] = q[i] + d * (q[j] - q[i]) / (n[j] - n[i])
+                n[i] += d
+        return None
+
+    def value(self) -> float:
+        if self.count == 0:
+            return np.nan
+        if self.count < 5:
+            return float(np.quantile(self._heights, self.p))
+        return self._heights[2]
+
+
+class RunningStats():
+    """Streaming statistics of several metrics: count, mean and variance (Welford's algorithm), min, max and quantiles (P2Quantile). The values are not stored, so memory is constant regardless of the number of replicas. NaN values are ignored.
+
+    Parameters:
+        quantiles (list[float], optional): Quantiles estimated for each metric. Defaults to QUANTILES.
+    """
+    def __init__(self, quantiles: list[float] = QUANTILES):
+        self.quantiles = list(quantiles)
+        self.moments: dict[str, list[float]] = {}       # metric: [count, mean, M2, min, max]
+        self.p2: dict[str, list[P2Quantile]] = {}
+
+    def add(self, values: dict[str, float]) -> None:
+        """Add the values of one replica."""
+        for (metric, value) in values.items():
+            value = float(value)
+            if not np.isfinite(value):
+                continue
+            if metric not in self.moments:
+                self.moments[metric] = [0., 0., 0., np.inf, -np.inf]
+                self.p2[metric] = [P2Quantile(p) for p in self.quantiles]
+            m = self.moments[metric]
+            m[0] += 1
+            delta = value - m[1]
+            m[1] += delta / m[0]
+            m[2] += delta * (value - m[1])
+            m[3] = min(m[3], value)
+            m[4] = max(m[4], value)
+            for estimator in self.p2[metric]:
+                estimator.add(value)
+        return None
+
+    def count(self, metric: str) -> int:
+        return int(self.moments[metric][0]) if metric in self.moments else 0
+
+    def mean(self, metric: str) -> float:
+        return self.moments[metric][1] if metric in self.moments else np.nan
+
+    def var(self, metric: str) -> float:
+        """Sample variance."""
+        if self.count(metric) < 2:
+            return np.nan
+        (count, _, M2, _, _) = self.moments[metric]
+        return M2 / (count - 1)
+
+    def sem(self, metric: str) -> float:
+        """Standard error of the mean."""
+        return float(np.sqrt(self.var(metric) / self.count(metric))) if self.count(metric) > 1 else np.nan
+
+    def summary(self) -> pd.DataFrame:
+        """One row per metric with count, mean, std, sem, min, max and the quantiles (as "q{100*p}")."""
+        rows = {}
+        for (metric, (count, mean, _, vmin, vmax)) in self.moments.items():
+            row = {
+                "count": int(count),
+                "mean": mean,
+                "std": np.sqrt(self.var(metric)),
+                "sem": self.sem(metric),
+                "min": vmin,
+                "max": vmax,
+            }
+            for estimator in self.p2[metric]:
+                row[f"q{100*estimator.p:g}"] = estimator.value()
+            rows[metric] = row
+        return pd.DataFrame.from_dict(rows, orient="index")
+
+
+class Estimator():
+    """Statistics of the replicas of a scenario. The replicas of a group (antithetic pair or Sobol block, see SAMPLINGS) are not independent, so the standard error of the mean is calculated from the means of the complete groups (it is NaN until there are two).
+
+    Parameters:
+        group_size (int, optional): Replicas per group. Defaults to 1 (independent replicas).
+        quantiles (list[float], optional): Quantiles estimated for each metric. Defaults to QUANTILES.
+        values (RunningStats): Statistics of the replicas.
+        groups (RunningStats): Statistics of the means of the complete groups (only used if group_size > 1).
+    """
+    def __init__(
+            self,
+            group_size: int = 1,
+            quantiles: list[float] = QUANTILES,
+    ):
+        self.group_size = group_size
+        self.values = RunningStats(quantiles)
+        self.groups = RunningStats([])
+        self._pending: dict[int, list[dict[str, float]]] = {}
+
+    def add(self, replica: int, values: dict[str, float]) -> None:
+        """Add the values of a replica."""
+        self.values.add(values)
+        if self.group_size == 1:
+            return None
+        group = replica // self.group_size
+        members = self._pending.setdefault(group, [])
+        members.append(values)
+        if len(members) == self.group_size:
+            del self._pending[group]
+            self.groups.add({metric: _finite_mean([m.get(metric, np.nan) for m in members]) for metric in values})
+        return None
+
+    def count(self, metric: str) -> int:
+        return self.values.count(metric)
+
+    def mean(self, metric: str) -> float:
+        return self.values.mean(metric)
+
+    def sem(self, metric: str) -> float:
+        """Standard error of the mean."""
+        if self.group_size == 1:
+            return self.values.sem(metric)
+        return self.groups.sem(metric)
+
+    def units(self, metric: str) -> int:
+        """Number of independent values of the mean: replicas, or complete groups if group_size > 1."""
+        if self.group_size == 1:
+            return self.values.count(metric)
+        return self.groups.count(metric)
+
+    def halfwidth(self, metric: str, confidence: float = 0.95) -> float:
+        """Half-width of the confidence interval of the mean (Student's t with units-1 degrees of freedom). NaN with less than two units."""
+        from scipy.stats import t
+        units = self.units(metric)
+        if units < 2:
+            return np.nan
+        return float(t.ppf(0.5 + confidence / 2, units - 1) * self.sem(metric))
+
+    def summary(self) -> pd.DataFrame:
+        """See RunningStats.summary. The sem column takes into account the groups."""
+        summary = self.values.summary()
+        if len(summary) > 0:
+            summary["sem"] = [self.sem(metric) for metric in summary.index]
+        return summary
+
+
+def _finite_mean(values: list[float]) -> float:
+    values = [value for value in values if np.isfinite(value)]
+    return float(np.mean(values)) if len(values) > 0 else np.nan
+
+
+#-------------------------
+def replica_seeds(
+        seed: int,
+        replica: int,
+) -> dict[str, int]:
+    """Seeds of each random stream (STREAMS) of a replica. They are derived with SeedSequence from the study seed and the replica number, so a replica gets the same seeds regardless of how many replicas are run or in which order, and every scenario of a study gets the same seeds (common random numbers, see compare).
+
+    Args:
+        seed (int): Seed of the study.
+        replica (int): Number of the replica.
+
+    Returns:
+        dict[str, int]: {stream: seed}.
+    """
+    state = np.random.SeedSequence(seed, spawn_key=(replica,)).generate_state(len(STREAMS))
+    return {stream: int(value) for (stream, value) in zip(STREAMS, state)}
+
+
+def replica_uniforms(
+        seed: int,
+        replica: int,
+        n_days: int,
+        sampling: str = "random",
+) -> dict[str, np.ndarray] | None:
+    """Uniform numbers that drive the daily consumptions (HWD.daily_uniforms) and the weather days (Weather.uniforms) of a replica, one per day for each. They depend on sampling:
+        - "random": None, the draws come from the seeds of the replica (see replica_seeds).
+        - "antithetic": pairs of replicas, the second one uses 1-u of the first one (a low consumption day is paired with a high consumption one, and a cold day with a warm one).
+        - "sobol": blocks of SAMPLINGS["sobol"] replicas, each block is an independently scrambled Sobol sequence of dimension 2*n_days.
+
+    Args:
+        seed (int): Seed of the study.
+        replica (int): Number of the replica.
+        n_days (int): Days of the horizon.
+        sampling (str, optional): One of SAMPLINGS. Defaults to "random".
+
+    Returns:
+        dict[str, np.ndarray] | None: {"HWD": uniforms, "weather": uniforms}, or None for "random".
+    """
+    if sampling not in SAMPLINGS:
+        raise ValueError(f"sampling must be one of {list(SAMPLINGS)}, got {sampling}")
+    if sampling == "random":
+        return None
+    size = SAMPLINGS[sampling]
+    (group, position) = divmod(replica, size)
+    # a spawn key of different length than replica_seeds', so the streams are independent
+    group_seed = int(np.random.SeedSequence(seed, spawn_key=(group, 0)).generate_state(1)[0])
+    if sampling == "antithetic":
+        u = np.random.default_rng(group_seed).random(2 * n_days)
+        u = u if position == 0 else 1. - u
+    else:
+        from scipy.stats import qmc
+        u = qmc.Sobol(d=2 * n_days, scramble=True, seed=group_seed).random(size)[position]
+    return {"HWD": u[:n_days], "weather": u[n_days:]}
+
+
+def tilted_uniforms(
+        seed: int,
+        replica: int,
+        n_days: int,
+        tilts: dict[str, float] = TILTS,
+) -> tuple[dict[str, np.ndarray], float]:
+    """Uniform numbers of a replica for importance sampling, drawn from an exponentially tilted density in [0,1] instead of the uniform one: g(u) = theta*exp(theta*u)/(exp(theta)-1). A positive tilt favours high values (high consumption days for "HWD") and a negative one low values (cold days for "weather", see Weather.uniforms). The replica is weighted by the likelihood ratio of all its days, so the weighted results are unbiased.
+
+    Args:
+        seed (int): Seed of the study.
+        replica (int): Number of the replica.
+        n_days (int): Days of the horizon.
+        tilts (dict[str, float], optional): Tilt of each stream ("HWD" and "weather"), 0 is no bias. Defaults to TILTS.
+
+    Returns:
+        tuple[dict[str, np.ndarray], float]: (uniforms, weight), uniforms as in replica_uniforms.
+    """
+    # a spawn key different from replica_seeds' and replica_uniforms', so the streams are independent
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(replica, 1)))
+    uniforms = {}
+    log_weight = 0.
+    for stream in ["HWD", "weather"]:
+        v = rng.random(n_days)
+        theta = tilts.get(stream, 0.)
+        if theta == 0.:
+            uniforms[stream] = v
+            continue
+        u = np.log1p(v * np.expm1(theta)) / theta
+        uniforms[stream] = u
+        log_weight += float(np.sum(np.log(np.expm1(theta) / theta) - theta * u))
+    return (uniforms, float(np.exp(log_weight)))
+
+
+def horizon_days(sim: Simulation) -> int:
+    """Number of (calendar) days in the horizon of a simulation."""
+    return len(np.unique(sim.time_params.idx.date))
+
+
+def replica_simulation(
+        sim_base: Simulation,
+        seeds: dict[str, int],
+        uniforms: dict[str, np.ndarray] | None = None,
+) -> Simulation:
+    """Clone of sim_base with the seeds of a replica: HWDInfo.seed_id (daily draws), id (random delays of the CL controllers) and weather.seed (days of "mc" weather). If uniforms are given (see replica_uniforms), they drive the daily draws and the "mc" weather days instead of the seeds."""
+    sim = sim_base.clone()
+    sim.HWDInfo.seed_id = seeds["HWD"]
+    sim.id = seeds["control"]
+    sim.weather.seed = seeds["weather"]
+    if uniforms is not None:
+        sim.HWDInfo.daily_uniforms = uniforms["HWD"]
+        sim.weather.uniforms = uniforms["weather"]
+    return sim
+
+
+def run_replica(
+        sims: dict[str, Simulation],
+        seed: int,
+        replica: int,
+        metrics: list[str] = MC_METRICS,
+        sampling: str = "random",
+        tilts: dict[str, float] | None = None,
+) -> dict[str, dict[str, float]]:
+    """Run a replica of each scenario, all of them with the same seeds and uniforms, and return their metrics (overall_tm and overall_econ).
+
+    Args:
+        sims (dict[str, Simulation]): Base simulation of each scenario.
+        seed (int): Seed of the study.
+        replica (int): Number of the replica.
+        metrics (list[str], optional): Metrics returned. Defaults to MC_METRICS.
+        sampling (str, optional): See replica_uniforms. Defaults to "random".
+        tilts (dict[str, float] | None, optional): If given, the uniforms are tilted for importance sampling (see tilted_uniforms) and sampling is ignored. Defaults to None.
+
+    Returns:
+        dict[str, dict[str, float]]: {scenario: {metric: value}}.
+    """
+    seeds = replica_seeds(seed, replica)
+    n_days = max(horizon_days(sim) for sim in sims.values())
+    if tilts is not None:
+        (uniforms, _) = tilted_uniforms(seed, replica, n_days, tilts)
+    else:
+        uniforms = replica_uniforms(seed, replica, n_days, sampling)
+    results = {}
+    for (name, sim_base) in sims.items():
+        sim = replica_simulation(sim_base, seeds, uniforms)
+        sim.run_simulation()
+        overall = sim.out["overall_tm"] | sim.out["overall_econ"]
+        results[name] = {metric: overall.get(metric, np.nan) for metric in metrics}
+    return results
+
+
+# base simulations of each worker process, set once by _init_worker
+_WORKER_SIMS: dict[str, Simulation] | None = None
+
+def _init_worker(sims: dict[str, Simulation]) -> None:
+    global _WORKER_SIMS
+    _WORKER_SIMS = sims
+
+
+def _run_replica_worker(
+        seed: int,
+        replica: int,
+        metrics: list[str],
+        sampling: str,
+        tilts: dict[str, float] | None,
+) -> dict[str, dict[str, float]]:
+    if _WORKER_SIMS is None:
+        raise RuntimeError("worker not initialised, use _init_worker as ProcessPoolExecutor initializer")
+    return run_replica(_WORKER_SIMS, seed, replica, metrics, sampling, tilts)
+
+
+def run_replicas(
+        sims: dict[str, Simulation],
+        replicas: list[int],
+        seed: int,
+        metrics: list[str],
+        collect: Callable[[int, dict[str, dict[str, float]]], None],
+        sampling: str = "random",
+        n_workers: int = 1,
+        tilts: dict[str, float] | None = None,
+) -> None:
+    """Run the replicas (see run_replica) and give their results to collect(replica, results) as they finish. With n_workers > 1 they run in a process pool, with at most 2*n_workers replicas submitted at a time."""
+    if n_workers <= 1:
+        for replica in replicas:
+            collect(replica, run_replica(sims, seed, replica, metrics, sampling, tilts))
+        return None
+    pending = list(reversed(replicas))
+    with ProcessPoolExecutor(
+        max_workers = n_workers,
+        initializer = _init_worker,
+        initargs = (sims,),
+    ) as executor:
+        running = {}
+        while pending or running:
+            while pending and len(running) < 2 * n_workers:
+                replica = pending.pop()
+                running[executor.submit(_run_replica_worker, seed, replica, metrics, sampling, tilts)] = replica
+            (done, _) = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                collect(running.pop(future), future.result())
+    return None
+
+
+def montecarlo(
+        sim_base: Simulation,
+        n_replicas: int,
+        seed: int | None = None,
+        metrics: list[str] | None = None,
+        sampling: str = "random",
+        quantiles: list[float] = QUANTILES,
+        n_workers: int = 1,
+        verbose: bool = True,
+) -> tuple[pd.DataFrame, Estimator]:
+    """Monte Carlo study of a simulation. Each replica is a clone of sim_base with its own seeds for the daily hot water draws, the random delays of the controller and the random weather days (see replica_seeds), so use a random HWD daily_distribution, a controller with random delays and/or "mc" weather to have variability.
+
+    The metrics of each replica are accumulated in streaming statistics (RunningStats), so memory is constant regardless of the number of replicas.
+
+    Args:
+        sim_base (Simulation): Simulation instance used as base case. It is not modified.
+        n_replicas (int): Number of replicas. With "antithetic" and "sobol" sampling, use a multiple of SAMPLINGS[sampling].
+        seed (int | None, optional): Seed of the study. The same seed gives the same results. Defaults to None (a random seed, stored in summary.attrs["seed"]).
+        metrics (list[str] | None, optional): Outputs of overall_tm and overall_econ to accumulate. Defaults to MC_METRICS.
+        sampling (str, optional): Sampling of the daily draws and weather days, see replica_uniforms. Defaults to "random".
+        quantiles (list[float], optional): Quantiles estimated for each metric. Defaults to QUANTILES.
+        n_workers (int, optional): Number of worker processes. Defaults to 1.
+        verbose (bool, optional): Defaults to True.
+
+    Returns:
+        tuple[pd.DataFrame, Estimator]: (summary, stats). summary has one row per metric (see RunningStats.summary), and attrs "seed", "n_replicas" and "sampling".
+    """
+    seed = np.random.SeedSequence().entropy if seed is None else seed
+    metrics = MC_METRICS if metrics is None else metrics
+    if sampling not in SAMPLINGS:
+        raise ValueError(f"sampling must be one of {list(SAMPLINGS)}, got {sampling}")
+    stats = Estimator(SAMPLINGS[sampling], quantiles)
+    if verbose:
+        print(f"MONTE CARLO: {n_replicas} replicas (seed {seed}, {sampling} sampling), {n_workers} workers")
+    run_replicas(
+        {"base": sim_base}, list(range(n_replicas)), seed, metrics,
+        lambda replica, results: stats.add(replica, results["base"]),
+        sampling = sampling,
+        n_workers = n_workers,
+    )
+    summary = stats.summary()
+    summary.attrs = {"seed": seed, "n_replicas": n_replicas, "sampling": sampling}
+    return (summary, stats)
+
+
+def compare(
+        scenarios: dict[str, Simulation],
+        n_replicas: int,
+        seed: int | None = None,
+        metrics: list[str] | None = None,
+        reference: str | None = None,
+        sampling: str = "random",
+        quantiles: list[float] = QUANTILES,
+        n_workers: int = 1,
+        verbose: bool = True,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Monte Carlo comparison of scenarios (e.g. control types) with common random numbers: every replica runs all the scenarios with the same seeds and uniforms (same daily draws, control delays and weather days), and the differences with the reference scenario are accumulated replica by replica. The random noise shared by the scenarios cancels out in the differences, so they need far fewer replicas than comparing independent studies. The scenarios should have the same horizon and random settings, so they consume the random streams in the same way.
+
+    Args:
+        scenarios (dict[str, Simulation]): Base simulation of each scenario. They are not modified.
+        n_replicas (int): Number of replicas of each scenario.
+        seed (int | None, optional): Seed of the study. Defaults to None (a random seed, stored in attrs["seed"]).
+        metrics (list[str] | None, optional): Outputs of overall_tm and overall_econ to accumulate. Defaults to MC_METRICS.
+        reference (str | None, optional): Scenario used as reference for the differences. Defaults to None (the first one).
+        sampling (str, optional): Sampling of the daily draws and weather days, see replica_uniforms. Defaults to "random".
+        quantiles (list[float], optional): Quantiles estimated for each metric. Defaults to QUANTILES.
+        n_workers (int, optional): Number of worker processes. Defaults to 1.
+        verbose (bool, optional): Defaults to True.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: (summary, differences), both indexed by (scenario, metric). summary has the statistics of each scenario (see RunningStats.summary), and differences the statistics of the paired differences scenario - reference, plus "sem_independent" (the standard error the difference would have with independent replicas) and "variance_reduction" (the ratio of the variances of both).
+    """
+    seed = np.random.SeedSequence().entropy if seed is None else seed
+    metrics = MC_METRICS if metrics is None else metrics
+    reference = list(scenarios)[0] if reference is None else reference
+    if reference not in scenarios:
+        raise ValueError(f"reference {reference} is not one of the scenarios")
+    if sampling not in SAMPLINGS:
+        raise ValueError(f"sampling must be one of {list(SAMPLINGS)}, got {sampling}")
+    group_size = SAMPLINGS[sampling]
+    stats = {name: Estimator(group_size, quantiles) for name in scenarios}
+    stats_diff = {name: Estimator(group_size, quantiles) for name in scenarios if name != reference}
+    collect = _paired_collector(stats, stats_diff, reference, metrics)
+
+    if verbose:
+        print(f"MONTE CARLO: {len(scenarios)} scenarios x {n_replicas} replicas (seed {seed}, {sampling} sampling), {n_workers} workers")
+    run_replicas(scenarios, list(range(n_replicas)), seed, metrics, collect, sampling, n_workers)
+    attrs = {"seed": seed, "n_replicas": n_replicas, "sampling": sampling, "reference": reference}
+    return _tables(stats, stats_diff, reference, attrs)
+
+
+def _paired_collector(
+        stats: dict[str, Estimator],
+        stats_diff: dict[str, Estimator],
+        reference: str | None,
+        metrics: list[str],
+) -> Callable[[int, dict[str, dict[str, float]]], None]:
+    """Collector for run_replicas that adds the results of each scenario to stats, and their differences with the reference to stats_diff."""
+    def collect(replica: int, results: dict[str, dict[str, float]]) -> None:
+        for (name, values) in results.items():
+            stats[name].add(replica, values)
+        for (name, estimator) in stats_diff.items():
+            if name in results:
+                estimator.add(replica, {
+                    metric: results[name][metric] - results[reference][metric] for metric in metrics
+                })
+    return collect
+
+
+def _tables(
+        stats: dict[str, Estimator],
+        stats_diff: dict[str, Estimator],
+        reference: str | None,
+        attrs: dict[str, Any],
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Summary and differences tables of compare and converge."""
+    summary = pd.concat({name: estimator.summary() for (name, estimator) in stats.items()}, names=["scenario", "metric"])
+    differences = pd.concat({name: estimator.summary() for (name, estimator) in stats_diff.items()}, names=["scenario", "metric"]) if stats_diff else pd.DataFrame()
+    if len(differences) > 0:
+        differences["sem_independent"] = [
+            np.sqrt(stats[name].sem(metric)**2 + stats[reference].sem(metric)**2)
+            for (name, metric) in differences.index
+        ]
+        differences["variance_reduction"] = (differences["sem_independent"] / differences["sem"])**2
+    summary.attrs = attrs
+    differences.attrs = dict(attrs)
+    return (summary, differences)
+
+
+def converge(
+        scenarios: dict[str, Simulation],
+        targets: dict[str, float],
+        seed: int | None = None,
+        confidence: float = 0.95,
+        reference: str | None = None,
+        sampling: str = "random",
+        batch_size: int | None = None,
+        min_replicas: int = 8,
+        max_replicas: int = 10000,
+        metrics: list[str] | None = None,
+        quantiles: list[float] = QUANTILES,
+        n_workers: int = 1,
+        verbose: bool = True,
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Monte Carlo study that runs batches of replicas until the mean of each target metric is known with a given precision, instead of a fixed number of replicas. A scenario stops when the half-width of the confidence interval (see Estimator.halfwidth) of every target metric is below its target (e.g. {"annual_hw_household_cost": 2.} for +/-2 AUD), so each scenario only runs the replicas it needs.
+
+    After the first batches (min_replicas), the size of the next batch is the number of replicas the current variances project to reach the targets, between batch_size and the replicas already run (so a poor early estimate cannot launch too many). The replicas use the same seeds in every scenario (common random numbers, see compare), and if a reference is given, the targets apply to the differences with it, which converge much faster than the scenarios themselves.
+
+    Args:
+        scenarios (dict[str, Simulation]): Base simulation of each scenario. They are not modified.
+        targets (dict[str, float]): Target half-width of the confidence interval of each metric, in the units of the metric.
+        seed (int | None, optional): Seed of the study. Defaults to None (a random seed, stored in attrs["seed"]).
+        confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+        reference (str | None, optional): If given, the targets apply to the differences of each scenario with this one, which keeps running while any other scenario does. Defaults to None (the targets apply to each scenario).
+        sampling (str, optional): Sampling of the daily draws and weather days, see replica_uniforms. Defaults to "random".
+        batch_size (int | None, optional): Minimum replicas per batch, rounded up to a multiple of SAMPLINGS[sampling]. Defaults to None (2*n_workers).
+        min_replicas (int, optional): Replicas run before checking the targets. Defaults to 8.
+        max_replicas (int, optional): Maximum replicas per scenario. Scenarios that reach it are reported as not converged. Defaults to 10000.
+        metrics (list[str] | None, optional): Outputs of overall_tm and overall_econ to accumulate (the target metrics are always included). Defaults to MC_METRICS.
+        quantiles (list[float], optional): Quantiles estimated for each metric. Defaults to QUANTILES.
+        n_workers (int, optional): Number of worker processes. Defaults to 1.
+        verbose (bool, optional): Defaults to True.
+
+    Raises:
+        ValueError: If a target metric has no values (e.g. it is not an output of the simulations).
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]: (summary, differences, report). summary and differences as in compare (differences is empty without a reference). report has one row per scenario with the replicas it needed ("n_replicas"), the final half-width of each target metric ("halfwidth_{metric}", of the differences if there is a reference, and of its own mean for the reference), and "converged". report.attrs["n_runs"] is the total number of simulations.
+    """
+    seed = np.random.SeedSequence().entropy if seed is None else seed
+    metrics = list(dict.fromkeys((MC_METRICS if metrics is None else metrics) + list(targets)))
+    if reference is not None and reference not in scenarios:
+        raise ValueError(f"reference {reference} is not one of the scenarios")
+    if sampling not in SAMPLINGS:
+        raise ValueError(f"sampling must be one of {list(SAMPLINGS)}, got {sampling}")
+    group_size = SAMPLINGS[sampling]
+    batch_size = _round_up(max(batch_size or 2 * n_workers, 1), group_size)
+    min_replicas = _round_up(max(min_replicas, 2 * group_size), group_size)
+    stats = {name: Estimator(group_size, quantiles) for name in scenarios}
+    stats_diff = {name: Estimator(group_size, quantiles) for name in scenarios if reference is not None and name != reference}
+    monitored = stats_diff if reference is not None else stats
+    collect = _paired_collector(stats, stats_diff, reference, metrics)
+
+    n_replicas = {name: 0 for name in scenarios}
+    active = set(monitored)
+    n_done = 0
+    while active and n_done < max_replicas:
+        if n_done < min_replicas:
+            size = min_replicas - n_done
+        else:
+            size = _next_batch(monitored, active, targets, confidence, n_done, batch_size)
+        size = min(_round_up(size, group_size), max_replicas - n_done)
+        running = [name for name in scenarios if name in active or name == reference]
+        if verbose:
+            print(f"MONTE CARLO: replicas {n_done}-{n_done + size - 1} of {len(running)} scenarios")
+        run_replicas(
+            {name: scenarios[name] for name in running},
+            list(range(n_done, n_done + size)), seed, metrics, collect, sampling, n_workers,
+        )
+        n_done += size
+        for name in running:
+            n_replicas[name] = n_done
+        if n_done < min_replicas:
+            continue
+        for name in list(active):
+            if all(_halfwidth(monitored[name], metric, confidence) <= target for (metric, target) in targets.items()):
+                active.remove(name)
+                if verbose:
+                    print(f"MONTE CARLO: {name} converged with {n_done} replicas")
+
+    report = pd.DataFrame(index=pd.Index(list(scenarios), name="scenario"))
+    report["n_replicas"] = [n_replicas[name] for name in scenarios]
+    for metric in targets:
+        report[f"halfwidth_{metric}"] = [
+            _halfwidth(monitored.get(name, stats[name]), metric, confidence) for name in scenarios
+        ]
+    report["converged"] = [
+        (name not in active) if name in monitored else len(active) == 0 for name in scenarios
+    ]
+    report.attrs = {"n_runs": int(report["n_replicas"].sum()), "targets": targets, "confidence": confidence}
+    attrs = {"seed": seed, "n_replicas": n_done, "sampling": sampling, "reference": reference}
+    (summary, differences) = _tables(stats, stats_diff, reference, attrs)
+    return (summary, differences, report)
+
+
+def _halfwidth(
+        estimator: Estimator,
+        metric: str,
+        confidence: float,
+) -> float:
+    if estimator.values.count(metric) == 0:
+        raise ValueError(f"target metric {metric} has no values")
+    return estimator.halfwidth(metric, confidence)
+
+
+def _round_up(n: int, multiple: int) -> int:
+    return int(np.ceil(n / multiple) * multiple)
+
+
+def _next_batch(
+        monitored: dict[str, Estimator],
+        active: set[str],
+        targets: dict[str, float],
+        confidence: float,
+        n_done: int,
+        batch_size: int,
+) -> int:
+    """Replicas projected to reach the targets of the active scenarios (the half-width decreases with the square root of the replicas), between batch_size and n_done."""
+    needed = 0.
+    for name in active:
+        for (metric, target) in targets.items():
+            halfwidth = _halfwidth(monitored[name], metric, confidence)
+            if not np.isfinite(halfwidth):
+                continue
+            if target <= 0:
+                return max(batch_size, n_done)
+            needed = max(needed, n_done * (halfwidth / target)**2 - n_done)
+    return int(np.clip(np.ceil(needed), batch_size, max(batch_size, n_done)))
+
+
+def importance_sampling(
+        scenarios: dict[str, Simulation],
+        n_replicas: int,
+        event_metric: str = "t_SOC0",
+        threshold: float = 0.,
+        tilts: dict[str, float] = TILTS,
+        seed: int | None = None,
+        confidence: float = 0.95,
+        metrics: list[str] | None = None,
+        n_workers: int = 1,
+        verbose: bool = True,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Probability of a rare event (by default, running out of hot water: t_SOC0 > 0) estimated with importance sampling. Naive Monte Carlo needs a huge number of replicas when the event happens in a tiny fraction of them. Here the daily consumptions are drawn toward high values and the "mc" weather days toward cold days (see tilted_uniforms), so the event happens often, and each replica is weighted by its likelihood ratio, so the estimate is unbiased.
+
+    The weight of a replica is the product over its days, so the method suits short horizons (days to a few weeks): with long horizons or strong tilts the weights degenerate, which shows as a small effective sample size ("ess"). The replicas use the same uniforms and seeds in every scenario (common random numbers, see compare). Only the daily draws of a random HWD daily_distribution and the days of "mc" weather are biased; the rest of the randomness (control delays, events) is sampled as usual.
+
+    Args:
+        scenarios (dict[str, Simulation]): Base simulation of each scenario (e.g. household types). They are not modified.
+        n_replicas (int): Number of replicas of each scenario.
+        event_metric (str, optional): Output of overall_tm or overall_econ that defines the event. Defaults to "t_SOC0".
+        threshold (float, optional): The event is event_metric > threshold. Defaults to 0.
+        tilts (dict[str, float], optional): Tilts of the daily draws and weather days, see tilted_uniforms. Defaults to TILTS.
+        seed (int | None, optional): Seed of the study. Defaults to None (a random seed, stored in attrs["seed"]).
+        confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+        metrics (list[str] | None, optional): Outputs stored in runs (event_metric is always included). Defaults to None (only event_metric).
+        n_workers (int, optional): Number of worker processes. Defaults to 1.
+        verbose (bool, optional): Defaults to True.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: (estimates, runs). estimates has one row per scenario with the probability of the event, its standard error ("sem") and confidence interval ("ci_low", "ci_high"), the weighted mean of event_metric ("mean"), the replicas with the event ("n_events"), the effective sample size of the weights ("ess"), and the replicas naive Monte Carlo would need for the same standard error ("n_naive"). runs has one row per (scenario, replica) with its "weight", "event" and metrics.
+    """
+    from scipy.stats import norm
+    seed = np.random.SeedSequence().entropy if seed is None else seed
+    metrics = list(dict.fromkeys([event_metric] + ([] if metrics is None else metrics)))
+    n_days = max(horizon_days(sim) for sim in scenarios.values())
+    # a tilt on a stream the simulations do not use only adds variance to the weights
+    tilts = {
+        "HWD": tilts.get("HWD", 0.) if any(sim.HWDInfo.daily_distribution is not None for sim in scenarios.values()) else 0.,
+        "weather": tilts.get("weather", 0.) if any(sim.weather.type_sim == "mc" for sim in scenarios.values()) else 0.,
+    }
+    rows = []
+
+    def collect(replica: int, results: dict[str, dict[str, float]]) -> None:
+        (_, weight) = tilted_uniforms(seed, replica, n_days, tilts)
+        for (name, values) in results.items():
+            rows.append({"scenario": name, "replica": replica, "weight": weight, **values})
+
+    if verbose:
+        print(f"IMPORTANCE SAMPLING: {len(scenarios)} scenarios x {n_replicas} replicas (seed {seed}, tilts {tilts}), {n_workers} workers")
+    run_replicas(scenarios, list(range(n_replicas)), seed, metrics, collect, n_workers=n_workers, tilts=tilts)
+    runs = pd.DataFrame(rows).set_index(["scenario", "replica"]).sort_index()
+    runs["event"] = runs[event_metric] > threshold
+
+    z = norm.ppf(0.5 + confidence / 2)
+    estimates = {}
+    for name in scenarios:
+        run = runs.loc[name]
+        weight = run["weight"].to_numpy()
+        y = weight * run["event"].to_numpy()
+        n = len(y)
+        probability = y.mean()
+        sem = y.std(ddof=1) / np.sqrt(n) if n > 1 else np.nan
+        estimates[name] = {
+            "probability": probability,
+            "sem": sem,
+            "ci_low": max(probability - z * sem, 0.),
+            "ci_high": min(probability + z * sem, 1.),
+            "mean": np.nanmean(weight * run[event_metric].to_numpy()),
+            "n_events": int(run["event"].sum()),
+            "ess": weight.sum()**2 / (weight**2).sum(),
+            "n_naive": probability * (1. - probability) / sem**2 if sem > 0 else np.nan,
+        }
+    estimates = pd.DataFrame.from_dict(estimates, orient="index")
+    estimates.index.name = "scenario"
+    estimates.attrs = {"seed": seed, "n_replicas": n_replicas, "tilts": tilts, "event": f"{event_metric} > {threshold}"}
+    return (estimates, runs)
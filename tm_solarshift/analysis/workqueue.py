@@ -0,0 +1,258 @@
+import json
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import (Any, Hashable)
+
+import pandas as pd
+
+from tm_solarshift.analysis.results import (case_from_json, to_builtin)
+
+#-------------------------
+@dataclass
+class Job():
+    """A job claimed from a WorkQueue: a group of cases of a sweep that share a thermal simulation (see parametric.plan_runs).
+
+    Parameters:
+        id (int): Job identifier in the queue.
+        sweep (str): Sweep identifier.
+        cases (pd.DataFrame): Cases to run (parametric.run_cases).
+        token (str): Claim token, required to renew the lease.
+        attempts (int): Number of times the job has been claimed (including this one).
+    """
+    id: int
+    sweep: str
+    cases: pd.DataFrame
+    token: str
+    attempts: int
+
+
+def default_worker_id() -> str:
+    """Identifier of this worker process: "{hostname}-{pid}"."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue():
+    """Job table of parametric sweeps in a SQLite file, shared by several workers (processes or machines with a shared filesystem).
+
+    A sweep (simulation base, units and outputs) is submitted once, and each group of cases is a job. Workers claim the jobs atomically, with a lease: a worker has to renew the lease while it runs the job, otherwise (e.g. if the worker crashed) the job is claimed again by other worker once the lease expires. The results of all the jobs are collected in the same file. Submitting a sweep or a job twice has no effect, so a sweep can be submitted again to resume it.
+
+    The file uses the rollback journal (not the write-ahead log), so it can be used on network filesystems with working POSIX locks (e.g. NFS). Leases rely on the clocks of the machines being synchronised.
+
+    Parameters:
+        path (str): Path to the SQLite file. It is created if it does not exist.
+        lease_time (float, optional): Duration of the leases, in seconds. Defaults to 600.
+        max_attempts (int, optional): Times a job is claimed before it is marked as "failed". Defaults to 3.
+    """
+
+    STATUS = ["pending", "running", "done", "failed"]
+
+    def __init__(
+            self,
+            path: str,
+            lease_time: float = 600.,
+            max_attempts: int = 3,
+    ):
+        self.path = path
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60., isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sweeps (
+                sweep TEXT PRIMARY KEY,
+                config BLOB NOT NULL,
+                created REAL NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sweep TEXT NOT NULL,
+                job_key TEXT NOT NULL,
+                cases BLOB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                token TEXT,
+                lease_until REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                values_out TEXT,
+                error TEXT,
+                finished REAL,
+                UNIQUE (sweep, job_key)
+            )"""
+        )
+
+    def __enter__(self) -> "WorkQueue":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, statements: list[tuple[str, tuple]]) -> None:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for (sql, params) in statements:
+                    self._conn.execute(sql, params)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def submit(
+            self,
+            sweep: str,
+            config: dict[str, Any],
+            jobs: list[pd.DataFrame],
+    ) -> None:
+        """Add a sweep and its jobs. Jobs already in the queue (same sweep and cases) are not added again.
+
+        Args:
+            sweep (str): Sweep identifier.
+            config (dict[str, Any]): Arguments of parametric.run_cases shared by all the jobs (sim_base, units_in, params_out, save_timings). It is pickled.
+            jobs (list[pd.DataFrame]): Cases of each job.
+        """
+        statements = [(
+            "INSERT OR IGNORE INTO sweeps (sweep, config, created) VALUES (?,?,?)",
+            (sweep, pickle.dumps(config, protocol=pickle.HIGHEST_PROTOCOL), time.time()),
+        )]
+        for cases in jobs:
+            job_key = json.dumps([to_builtin(index) for index in cases.index])
+            statements.append((
+                "INSERT OR IGNORE INTO jobs (sweep, job_key, cases) VALUES (?,?,?)",
+                (sweep, job_key, pickle.dumps(cases, protocol=pickle.HIGHEST_PROTOCOL)),
+            ))
+        self._transaction(statements)
+
+    def config(self, sweep: str) -> dict[str, Any]:
+        """Configuration of a sweep (see submit)."""
+        with self._lock:
+            row = self._conn.execute("SELECT config FROM sweeps WHERE sweep=?", (sweep,)).fetchone()
+        if row is None:
+            raise KeyError(f"sweep {sweep} is not in {self.path}")
+        return pickle.loads(row[0])
+
+    def claim(
+            self,
+            worker: str | None = None,
+            sweep: str | None = None,
+    ) -> Job | None:
+        """Claim the next pending job (or a running job whose lease expired).
+
+        Args:
+            worker (str | None, optional): Worker identifier. Defaults to default_worker_id().
+            sweep (str | None, optional): Only claim jobs of this sweep. Defaults to None (any sweep).
+
+        Returns:
+            Job | None: The claimed job, or None if there are no jobs available.
+        """
+        worker = default_worker_id() if worker is None else worker
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # jobs that exceeded max_attempts with an expired lease are failed
+                self._conn.execute(
+                    """UPDATE jobs SET status='failed', error=COALESCE(error, 'lease expired')
+                    WHERE status='running' AND lease_until < ? AND attempts >= ?""",
+                    (now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    """SELECT id, sweep, cases, attempts FROM jobs
+                    WHERE (status='pending' OR (status='running' AND lease_until < ?))
+                    AND (? IS NULL OR sweep=?)
+                    ORDER BY id LIMIT 1""",
+                    (now, sweep, sweep),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        """UPDATE jobs SET status='running', worker=?, token=?, lease_until=?, attempts=attempts+1
+                        WHERE id=?""",
+                        (worker, token, now + self.lease_time, row[0]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        (job_id, job_sweep, cases, attempts) = row
+        return Job(job_id, job_sweep, pickle.loads(cases), token, attempts + 1)
+
+    def renew(self, job: Job) -> bool:
+        """Extend the lease of a job. Returns False if the job is no longer owned by this claim."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_until=? WHERE id=? AND token=? AND status='running'",
+                (time.time() + self.lease_time, job.id, job.token),
+            )
+        return cursor.rowcount == 1
+
+    def complete(
+            self,
+            job: Job,
+            results: dict[Hashable, dict[str, Any]],
+    ) -> bool:
+        """Store the results of a job (output values of each case). Returns False, without storing them, if the job is no longer owned by this claim (e.g. its lease expired and other worker claimed it)."""
+        values_out = json.dumps({
+            json.dumps(to_builtin(index)): {k: to_builtin(v) for (k, v) in values.items()}
+            for (index, values) in results.items()
+        })
+        with self._lock:
+            cursor = self._conn.execute(
+                """UPDATE jobs SET status='done', values_out=?, finished=?, error=NULL
+                WHERE id=? AND token=? AND status='running'""",
+                (values_out, time.time(), job.id, job.token),
+            )
+        return cursor.rowcount == 1
+
+    def fail(self, job: Job, error: str) -> None:
+        """Release a job after an error. It is pending again, or "failed" if it reached max_attempts."""
+        self._transaction([(
+            """UPDATE jobs SET status=CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+            error=?, lease_until=NULL WHERE id=? AND token=? AND status='running'""",
+            (self.max_attempts, error, job.id, job.token),
+        )])
+
+    def status(self, sweep: str | None = None) -> dict[str, int]:
+        """Number of jobs in each status (see WorkQueue.STATUS)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM jobs WHERE (? IS NULL OR sweep=?) GROUP BY status",
+                (sweep, sweep),
+            ).fetchall()
+        counts = {status: 0 for status in self.STATUS}
+        counts.update(dict(rows))
+        return counts
+
+    def results(self, sweep: str) -> dict[Hashable, dict[str, Any]]:
+        """Output values of the finished cases of a sweep, as {case: values_out}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT values_out FROM jobs WHERE sweep=? AND status='done'", (sweep,)
+            ).fetchall()
+        results = {}
+        for (values_out,) in rows:
+            for (index, values) in json.loads(values_out).items():
+                results[case_from_json(index)] = values
+        return results
+
+    def errors(self, sweep: str) -> dict[int, str]:
+        """Last error of the jobs that failed, as {job id: error}."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, error FROM jobs WHERE sweep=? AND status='failed'", (sweep,)
+            ).fetchall()
+        return dict(rows)
@@ -1,13 +1,19 @@
 """General module with base Simulation class
 """
+import asyncio
+import contextvars
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import TypedDict
+from typing import Any, TypedDict
 
 import numpy as np
 import pandas as pd
 
 from tm_solarshift.constants import (DEFINITIONS, SIMULATIONS_IO)
 from tm_solarshift.utils.units import Variable
+from tm_solarshift.utils import profiling
+from tm_solarshift.utils.profiling import (Profiler, StageTimings)
 
 from tm_solarshift.utils.location import Location
 from tm_solarshift.models.dewh import (DEWH, ResistiveSingle, HeatPump)
@@ -59,18 +65,61 @@ class Simulation():
         self.out: Output = {}
 
 
+    # first level attributes with the simulation settings. They are copied by Simulation.clone
+    COMPONENTS = [
+        "time_params", "location", "household", "weather",
+        "HWDInfo", "DEWH", "pv_system", "controller",
+    ]
+
     def __eq__(self, other):
         return self.__dict__ == other.__dict__
     
+
+    def clone(
+        self,
+        overrides: dict[str, Any] | None = None,
+    ) -> "Simulation":
+        """Cheap copy of the simulation, to generate new scenarios from a base case.
+
+        Each component (see Simulation.COMPONENTS) is copied at first level, so replacing one of its attributes in the clone (e.g. ``sim.DEWH.nom_power = Variable(...)``) does not affect the original. The attribute values (Variables, dataframes, etc.) are shared, not copied, so they must be replaced and not modified in place. The results (out) are not copied: the clone starts with an empty out. It is orders of magnitude faster than copy.deepcopy.
+
+        Args:
+            overrides (dict[str, Any] | None, optional): Attributes to replace in the clone, with dotted keys for the components' attributes (e.g. ``{"household.location": "Melbourne", "DEWH.nom_power": Variable(3.6, "kW")}``). Defaults to None.
+
+        Returns:
+            Simulation: The new simulation.
+        """
+        sim = object.__new__(type(self))
+        sim.__dict__.update(self.__dict__)
+        for name in self.COMPONENTS:
+            component = sim.__dict__.get(name)
+            if component is not None:
+                sim.__dict__[name] = copy.copy(component)
+        sim.out = {}
+        if overrides is not None:
+            for (key, value) in overrides.items():
+                if "." in key:
+                    (obj_name, param_name) = key.split(".")
+                    setattr(getattr(sim, obj_name), param_name, value)
+                else:
+                    setattr(sim, key, value)
+        return sim
+
     
     def load_ts(
         self,
         ts_types: list[str] | str | None = None,
+        parallel: bool = False,
+        max_workers: int | None = None,
     ) -> pd.DataFrame:
         """It creates a timeseries dataframe with the input of possible simulations. It is useful for timeseries that does not depend on simulation results, such as weather, HWDP, market prices and emissions.
 
+        The time spent on each timeseries type is recorded as the stage "ts_{ts_type}" (see utils.profiling), inside the stage "load_ts". If there is no active profiler, they are stored in self.out["timings"].
+
         Args:
             ts_types (list[str] | str | None, optional): timeseries types as defined by DEFINITIONS.TS_TYPES. Defaults to None. If str, it returns only that timeseries. If None, returns all.
+            parallel (bool, optional): Load the timeseries types concurrently in a thread pool. They are independent and mostly reading files, so the I/O overlaps. Defaults to False.
+            max_workers (int | None, optional): Maximum number of threads if parallel. Defaults to None (one per timeseries type).
 
         Returns:
             pd.DataFrame: timeseries dataframe.
@@ -82,27 +131,47 @@ class Simulation():
             list_ts_types = [ts_types,]
         if ts_types is None:
             list_ts_types = list(SIMULATIONS_IO.TS_TYPES.keys())
-        
+
+        profiler = profiling.get_active()
+        if profiler is None:
+            profiler = Profiler(
+                timings=self.out.setdefault("timings", {}),
+            )
+        with profiler.activate(), profiler.stage("load_ts"):
+            if parallel and len(list_ts_types) > 1:
+                with ThreadPoolExecutor(max_workers = max_workers or len(list_ts_types)) as executor:
+                    futures = [
+                        executor.submit(contextvars.copy_context().run, self._load_ts_type, ts_type)
+                        for ts_type in list_ts_types
+                    ]
+                    ts_gens = [future.result() for future in futures]
+            else:
+                ts_gens = [self._load_ts_type(ts_type) for ts_type in list_ts_types]
+        ts = pd.concat([ts_gen for ts_gen in ts_gens if ts_gen is not None], axis=1)
+        return ts
+
+
+    def _load_ts_type(
+        self,
+        ts_type: str,
+    ) -> pd.DataFrame | pd.Series | None:
+        """Load one timeseries type (see load_ts). Returns None if ts_type is not recognised."""
+        from tm_solarshift.timeseries import market
+        if ts_type not in ["weather", "HWDP", "economic", "emissions"]:
+            return None
         location = self.household.location
         ts_index = self.time_params.idx
-        ts_gens: list[pd.DataFrame] = []
-        for ts_type in list_ts_types:
-
+        with profiling.stage(f"ts_{ts_type}"):
             if ts_type == "weather":
-                ts_wea = self.weather.load_data(ts_index)
-                ts_gens.append(ts_wea)
+                return self.weather.load_data(ts_index)
 
             elif ts_type == "HWDP":
                 HWD_method = self.HWDInfo.method
-                ts_hwd = self.HWDInfo.generator(ts_index, method = HWD_method)
-                ts_gens.append(ts_hwd)
-            
+                return self.HWDInfo.generator(ts_index, method = HWD_method)
+
             elif ts_type == "economic":
-                from tm_solarshift.timeseries import market
-                ts_mkt = pd.DataFrame(index=ts_index, columns=TS_TYPES[ts_type])
-                ts_mkt = market.load_wholesale_prices(ts_index, location)
-                ts_gens.append(ts_mkt)
-            
+                return market.load_wholesale_prices(ts_index, location)
+
             elif ts_type == "emissions":
                 YEAR = self.time_params.YEAR.get_value("-")
                 ts_emi = pd.DataFrame(index=ts_index, columns=TS_TYPES[ts_type])
@@ -112,21 +181,39 @@ class Simulation():
                 ts_emi = market.load_emission_index_year(
                     ts_emi, index_type= 'marginal', location = location, year = YEAR,
                 )
-                ts_gens.append(ts_emi)
-        ts = pd.concat(ts_gens, axis=1)
-        return ts
+                return ts_emi
 
     
+    def prefetch_datasets(self) -> None:
+        """Load into the datasets cache (see utils.cache) the files this simulation will read (weather, HWD profiles, tariff plans and emissions) without running it. It is used by utils.cache.Prefetcher to read the files of the next runs of a batch in the background.
+        """
+        from tm_solarshift.timeseries import (weather, market)
+        params = self.weather.params()
+        if "location" in params:
+            params["location"] = self.household.location
+        weather.prefetch_weather_data(self.time_params.idx, self.weather.type_sim, params)
+        self.HWDInfo.prefetch()
+        market.prefetch_household_datasets(
+            location = self.household.location,
+            tariff_type = self.household.tariff_type,
+            control_type = self.household.control_type,
+            year = self.time_params.YEAR.get_value("-"),
+        )
+        return None
+
+
     def run_simulation(
         self,
         verbose: bool = False,
+        trace_memory: bool = False,
     ) -> None:
         """Run a simulation using the self-contained data.
         
-        It update the results into the self.out dictionary (A Output class). The simulation returns *df_pv* (pv simulation results), *df_tm* (DEWH simulation results), *overall_tm* (overall results of thermal parameters), and *overall_econ* (overall results of economic parameters).
+        It update the results into the self.out dictionary (A Output class). The simulation returns *df_pv* (pv simulation results), *df_tm* (DEWH simulation results), *overall_tm* (overall results of thermal parameters), *overall_econ* (overall results of economic parameters), and *timings* (wall time, CPU time, memory peak and cache hits of each stage).
 
         Args:
             verbose (bool, optional): Print stage of sim. Defaults to False.
+            trace_memory (bool, optional): Measure the memory peak of each stage with tracemalloc (see utils.profiling.Profiler). It slows down the simulation, so mem_peak is 0 unless it is True. Defaults to False.
 
         Raises:
             TypeError: DEWH object and thermal model engine are not compatible
@@ -137,53 +224,117 @@ class Simulation():
 
         from tm_solarshift.models import postprocessing
 
-        self.out: Output = {}
+        self.out: Output = {"timings": {}}
+        profiler = Profiler(timings=self.out["timings"], trace_memory=trace_memory)
+        with profiler.activate(), profiler.stage("total"):
+            ts_tm = self.create_ts_tm()
+
+            # thermal model
+            (df_tm, overall_tm) = self.run_thermal_simulation(ts_tm,verbose=verbose)
+            self.out["df_tm"] = df_tm
+            self.out["overall_tm"] = overall_tm
+
+            #economic postprocessing
+            with profiler.stage("economics_analysis"):
+                self.out["overall_econ"] = postprocessing.economics_analysis(self)
+        
+        return None
+
+
+    async def run_simulation_async(
+        self,
+        verbose: bool = False,
+    ) -> None:
+        """Asynchronous version of run_simulation (``await sim.run_simulation_async()``).
+
+        TRNSYS is called with an asyncio subprocess and the CPU-bound stages (timeseries, pv, postprocessing) run in worker threads, so one event loop can keep many simulations in flight (see ``run_simulations_async``). The results are stored in self.out, as in run_simulation. Memory is not traced (mem_peak = 0) as tracemalloc cannot separate concurrent simulations.
+
+        Args:
+            verbose (bool, optional): Print stage of sim. Defaults to False.
+
+        Returns:
+            None
+        """
+
+        from tm_solarshift.models import postprocessing
+
+        self.out: Output = {"timings": {}}
+        profiler = Profiler(timings=self.out["timings"], trace_memory=False)
+        with profiler.activate(), profiler.stage("total"):
+            ts_tm = await asyncio.to_thread(self.create_ts_tm)
+
+            # thermal model
+            (df_tm, overall_tm) = await self.run_thermal_simulation_async(ts_tm, verbose=verbose)
+            self.out["df_tm"] = df_tm
+            self.out["overall_tm"] = overall_tm
+
+            #economic postprocessing
+            with profiler.stage("economics_analysis"):
+                self.out["overall_econ"] = await asyncio.to_thread(
+                    postprocessing.economics_analysis, self
+                )
+
+        return None
+
+
+    def create_ts_tm(self) -> pd.DataFrame:
+        """It creates the input timeseries for the thermal model (weather, HWD and control signal). The PV system is simulated here too (the diverter needs it), and its results are stored in self.out["df_pv"].
+
+        Raises:
+            ValueError: household.control_type is not a valid value.
+
+        Returns:
+            pd.DataFrame: timeseries for the thermal simulation (ts_tm).
+        """
+        stage = profiling.stage
         ts_index = self.time_params.idx
         self.weather.location = self.household.location         #TODO: define what to do with location
-        ts_wea = self.weather.load_data(ts_index)
-        ts_hwd = self.HWDInfo.generator(ts_index, method = self.HWDInfo.method)
+        with stage("weather"):
+            ts_wea = self.weather.load_data(ts_index)
+        with stage("hwd"):
+            ts_hwd = self.HWDInfo.generator(ts_index, method = self.HWDInfo.method)
 
         #pv system
         pv_system = self.pv_system
-        if pv_system is not None:
-            df_pv = pv_system.sim_generation(ts_wea, columns=SIMULATIONS_IO.OUTPUT_SIM_PV)
-        else:
-            df_pv = pd.DataFrame(0, index=self.time_params.idx, columns=SIMULATIONS_IO.OUTPUT_SIM_PV)
+        with stage("pv"):
+            if pv_system is not None:
+                df_pv = pv_system.sim_generation(ts_wea, columns=SIMULATIONS_IO.OUTPUT_SIM_PV)
+            else:
+                df_pv = pd.DataFrame(0, index=self.time_params.idx, columns=SIMULATIONS_IO.OUTPUT_SIM_PV)
         self.out["df_pv"] = df_pv
 
         # control
-        control_type = self.household.control_type
-        if control_type in ["GS", "CL1", "CL2", "CL3"]:
-            self.controller = control.CLController(
-                CL_type = control_type,
-                random_delay = self.household.control_random_on,
-                random_seed = self.id
-            )
-            ts_control = self.controller.create_signal(ts_index)
-        elif control_type in ["timer_SS", "timer_OP", "timer"]:
-            self.controller = control.Timer(timer_type=control_type)
-            ts_control = self.controller.create_signal(ts_index)
-        elif control_type == "diverter":
-            controller = control.Diverter(
-                type = control_type,
-                time_start=0.,
-                time_stop=4.,
-                heater_nom_power = self.DEWH.nom_power.get_value("kW")
-            )
-            ts_control = controller.create_signal(ts_index, df_pv["pv_power"])
-        else:
-            raise ValueError(f"{control_type=} is not a valid value.")
+        with stage("control"):
+            control_type = self.household.control_type
+            if control_type in ["GS", "CL1", "CL2", "CL3"]:
+                self.controller = control.CLController(
+                    CL_type = control_type,
+                    random_delay = self.household.control_random_on,
+                    random_seed = self.id
+                )
+                ts_control = self.controller.create_signal(ts_index)
+            elif control_type in ["timer_SS", "timer_OP", "timer"]:
+                # a custom timer keeps its times (e.g. set with "controller.time_start")
+                if not (
+                    control_type == "timer"
+                    and isinstance(self.controller, control.Timer)
+                    and self.controller.timer_type == "timer"
+                ):
+                    self.controller = control.Timer(timer_type=control_type)
+                ts_control = self.controller.create_signal(ts_index)
+            elif control_type == "diverter":
+                controller = control.Diverter(
+                    type = control_type,
+                    time_start=0.,
+                    time_stop=4.,
+                    heater_nom_power = self.DEWH.nom_power.get_value("kW")
+                )
+                ts_control = controller.create_signal(ts_index, df_pv["pv_power"])
+            else:
+                raise ValueError(f"{control_type=} is not a valid value.")
 
-        # thermal model
         ts_tm = pd.concat([ts_wea, ts_hwd, ts_control], axis=1)
-        (df_tm, overall_tm) = self.run_thermal_simulation(ts_tm,verbose=verbose)
-        self.out["df_tm"] = df_tm
-        self.out["overall_tm"] = overall_tm
-
-        #economic postprocessing
-        self.out["overall_econ"] = postprocessing.economics_analysis(self)
-        
-        return None
+        return ts_tm
 
 
     def run_thermal_simulation(
@@ -193,7 +344,7 @@ class Simulation():
     ) -> tuple[pd.DataFrame, dict]:
         """Run a thermal simulation 
         
-        It uses the data provided in the settings.
+        It uses the data provided in the settings. The resources used by the thermal stages are recorded in self.out["timings"].
 
         Args:
             ts (pd.DataFrame, optional): timeseries dataframe. If not given is generated. Defaults to None.
@@ -208,14 +359,104 @@ class Simulation():
 
         from tm_solarshift.models import postprocessing
         DEWH = self.DEWH
-        if ts is None:
-            ts_tm = self.load_ts(ts_types=SIMULATIONS_IO.TS_TYPES_TM+["emissions"])
-        else:
-            ts_tm = ts.copy()
-        df_tm = DEWH.run_thermal_model(ts_tm, verbose=verbose)
-        overall_tm = postprocessing.thermal_analysis(self, df_tm)
+        profiler = profiling.get_active()
+        if profiler is None:
+            profiler = Profiler(timings=self.out.setdefault("timings", {}))
+        with profiler.activate(), profiler.stage("thermal"):
+            if ts is None:
+                ts_tm = self.load_ts(ts_types=SIMULATIONS_IO.TS_TYPES_TM+["emissions"])
+            else:
+                ts_tm = ts.copy()
+            with profiler.stage("thermal_model"):
+                df_tm = self.run_thermal_model(ts_tm, verbose=verbose)
+            with profiler.stage("thermal_analysis"):
+                overall_tm = postprocessing.thermal_analysis(self, df_tm)
+        return (df_tm, overall_tm)
+
+
+    def run_thermal_model(
+            self,
+            ts: pd.DataFrame,
+            verbose: bool = False,
+    ) -> pd.DataFrame:
+        """Run the DEWH's thermal model on ts. If time_params.REP_DAYS > 0, only the representative days are simulated and the results of the whole horizon are reconstructed (see analysis.representative.run_thermal_model).
+
+        Args:
+            ts (pd.DataFrame): timeseries dataframe (Simulation.create_ts_tm).
+            verbose (bool, optional): Print stage of sim. Defaults to False.
+
+        Returns:
+            pd.DataFrame: detailed results (df_tm).
+        """
+        if self.time_params.REP_DAYS.get_value("d") > 0:
+            from tm_solarshift.analysis import representative
+            return representative.run_thermal_model(self, ts, verbose=verbose)
+        return self.DEWH.run_thermal_model(ts, verbose=verbose)
+
+
+    async def run_thermal_simulation_async(
+            self,
+            ts: pd.DataFrame | None = None,
+            verbose: bool = False,
+    ) -> tuple[pd.DataFrame, dict]:
+        """Asynchronous version of run_thermal_simulation. Heaters with ``run_thermal_model_async`` (the TRNSYS ones) are awaited directly, the rest run in a worker thread.
+
+        Args:
+            ts (pd.DataFrame, optional): timeseries dataframe. If not given is generated. Defaults to None.
+            verbose (bool, optional): Print stage of sim. Defaults to False.
+
+        Returns:
+            tuple[pd.DataFrame, dict]: (df_tm, overall_tm) = (detailed results, overall results)
+        """
+
+        from tm_solarshift.models import postprocessing
+        DEWH = self.DEWH
+        profiler = profiling.get_active()
+        if profiler is None:
+            profiler = Profiler(timings=self.out.setdefault("timings", {}), trace_memory=False)
+        with profiler.activate(), profiler.stage("thermal"):
+            if ts is None:
+                ts_tm = await asyncio.to_thread(
+                    self.load_ts, SIMULATIONS_IO.TS_TYPES_TM+["emissions"]
+                )
+            else:
+                ts_tm = ts.copy()
+            with profiler.stage("thermal_model"):
+                if self.time_params.REP_DAYS.get_value("d") > 0:
+                    df_tm = await asyncio.to_thread(self.run_thermal_model, ts_tm, verbose)
+                elif hasattr(DEWH, "run_thermal_model_async"):
+                    df_tm = await DEWH.run_thermal_model_async(ts_tm, verbose=verbose)
+                else:
+                    df_tm = await asyncio.to_thread(DEWH.run_thermal_model, ts_tm, verbose)
+            with profiler.stage("thermal_analysis"):
+                overall_tm = await asyncio.to_thread(postprocessing.thermal_analysis, self, df_tm)
         return (df_tm, overall_tm)
 
+
+async def run_simulations_async(
+        simulations: list[Simulation],
+        max_concurrent: int = 8,
+        verbose: bool = False,
+) -> list[Simulation]:
+    """Run several simulations in the same event loop, with at most max_concurrent of them in flight.
+
+    Args:
+        simulations (list[Simulation]): Simulations to run. Each one must be an independent object (do not repeat the same instance).
+        max_concurrent (int, optional): Maximum number of simulations running at the same time. Defaults to 8.
+        verbose (bool, optional): Print stage of sim. Defaults to False.
+
+    Returns:
+        list[Simulation]: The same simulations (in the same order), with their results in sim.out.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent)
+
+    async def run_one(sim: Simulation) -> Simulation:
+        async with semaphore:
+            await sim.run_simulation_async(verbose=verbose)
+        return sim
+
+    return list(await asyncio.gather(*[run_one(sim) for sim in simulations]))
+
 #------------------------------------
 @dataclass
 class Household():
@@ -269,6 +510,8 @@ class Weather():
         value: The value used on subset. If "season", options: "summer", "autumn", "winter", spring". If "month", the month as integer. If "date", the specific date.
         file_path: A string with the weather file location (If "historical" is chosen)
         list_dates: Used only for "historical" simulations. A set of dates to load.
+        seed: Seed of the random days ("mc") or values ("constant_day"). If None, each load is different.
+        uniforms: For mc simulations, numbers in [0,1) (one per day) that pick the days instead of seed, with low values being cold days (see timeseries.weather.random_days_from_dataframe). Used by analysis.stochastic for antithetic and quasi-random sampling.
 
     """
 
@@ -281,6 +524,8 @@ class Weather():
 
     file_path: str | None = None
     list_dates: pd.DatetimeIndex | pd.Timestamp | None = None
+    seed: int | None = None
+    uniforms: np.ndarray | None = None
 
 
     def params(self) -> dict:
@@ -296,6 +541,8 @@ class Weather():
                 "subset": self.subset,
                 "random": self.random,
                 "value": self.value,
+                "seed": self.seed,
+                "uniforms": self.uniforms,
             }
         elif self.type_sim == "historical":
             params = {
@@ -303,13 +550,14 @@ class Weather():
                 "location": self.location,
                 "file_path": self.file_path,
                 "list_dates": self.list_dates,
-            },
+            }
         elif self.type_sim == "constant_day":
             params = {
                 "dataset": self.dataset,
                 "random": self.random,
                 "value": self.value,
                 "subset": self.subset,
+                "seed": self.seed,
         }
         return params
     
@@ -341,6 +589,7 @@ class TimeParams():
         STOP (Variable): final time of the year (in 'hr').
         STEP (Variable): timestep for the simulation (in 'min')
         YEAR (Variable): Year of the simulation (useful only for annual simulations)
+        REP_DAYS (Variable): Number of representative days (in 'd'). If larger than 0, the thermal model only simulates these days, and the results of the rest are reconstructed (see analysis.representative). Defaults to 0 (every day is simulated).
 
     """
 
@@ -348,6 +597,7 @@ class TimeParams():
     STOP = Variable(8760, "hr")
     STEP = Variable(3, "min")
     YEAR = Variable(2022, "-")
+    REP_DAYS = Variable(0, "d")
 
     @property
     def DAYS(self) -> Variable:
@@ -397,11 +647,15 @@ class Output(TypedDict, total=False):
         df_tm (pd.DataFrame): Thermal model Simulation
         overall_tm (dict[str,float]): Thermal postprocessing results
         overall_econ (dict[str,float]): Economic postprocessing results
+        timings (dict[str,StageTimings]): Resources used by each stage of the simulation (see utils.profiling)
+        representative (dict[str,Any]): Representative days, their weights and the errors of the daily inputs (only if time_params.REP_DAYS > 0)
     """
     df_pv: pd.DataFrame
     df_tm: pd.DataFrame
     overall_tm: dict[str,float]
     overall_econ: dict[str,float]
+    timings: dict[str,StageTimings]
+    representative: dict[str,Any]
 
 
 #-----------
@@ -6,6 +6,7 @@ import pandas as pd
 from typing import Protocol, TypedDict
 
 from tm_solarshift.constants import DIRECTORY
+from tm_solarshift.utils import cache
 
 DIR_CONTROL = DIRECTORY.DIR_DATA["control"]
 CL_TYPES = ["GS", "CL1", "CL2", "CL3"]
@@ -209,8 +210,7 @@ def periods_from_json(
 ) -> list[Period]:
     
     file_schedule = os.path.join(DIR_CONTROL, f'{controller_type}.json')
-    with open(file_schedule, 'r') as file:
-        control_type_data = json.load(file)
+    control_type_data = cache.read_json(file_schedule)
     periods = control_type_data["schedule"]
     return periods
 
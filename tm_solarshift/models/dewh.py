@@ -92,6 +92,24 @@ class HWTank():
         temp_high_control = temp_max - temp_deadband / 2.0
         return Variable(temp_high_control, "degC")
 
+    async def run_thermal_model_async(
+            self,
+            ts: pd.DataFrame,
+            verbose: bool = False,
+    ) -> pd.DataFrame:
+        """Asynchronous version of run_thermal_model for heaters simulated with TRNSYS (see TrnsysDEWH.run_simulation_async).
+
+        Args:
+            ts (pd.DataFrame): Timeseries dataframe
+            verbose (bool, optional): Whether print details about the simulation. Defaults to False.
+
+        Returns:
+            pd.DataFrame: DataFrame with thermal simulation results (df_tm)
+        """
+        trnsys_dewh = TrnsysDEWH(DEWH=self, ts=ts)
+        df_tm = await trnsys_dewh.run_simulation_async(verbose=verbose)
+        return df_tm
+
 
 class ResistiveSingle(HWTank):
     """The model for a hot water tank with a single immersive resistive heater.
@@ -8,6 +8,7 @@ from typing import TYPE_CHECKING
 
 from tm_solarshift.constants import (DIRECTORY, DEFINITIONS, SIMULATIONS_IO)
 from tm_solarshift.utils.units import (conversion_factor as CF)
+from tm_solarshift.utils import cache
 from tm_solarshift.analysis.finance import (
     calculate_household_energy_cost,
     calculate_wholesale_energy_cost,
@@ -338,8 +339,7 @@ def calculate_fit_opp_cost(
     if tariff_type == "CL":
         tariff_type = control_type if (control_type != "diverter") else "CL1"
     file_path = os.path.join(DIR_TARIFFS, f"{dnsp.lower()}_{tariff_type}_plan.json")
-    with open(file_path) as f:
-        plan = json.load(f)
+    plan = cache.read_json(file_path)
     tariff_rate = None
     for charge in plan["charges"]["energy_charges"]:
         if charge["tariff_type"] == "solar_feed_in":
@@ -348,8 +348,7 @@ def calculate_fit_opp_cost(
     #if not there, then checking the flat tariff rate for the same DNSP
     if tariff_rate is None:
         file_path = os.path.join(DIR_TARIFFS, f"{dnsp.lower()}_flat_plan.json")
-        with open(file_path) as f:
-            plan = json.load(f)
+        plan = cache.read_json(file_path)
         tariff_rate = None
         for charge in plan["charges"]["energy_charges"]:
             if charge["tariff_type"] in ["solar_feed_in", "stepped_solar_feed_in"]:
@@ -374,8 +373,7 @@ def calculate_fit_revenue(
     if tariff_type == "gas":
         tariff_type = "flat"
     file_path = os.path.join(DIR_TARIFFS, f"{dnsp.lower()}_{tariff_type}_plan.json")
-    with open(file_path) as f:
-        plan = json.load(f)
+    plan = cache.read_json(file_path)
     tariff_rate = None
     for charge in plan["charges"]["energy_charges"]:
         if charge["tariff_type"] == "solar_feed_in":
@@ -384,8 +382,7 @@ def calculate_fit_revenue(
     #if not there, then checking the flat tariff rate for the same DNSP
     if tariff_rate is None:
         file_path = os.path.join(DIR_TARIFFS, f"{dnsp.lower()}_flat_plan.json")
-        with open(file_path) as f:
-            plan = json.load(f)
+        plan = cache.read_json(file_path)
         tariff_rate = None
         for charge in plan["charges"]["energy_charges"]:
             if charge["tariff_type"] in ["solar_feed_in", "stepped_solar_feed_in"]:
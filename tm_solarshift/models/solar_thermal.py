@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import numpy as np
 import pandas as pd
 from typing import TYPE_CHECKING, Optional
@@ -86,21 +87,39 @@ class SolarThermalElecAuxiliary(HWTank):
         Returns:
             pd.DataFrame: Dataframe with thermal simulation (df_tm).
         """
+        ts_tm = self._collector_inputs(ts)
+        trnsys_dewh = TrnsysDEWH(DEWH=self, ts=ts_tm)
+        df_tm = trnsys_dewh.run_simulation(verbose=verbose)
+        return self._collector_outputs(df_tm, ts_tm)
+
+
+    async def run_thermal_model_async(self, ts: pd.DataFrame, verbose: bool = False) -> pd.DataFrame:
+        """Asynchronous version of run_thermal_model. The python calculations run in a worker thread and TRNSYS with TrnsysDEWH.run_simulation_async.
+
+        Args:
+            ts (pd.DataFrame): Timeseries dataframe
+            verbose (bool, optional): Whether print details about the simulation. Defaults to False.
+
+        Returns:
+            pd.DataFrame: Dataframe with thermal simulation (df_tm).
+        """
+        ts_tm = await asyncio.to_thread(self._collector_inputs, ts)
+        trnsys_dewh = TrnsysDEWH(DEWH=self, ts=ts_tm)
+        df_tm = await trnsys_dewh.run_simulation_async(verbose=verbose)
+        return await asyncio.to_thread(self._collector_outputs, df_tm, ts_tm)
 
+
+    def dated_inputs(self, ts: pd.DataFrame) -> pd.DataFrame:
+        """Inputs that depend on the timestamps of ts (sun position): irradiance in the collector plane ("plane_irrad") and cosine of the angle of incidence ("cosine_aoi"). If ts already has them, they are not calculated again, so they can be calculated on the real dates before the days are moved (see analysis.representative)."""
         tz = DEFAULT_TZ
         ts_tm = ts.copy()
+        if "plane_irrad" in ts_tm.columns and "cosine_aoi" in ts_tm.columns:
+            return ts_tm
 
-        # retrieving variables
-        massflowrate = self.massflowrate.get_value("kg/s")
-        area = self.area.get_value("m2")
-        FRta = self.FRta.get_value("-")
-        FRUL = self.FRUL.get_value("W/m2-K")
         latitude = self.lat.get_value("-")
         longitude = self.lon.get_value("-")
         tilt = self.tilt.get_value("-")
         orient = self.orient.get_value("-")
-        cp = self.fluid.cp.get_value("J/kg-K")
-        IAM = self.IAM.get_value("-")
 
         # calculating angles
         ts_index = pd.to_datetime(ts_tm.index)
@@ -109,20 +128,39 @@ class SolarThermalElecAuxiliary(HWTank):
         plane_angles = get_plane_angles(ts_tm, latitude, longitude, tilt, orient, tz)
         plane_angles.index = ts_index.tz_localize(None)
         cosine_aoi = plane_angles["cosine_aoi"]
-        
+
         ts_tm["plane_irrad"] = plane_irrad["poa_global"] * CF("W", "kJ/hr")
+        ts_tm["cosine_aoi"] = np.where( cosine_aoi>0.0 , cosine_aoi, 0.)
+        return ts_tm
+
+
+    def _collector_inputs(self, ts: pd.DataFrame) -> pd.DataFrame:
+        """Irradiance in the collector plane and the collector parameters required by TRNSYS_STC_v1.dck"""
+        ts_tm = self.dated_inputs(ts)
+
+        # retrieving variables
+        massflowrate = self.massflowrate.get_value("kg/s")
+        FRta = self.FRta.get_value("-")
+        FRUL = self.FRUL.get_value("W/m2-K")
+        cp = self.fluid.cp.get_value("J/kg-K")
+        IAM = self.IAM.get_value("-")
+
         ts_tm["CS"] = 1
 
         #getting timeseries specific for SCT
-        ts_tm["cosine_aoi"] = np.where( cosine_aoi>0.0 , cosine_aoi, 0.)
-        ts_tm["iam"] = np.where( cosine_aoi>0.0 , 1. - IAM * (1./cosine_aoi - 1.), 0.)
+        cosine_aoi = ts_tm["cosine_aoi"]
+        cosine_day = cosine_aoi.where(cosine_aoi>0.0, 1.)       # cosine_aoi is 0 when the sun is behind the collector
+        ts_tm["iam"] = np.where( cosine_aoi>0.0 , 1. - IAM * (1./cosine_day - 1.), 0.)
         ts_tm["FR_ta"] = FRta # * ts_tm["iam"]
         ts_tm["FR_UL"] = FRUL
         ts_tm["heat_capacity"] = massflowrate*CF("kg/s","kg/hr") * cp*CF("J","kJ") #[kJ/kg-hr]
+        return ts_tm
 
-        # solar thermal model in trnsys
-        trnsys_dewh = TrnsysDEWH(DEWH=self, ts=ts_tm)
-        df_tm = trnsys_dewh.run_simulation(verbose=verbose)
+
+    def _collector_outputs(self, df_tm: pd.DataFrame, ts_tm: pd.DataFrame) -> pd.DataFrame:
+        """Collector efficiency and heat, calculated from the TRNSYS results"""
+        massflowrate = self.massflowrate.get_value("kg/s")
+        cp = self.fluid.cp.get_value("J/kg-K")
 
         # additional calculations
         for col in ["plane_irrad", "cosine_aoi", "iam", "FR_ta", "FR_UL"]:
@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import subprocess
 import shutil
 import time
@@ -10,6 +11,7 @@ from typing import TYPE_CHECKING, Optional, TypeAlias
 
 from tm_solarshift.constants import (DIRECTORY, SIMULATIONS_IO)
 from tm_solarshift.utils.units import (Variable, conversion_factor as CF)
+from tm_solarshift.utils.profiling import stage
 
 if TYPE_CHECKING:
     from tm_solarshift.models.dewh import HWTank
@@ -249,15 +251,18 @@ class TrnsysDEWH():
             self.tempDir = tmpdir
             if verbose:
                 print("Creating the trnsys source code files")
-            self.create_simulation_files()
+            with stage("trnsys_files"):
+                self.create_simulation_files()
 
             if verbose:
                 print("Calling TRNSYS executable")
-            subprocess.run([TRNSYS_EXECUTABLE, self.dck_path, "/h"])
+            with stage("trnsys_exec"):
+                subprocess.run([TRNSYS_EXECUTABLE, self.dck_path, "/h"])
             
             if verbose:
                 print("TRNSYS simulation postprocessing.")
-            df_tm = self.postprocessing()
+            with stage("trnsys_output"):
+                df_tm = self.postprocessing()
 
             pass
                 
@@ -266,6 +271,51 @@ class TrnsysDEWH():
             print(f"Execution time: {elapsed_time:.4f} seconds.")
         
         return df_tm
+
+    #------------------------------
+    async def run_simulation_async(
+            self,
+            verbose: bool = False,
+            ) -> pd.DataFrame:
+        """Asynchronous version of run_simulation. TRNSYS is called with asyncio.create_subprocess_exec, so the event loop is free while the simulation runs. Creating the files and the postprocessing are run in a worker thread (asyncio.to_thread).
+
+        Args:
+            verbose (bool, optional): Whether print details about the simulation. Defaults to False.
+
+        Returns:
+            pd.DataFrame: Simulation results (df_tm)
+        """
+
+        stime = time.time()
+        if verbose:
+            print("Running TRNSYS Simulation")
+
+        with TemporaryDirectory(dir=TEMPDIR_SIMULATION) as tmpdir:
+
+            self.tempDir = tmpdir
+            if verbose:
+                print("Creating the trnsys source code files")
+            with stage("trnsys_files"):
+                await asyncio.to_thread(self.create_simulation_files)
+
+            if verbose:
+                print("Calling TRNSYS executable")
+            with stage("trnsys_exec"):
+                process = await asyncio.create_subprocess_exec(
+                    TRNSYS_EXECUTABLE, self.dck_path, "/h"
+                )
+                await process.wait()
+
+            if verbose:
+                print("TRNSYS simulation postprocessing.")
+            with stage("trnsys_output"):
+                df_tm = await asyncio.to_thread(self.postprocessing)
+
+        elapsed_time = time.time()-stime
+        if verbose:
+            print(f"Execution time: {elapsed_time:.4f} seconds.")
+
+        return df_tm
     
 #------------
 def editing_dck_general(
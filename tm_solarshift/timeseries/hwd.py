@@ -5,12 +5,13 @@ import numpy as np
 import typing
 from typing import Optional
 from scipy.interpolate import interp1d
-from scipy.stats import truncnorm
+from scipy.stats import (norm, truncnorm)
 from dataclasses import dataclass
 
 from tm_solarshift.constants import ( DIRECTORY, SIMULATIONS_IO )
 from tm_solarshift.utils.units import ( Variable, conversion_factor as CF 
                                  )
+from tm_solarshift.utils import cache
 DIR_DATA = DIRECTORY.DIR_DATA
 TS_HWD = SIMULATIONS_IO.TS_TYPES["HWDP"]
 FILES_HWD_SAMPLES = DIRECTORY.FILES_HWD_SAMPLES
@@ -34,12 +35,14 @@ class HWD():
         daily_std (Variable): Daily standard deviation in "kg/day". Used in "unif", "norm" and "truncnorm"
         daily_min (Variable): Daily minimum in "kg/day". Used in "unif" and "truncnorm"
         daily_max (Variable): Daily maximum in "kg/day". Used in "unif" and "truncnorm"
+        daily_uniforms (np.ndarray | None): Numbers in [0,1), one per day. If given, the daily consumptions are their inverse CDF in daily_distribution instead of random draws (with "sample", the sorted sample is used). It allows antithetic, quasi-random and biased sampling (see analysis.stochastic). Defaults to None.
     """
 
     _id: int = -1
     method: str = "standard"
     profile_HWD: int = 1
     daily_distribution: str | None = None
+    daily_uniforms: np.ndarray | None = None
     daily_avg = Variable(None,None)
     daily_std = Variable(None,None)
     daily_min = Variable(None,None)
@@ -164,6 +167,9 @@ class HWD():
         if daily_distribution == None or not (daily_std > 0.0):
             m_HWD_day = daily_avg * np.ones(DAYS)
 
+        elif self.daily_uniforms is not None:
+            m_HWD_day = self.inverse_cdf(self.daily_uniforms, DAYS, sample_file)
+
         elif daily_distribution == "norm":
             m_HWD_day = rng.normal(
                 loc = daily_avg,
@@ -191,7 +197,7 @@ class HWD():
         elif daily_distribution == "sample":
             if sample_file is None:
                 sample_file = FILES_HWD_SAMPLES["HWD_daily"]
-            sample_aux = pd.read_csv(sample_file)['m_HWD_day']
+            sample_aux = cache.read_csv(sample_file)['m_HWD_day']
             sample = sample_aux[sample_aux>0].to_list()
             m_HWD_day = rng.choice(sample, size=DAYS)
             
@@ -201,6 +207,66 @@ class HWD():
         )
 
 
+    def inverse_cdf(
+        self,
+        uniforms: np.ndarray,
+        DAYS: int,
+        sample_file: Optional[str] = None,
+    ) -> np.ndarray:
+        """Daily consumptions (L/day) of the first DAYS uniforms, by inverse transform of self.daily_distribution (see interday_distribution).
+
+        Args:
+            uniforms (np.ndarray): Numbers in [0,1).
+            DAYS (int): Number of days.
+            sample_file (Optional[str], optional): Sample file if self.daily_distribution="sample". Defaults to None.
+
+        Raises:
+            ValueError: If there are less uniforms than days.
+
+        Returns:
+            np.ndarray: Daily HWD (L/day).
+        """
+        uniforms = np.asarray(uniforms, dtype=float)
+        if len(uniforms) < DAYS:
+            raise ValueError(f"{len(uniforms)} daily_uniforms given for {DAYS} days.")
+        eps = 1e-12
+        u = np.clip(uniforms[:DAYS], eps, 1.-eps)
+        daily_avg = self.daily_avg.get_value("L/d") 
+        daily_std = self.daily_std.get_value("L/d")
+        daily_min = self.daily_min.get_value("L/d") 
+        daily_max = self.daily_max.get_value("L/d")
+        daily_distribution = self.daily_distribution
+
+        if daily_distribution == "norm":
+            m_HWD_day = norm.ppf(u, loc=daily_avg, scale=daily_std)
+            m_HWD_day = np.where(m_HWD_day > daily_min, m_HWD_day, daily_min)
+        elif daily_distribution == "unif":
+            m_HWD_day = (daily_max - daily_min) * u + daily_min
+        elif daily_distribution == "truncnorm":
+            a, b = (daily_min - daily_avg) / daily_std, (daily_max - daily_avg) / daily_std
+            m_HWD_day = truncnorm.ppf(u, a, b, loc=daily_avg, scale=daily_std)
+        elif daily_distribution == "sample":
+            if sample_file is None:
+                sample_file = FILES_HWD_SAMPLES["HWD_daily"]
+            sample_aux = cache.read_csv(sample_file)['m_HWD_day']
+            sample = np.sort(sample_aux[sample_aux>0].to_numpy())
+            m_HWD_day = sample[(u * len(sample)).astype(int)]
+        else:
+            m_HWD_day = daily_avg * np.ones(DAYS)
+        return m_HWD_day
+
+
+    #----------------------
+    def prefetch(self) -> None:
+        """Load into the datasets cache (see utils.cache) the files used by the standard generator (HWDP profile and daily sample file), without generating the timeseries.
+        """
+        profile_HWD = int(self.profile_HWD)
+        if 1 <= profile_HWD <= 6:
+            cache.read_csv(FILE_HWDP_AUSTRALIA.format(profile_HWD))
+        if self.daily_distribution == "sample":
+            cache.read_csv(FILES_HWD_SAMPLES["HWD_daily"])
+        return None
+
     #----------------------
     def generator(
         self,
@@ -287,7 +353,7 @@ class HWD():
                 df_aux["P_HWD"] = np.zeros(PERIODS)
                 df_aux["m_HWD"] = np.zeros(PERIODS)
             case i if 1 <= i <= 6:
-                HWDP_day = pd.read_csv(FILE_HWDP_AUSTRALIA.format(intraday_dist))
+                HWDP_day = cache.read_csv(FILE_HWDP_AUSTRALIA.format(intraday_dist))
 
                 f1D = interp1d(
                     HWDP_day["time"], HWDP_day["HWDP"],
@@ -394,7 +460,7 @@ class HWD():
             if intraday_dist == None:
                 probs = np.ones(len(list_hours))
             else:
-                HWDP_day = pd.read_csv( FILE_HWDP_AUSTRALIA.format(intraday_dist) )
+                HWDP_day = cache.read_csv( FILE_HWDP_AUSTRALIA.format(intraday_dist) )
                 probs = HWDP_day.loc[list_hours, "HWDP"].values
             probs = probs / probs.sum()
 
@@ -5,6 +5,7 @@ import pandas as pd
 from tm_solarshift.constants import (DIRECTORY, DEFINITIONS, SIMULATIONS_IO)
 from tm_solarshift.utils.units import conversion_factor as CF
 from tm_solarshift.utils.location import Location
+from tm_solarshift.utils import cache
 
 
 DIR_SPOTPRICE = DIRECTORY.DIR_DATA["energy_market"]
@@ -40,8 +41,7 @@ def load_household_import_rate(
     match tariff_type:
         case "flat":
             file_path = os.path.join(DIR_TARIFFS, f"{dnsp.lower()}_{tariff_type}_plan.json")
-            with open(file_path) as f:
-                plan = json.load(f)
+            plan = cache.read_json(file_path)
             tariff_rate = None
             for charge in plan["charges"]["energy_charges"]:
                 if charge["tariff_type"] == "flat":
@@ -52,8 +52,7 @@ def load_household_import_rate(
         case "CL":
             control_type_ = "CL1" if control_type == "diverter" else control_type
             file_path = os.path.join(DIR_TARIFFS, f"{dnsp.lower()}_{control_type_}_plan.json")
-            with open(file_path) as f:
-                plan = json.load(f)
+            plan = cache.read_json(file_path)
             tariff_rate = None
             for charge in plan["charges"]["energy_charges"]:
                 if charge["tariff_type"] == "controlled_load":
@@ -71,7 +70,7 @@ def load_household_import_rate(
                 energy_plan = get_energy_plan_for_dnsp(
                     dnsp, tariff_type = tariff_type, convert=True
                 )
-                ts3 = pd.read_csv(file_tou, index_col=0)
+                ts3 = cache.read_csv(file_tou, index_col=0)
                 ts3.index = pd.to_datetime(ts3.index)
             else:
                 ts_aux = pd.DataFrame(index=ts_index, columns = [
@@ -113,8 +112,7 @@ def load_household_gas_rate(
     """
 
     #importing the energy plan
-    with open(file_path) as f:
-        plan = json.load(f)
+    plan = cache.read_json(file_path)
     rate_details = plan["charges"]["energy_charges"]["rate_details"]
     rates = []
     edges = [0,]
@@ -141,6 +139,25 @@ def load_household_gas_rate(
     return ts_tariff
 
 
+def _load_emissions_file(file_path: str) -> pd.DataFrame:
+    """Read (and cache) an emissions file. The returned dataframe is shared, do not modify it."""
+    def loader() -> pd.DataFrame:
+        emissions = pd.read_csv(file_path, index_col=0)
+        emissions.index = pd.to_datetime(emissions.index)
+        emissions.columns = [x.lower() for x in emissions.columns]
+        return emissions
+    return cache.cached(cache.file_key(file_path, "emissions"), loader)
+
+
+def _load_wholesale_prices_file(file_path: str) -> pd.DataFrame:
+    """Read (and cache) the wholesale prices file. The returned dataframe is shared, do not modify it."""
+    def loader() -> pd.DataFrame:
+        df_SP = pd.read_csv(file_path, index_col=0)
+        df_SP.index = pd.to_datetime(df_SP.index).tz_localize(None)
+        return df_SP
+    return cache.cached(cache.file_key(file_path, "wholesale"), loader)
+
+
 def load_emission_index_year(
         timeseries: pd.DataFrame,
         location: str|Location = "Sydney",
@@ -169,11 +186,7 @@ def load_emission_index_year(
         "marginal": "marginal_index",
         }[index_type]
     
-    emissions = pd.read_csv(
-        FILES["EMISSIONS_TEMPLATE"].format(year, index_type), index_col=0,
-    )
-    emissions.index = pd.to_datetime(emissions.index)
-    emissions.columns = [x.lower() for x in emissions.columns]
+    emissions = _load_emissions_file( FILES["EMISSIONS_TEMPLATE"].format(year, index_type) )
 
     STEP = pd.to_datetime(timeseries.index).freq.n
     timeseries[columns] = emissions[
@@ -198,8 +211,7 @@ def load_wholesale_prices(
         pd.Series: timeseries with the wholesale price (in AUD/MWh)
     """
     
-    df_SP = pd.read_csv( FILES["WHOLESALE_PRICES"], index_col=0 )
-    df_SP.index = pd.to_datetime(df_SP.index).tz_localize(None)
+    df_SP = _load_wholesale_prices_file( FILES["WHOLESALE_PRICES"] )
 
     if type(location) == str:   #city
         nem_region = DEFINITIONS.LOCATIONS_NEM_REGION[location]
@@ -210,4 +222,44 @@ def load_wholesale_prices(
     ts = pd.Series(
         df_SP[nem_region].resample(f"{STEP}min").interpolate('linear')
     ).loc[ts_index]
-    return ts
\ No newline at end of file
+    return ts
+
+def prefetch_household_datasets(
+        location: str = "Sydney",
+        tariff_type: str = "flat",
+        control_type: str = "CL1",
+        year: int = 2022,
+        wholesale: bool = False,
+) -> None:
+    """Load into the datasets cache (see utils.cache) the tariff plans and emission files used by the economic analysis of a household, without processing them. Useful to warm the cache in the background (see utils.cache.Prefetcher).
+
+    Args:
+        location (str, optional): City of the household. Defaults to "Sydney".
+        tariff_type (str, optional): the tariff type. see DEFAULT.TARIFF_TYPES. Defaults to "flat".
+        control_type (str, optional): the control type used. see DEFAULT.CONTROL_TYPES. Defaults to "CL1".
+        year (int, optional): Year of the emissions. Defaults to 2022.
+        wholesale (bool, optional): Whether to load the wholesale prices too. Defaults to False.
+    """
+    dnsp = DEFINITIONS.LOCATIONS_DNSP[location].lower()
+    files_plans = [os.path.join(DIR_TARIFFS, f"{dnsp}_flat_plan.json"),]
+    if tariff_type == "CL":
+        control_type_ = "CL1" if control_type == "diverter" else control_type
+        files_plans.append(os.path.join(DIR_TARIFFS, f"{dnsp}_{control_type_}_plan.json"))
+    elif tariff_type == "gas":
+        files_plans.append(DIRECTORY.FILES_GAS_TARIFF[location])
+    elif tariff_type == "tou":
+        file_tou = os.path.join(DIR_TARIFFS, f"{dnsp}_tou_cache.csv")
+        if os.path.isfile(file_tou):
+            cache.read_csv(file_tou, index_col=0)
+    for file_path in files_plans:
+        if os.path.isfile(file_path):
+            cache.read_json(file_path)
+
+    if location in DEFINITIONS.LOCATIONS_NEM_REGION:
+        for index_type in ["total", "marginal"]:
+            file_path = FILES["EMISSIONS_TEMPLATE"].format(year, index_type)
+            if os.path.isfile(file_path):
+                _load_emissions_file(file_path)
+    if wholesale:
+        _load_wholesale_prices_file(FILES["WHOLESALE_PRICES"])
+    return None
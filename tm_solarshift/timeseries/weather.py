@@ -15,6 +15,7 @@ from tm_solarshift.utils.location import (
     Location,
     from_postcode
 )
+from tm_solarshift.utils import cache
 
 DIR_DATA = DIRECTORY.DIR_DATA
 DEFINITION_SEASON = DEFINITIONS.SEASON
@@ -122,10 +123,15 @@ def random_days_from_dataframe(
     df_sample: pd.DataFrame,
     seed_id: Optional[int] = None,
     columns: Optional[list[str]] = TS_WEATHER,
+    uniforms: Optional[np.ndarray] = None,
 ) -> pd.DataFrame :
     """
     This function randomly assign the weather variables of a set of days
-    to the timeseries DataFrame. It returns timeseries updated
+    to the timeseries DataFrame. It returns timeseries updated.
+    If uniforms (one number in [0,1) per day) are given, they pick the days
+    instead of seed_id, with the days of df_sample sorted by their mean
+    ambient temperature (low values are cold days). It allows antithetic,
+    quasi-random and biased sampling (see analysis.stochastic).
         
     Parameters
     ----------
@@ -155,8 +161,17 @@ def random_days_from_dataframe(
 
     list_dates = np.unique(df_sample_idx.date)
     DAYS = len(np.unique(ts_index.date))
-    list_picked_dates = rng.choice( list_dates, size=DAYS )
     df_sample_new["date"] = df_sample_idx.date
+    if uniforms is None:
+        list_picked_dates = rng.choice( list_dates, size=DAYS )
+    else:
+        uniforms = np.asarray(uniforms, dtype=float)
+        if len(uniforms) < DAYS:
+            raise ValueError(f"{len(uniforms)} uniforms given for {DAYS} days.")
+        temp_day = df_sample_new["temp_amb"].groupby(df_sample_idx.date).mean()
+        list_dates = temp_day.sort_values(kind="stable").index.to_numpy()
+        pos = np.clip((uniforms[:DAYS] * len(list_dates)).astype(int), 0, len(list_dates)-1)
+        list_picked_dates = list_dates[pos]
     set_picked_days = [
         df_sample_new[df_sample_new["date"]==date] for date in list_picked_dates
     ]
@@ -229,7 +244,7 @@ def from_file(
 
     """
     
-    set_days = pd.read_csv(file_path, index_col=0)
+    set_days = cache.read_csv(file_path, index_col=0)
     set_days.index = pd.to_datetime(set_days.index)
     if subset_random is None:
         pass
@@ -288,28 +303,38 @@ def load_dataset_meteonorm(
         START: int = 0,
         STEP: int = 3,
 ) -> pd.DataFrame:
+    return _dataset_meteonorm(location, YEAR, START, STEP).copy()
+
+
+def _dataset_meteonorm(
+        location: str,
+        YEAR: int = 2022,
+        START: int = 0,
+        STEP: int = 3,
+) -> pd.DataFrame:
+    """Read (and cache) a processed METEONORM file. The returned dataframe is shared, do not modify it."""
 
     if location not in DEFINITIONS.LOCATIONS_METEONORM:
         raise ValueError(f"location {location} not in available METEONORM files")
     
-    df_dataset = pd.read_csv(
-        os.path.join(
-            DIR_METEONORM,
-            FILES_WEATHER["METEONORM_TEMPLATE"].format(location),
-        ),
-        index_col=0
+    file_path = os.path.join(
+        DIR_METEONORM,
+        FILES_WEATHER["METEONORM_TEMPLATE"].format(location),
     )
-    PERIODS = len(df_dataset)
+    def loader() -> pd.DataFrame:
+        df_dataset = pd.read_csv(file_path, index_col=0)
+        PERIODS = len(df_dataset)
 
-    temp_mains = df_dataset["temp_mains"].to_numpy()
-    df_dataset["temp_mains"] = np.concatenate((temp_mains[PERIODS//2:], temp_mains[:PERIODS//2]))
+        temp_mains = df_dataset["temp_mains"].to_numpy()
+        df_dataset["temp_mains"] = np.concatenate((temp_mains[PERIODS//2:], temp_mains[:PERIODS//2]))
 
-    start_time = pd.to_datetime(f"{YEAR}-01-01 00:00:00") + pd.DateOffset(hours=START)
-    df_dataset.index = pd.date_range( start=start_time, periods=PERIODS, freq=f"{STEP}min")
-    df_dataset["date"] = df_dataset.index
-    df_dataset["date"] = df_dataset["date"].apply(lambda x: x.replace(year=YEAR))
-    df_dataset.index = pd.to_datetime(df_dataset["date"])
-    return df_dataset
+        start_time = pd.to_datetime(f"{YEAR}-01-01 00:00:00") + pd.DateOffset(hours=START)
+        df_dataset.index = pd.date_range( start=start_time, periods=PERIODS, freq=f"{STEP}min")
+        df_dataset["date"] = df_dataset.index
+        df_dataset["date"] = df_dataset["date"].apply(lambda x: x.replace(year=YEAR))
+        df_dataset.index = pd.to_datetime(df_dataset["date"])
+        return df_dataset
+    return cache.cached(cache.file_key(file_path, "meteonorm", YEAR, START, STEP), loader)
 
 
 def load_dataset_merra2(
@@ -378,8 +403,8 @@ def load_montecarlo(
         raise ValueError(f"dataset: {dataset} is not available.")
     
     df_dataset.index = pd.to_datetime(df_dataset.index)
-    if subset is None:
-        pass
+    if subset is None or subset == 'all':
+        df_sample = df_dataset
     elif subset == 'annual':
         df_sample = df_dataset[
             df_dataset.index.year==value
@@ -396,7 +421,10 @@ def load_montecarlo(
         df_sample = df_dataset[
             df_dataset.index.date==value.date()
             ]
-    df_weather = random_days_from_dataframe( ts, df_sample, columns=columns )
+    df_weather = random_days_from_dataframe(
+        ts, df_sample, seed_id=params.get("seed"), columns=columns,
+        uniforms=params.get("uniforms"),
+    )
     return df_weather
 
 #----------------
@@ -406,7 +434,7 @@ def load_historical(
     columns: Optional[list[str]] = TS_WEATHER,
 ) -> pd.DataFrame:
     file_path = params["file_path"]
-    ts_ = pd.read_csv(file_path, index_col=0)
+    ts_ = cache.read_csv(file_path, index_col=0)
     ts_.index = pd.to_datetime(ts.index)
     return ts_
 
@@ -430,12 +458,37 @@ def load_weather_data(
     elif type_sim == "historical":
         df_weather = load_historical(ts_, params, columns)
     elif type_sim == "constant_day":
-        df_weather = load_day_constant_random(ts_)
+        df_weather = load_day_constant_random(ts_, seed_id=params.get("seed"))
     else:
         raise ValueError(f"{type_sim} not in {TYPES_SIMULATION}")
     
     return df_weather
 
+#----------
+def prefetch_weather_data(
+        ts_index: pd.DatetimeIndex,
+        type_sim: str,
+        params: dict = {},
+) -> None:
+    """Load into the datasets cache (see utils.cache) the files that load_weather_data will read, without generating the timeseries. Useful to warm the cache in the background (see utils.cache.Prefetcher).
+
+    Args:
+        ts_index (pd.DatetimeIndex): The dataframe's index defined by the simulation.
+        type_sim (str): Type of simulation (see load_weather_data).
+        params (dict, optional): Weather parameters (see general.Weather.params). Defaults to {}.
+    """
+    if type_sim == "historical":
+        cache.read_csv(params["file_path"], index_col=0)
+        return None
+    if params.get("dataset") != "meteonorm":
+        return None
+    if type_sim == "tmy":
+        _dataset_meteonorm(params["location"], pd.to_datetime(ts_index).year[0])
+    elif type_sim == "mc":
+        _dataset_meteonorm(params["location"])
+    return None
+
+
 def main():
     #Creating a timeseries
     from tm_solarshift.general import Simulation
@@ -0,0 +1,276 @@
+import copy
+import json
+import os
+import threading
+import traceback
+import warnings
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Hashable, Iterator, Sequence
+
+import pandas as pd
+
+CACHE_MAXSIZE = 64
+# [hits, misses] of the requests made in the current context (see count_requests)
+_REQUESTS: ContextVar[list[int] | None] = ContextVar("cache_requests", default=None)
+# True in the thread of a Prefetcher, so its requests are not counted as hits/misses
+_PREFETCHING: ContextVar[bool] = ContextVar("cache_prefetching", default=False)
+
+#-------------------------
+class DatasetCache():
+    """In-memory LRU cache for the datasets read from DIR_DATA (weather files, HWDP, tariffs, emissions, etc.).
+    Each entry is keyed by a hashable key (usually the file path, the reading options and the file's modification time), so if a file changes in disk the cache is invalidated.
+    It is thread-safe: if two threads ask for the same key at the same time, the file is read only once.
+
+    Parameters:
+        maxsize (int): Maximum number of entries kept in memory. Defaults to CACHE_MAXSIZE.
+        hits (int): Number of requests served from memory, in all threads. To count the requests of one simulation, use count_requests.
+        misses (int): Number of requests that required reading the file, in all threads.
+        prefetched (int): Number of entries loaded by a Prefetcher. The requests of a Prefetcher are not counted as hits or misses, so the hit rate only includes the requests of the runs.
+    """
+    def __init__(self, maxsize: int = CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self._data: OrderedDict[Hashable, Any] = OrderedDict()
+        self._loading: dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get(
+            self,
+            key: Hashable,
+            loader: Callable[[], Any],
+    ) -> Any:
+        """Return the value for key. If it is not in memory, loader() is called and its result stored.
+
+        Args:
+            key (Hashable): Key of the entry.
+            loader (Callable[[], Any]): Function without arguments that loads the data.
+
+        Returns:
+            Any: The cached value. Do not modify it, the same object is returned in every call.
+        """
+        while True:
+            with self._lock:
+                counter = _REQUESTS.get()
+                prefetching = _PREFETCHING.get()
+                if key in self._data:
+                    self._data.move_to_end(key)
+                    if not prefetching:
+                        self.hits += 1
+                    if counter is not None:
+                        counter[0] += 1
+                    return self._data[key]
+                event = self._loading.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._loading[key] = event
+                    if prefetching:
+                        self.prefetched += 1
+                    else:
+                        self.misses += 1
+                    if counter is not None:
+                        counter[1] += 1
+                    break
+            # other thread is loading the same key
+            event.wait()
+
+        try:
+            value = loader()
+            with self._lock:
+                self._data[key] = value
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+        return value
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def clear(self) -> None:
+        """Remove all the entries and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.prefetched = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "prefetched": self.prefetched,
+                "size": len(self._data),
+            }
+
+
+DATASETS = DatasetCache()
+
+@contextmanager
+def count_requests() -> Iterator[list[int]]:
+    """Count the cache requests made in the current context, as [hits, misses]. The contexts copied from it (threads started with contextvars.copy_context, asyncio tasks) share the counter, while other threads have their own, so concurrent simulations do not count each other's requests (see utils.profiling)."""
+    counter = [0, 0]
+    token = _REQUESTS.set(counter)
+    try:
+        yield counter
+    finally:
+        _REQUESTS.reset(token)
+
+
+def requests_counter() -> list[int] | None:
+    """Counter of the current context (see count_requests), or None."""
+    return _REQUESTS.get()
+
+#-------------------------
+def file_key(file_path: str, *args: Hashable) -> tuple:
+    """Key for a file-based entry. It includes the modification time, so the entry is invalidated if the file changes."""
+    return (os.path.abspath(file_path), os.path.getmtime(file_path)) + args
+
+
+def cached(
+        key: Hashable,
+        loader: Callable[[], Any],
+) -> Any:
+    """Shortcut for ``DATASETS.get(key, loader)``."""
+    return DATASETS.get(key, loader)
+
+
+def read_csv(file_path: str, **kwargs) -> pd.DataFrame:
+    """Cached version of pd.read_csv. It returns a copy, so the result can be modified safely.
+
+    Args:
+        file_path (str): Path to the csv file.
+        **kwargs: Options passed to pd.read_csv. They must be hashable.
+
+    Returns:
+        pd.DataFrame: Dataframe with the file content.
+    """
+    key = file_key(file_path, "csv", tuple(sorted(kwargs.items())))
+    df = DATASETS.get(key, lambda: pd.read_csv(file_path, **kwargs))
+    return df.copy()
+
+
+def read_json(file_path: str) -> Any:
+    """Cached version of json.load. It returns a (deep) copy of the content.
+
+    Args:
+        file_path (str): Path to the json file.
+
+    Returns:
+        Any: The file content.
+    """
+    def loader():
+        with open(file_path) as f:
+            return json.load(f)
+    key = file_key(file_path, "json")
+    return copy.deepcopy(DATASETS.get(key, loader))
+
+
+#-------------------------
+class Prefetcher():
+    """Background thread that warms the datasets cache for the next items of a queue (e.g. the next runs of a parametric analysis), so the files are read while the current run is busy (e.g. waiting for TRNSYS).
+
+    The owner of the queue calls ``advance(i)`` when it starts with item i, and the thread warms the items i+1 to i+lookahead. An error in warm does not stop the thread: it is stored in ``errors`` and issued as a warning (if it comes from the item's data, it will be raised again when the item is actually run).
+
+    The requests of the thread are not counted in DatasetCache.hits/misses nor in the counters of count_requests (they are in ``requests``), so they are not credited to the runs in progress. Its allocations, however, are traced by tracemalloc as any other thread's. If a run measures its memory peak (utils.profiling.Profiler with trace_memory), run it inside ``paused()``.
+
+    Parameters:
+        items (Sequence): The queue.
+        warm (Callable[[Any], None]): Function that loads the datasets of one item into the cache.
+        lookahead (int): Number of items warmed ahead of the current one. Defaults to 2.
+        warmed (int): Number of items warmed so far.
+        requests (list[int]): Cache requests made by the thread, as [hits, misses].
+        errors (dict[int, str]): Errors of warm, as {position: error}.
+    """
+    def __init__(
+            self,
+            items: Sequence,
+            warm: Callable[[Any], None],
+            lookahead: int = 2,
+    ):
+        self.items = items
+        self.warm = warm
+        self.lookahead = lookahead
+        self.warmed = 0
+        self.requests = [0, 0]
+        self.errors: dict[int, str] = {}
+        self._current = -1
+        self._stop = False
+        self._paused = False
+        self._busy = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._worker, name="prefetcher", daemon=True)
+
+    def __enter__(self) -> "Prefetcher":
+        self.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the thread. The item being warmed (if any) is finished first."""
+        with self._condition:
+            self._stop = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def advance(self, position: int) -> None:
+        """Inform that the item in position is being run."""
+        with self._condition:
+            self._current = position
+            self._condition.notify_all()
+
+    @contextmanager
+    def paused(self) -> Iterator[None]:
+        """Context manager that stops warming while it is open. On entering, it waits for the item being warmed (if any) to finish."""
+        with self._condition:
+            self._paused = True
+            while self._busy:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._paused = False
+                self._condition.notify_all()
+
+    def _worker(self) -> None:
+        _PREFETCHING.set(True)
+        _REQUESTS.set(self.requests)
+        position = 0
+        while position < len(self.items):
+            with self._condition:
+                while not self._stop and (self._paused or position > self._current + self.lookahead):
+                    self._condition.wait()
+                if self._stop:
+                    return
+                position = max(position, self._current + 1)
+                if position >= len(self.items):
+                    return
+                self._busy = True
+            try:
+                self.warm(self.items[position])
+                self.warmed += 1
+            except Exception as error:
+                self.errors[position] = "".join(traceback.format_exception_only(error)).strip()
+                warnings.warn(f"prefetch of item {position} failed: {self.errors[position]}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+            position += 1
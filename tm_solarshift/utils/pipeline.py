@@ -0,0 +1,139 @@
+import queue
+import threading
+import time
+from typing import (Any, Callable, Iterable, Iterator)
+
+_DONE = object()
+_POLL = 0.1
+
+#-------------------------
+class Pipeline():
+    """Runs items through a sequence of stages. Each stage has its own threads, and the stages are connected by bounded queues, so the stages of different items run at the same time (e.g. the inputs of the next runs are prepared and the finished runs are postprocessed while other runs are being simulated).
+
+    The queues limit how far a stage can get ahead of the next one, so the memory held by the items in flight is bounded. The outputs are yielded in the order they finish. If a stage raises an exception, the pipeline stops and the exception is raised by ``run``.
+
+    Parameters:
+        stages (list[tuple[str, Callable[[Any], Any], int]]): (name, function, number of threads) of each stage. The function receives the output of the previous stage.
+        maxsize (int, optional): Size of the queue at the input of each stage. Defaults to 2.
+        busy (dict[str, float]): Time spent by the threads of each stage processing items [s].
+        idle (dict[str, float]): Time spent by the threads of each stage waiting for an item [s]. A stage with large idle time is starved by the previous one.
+    """
+    def __init__(
+            self,
+            stages: list[tuple[str, Callable[[Any], Any], int]],
+            maxsize: int = 2,
+    ):
+        self.stages = stages
+        self.maxsize = maxsize
+        self.busy = {name: 0. for (name, _, _) in stages}
+        self.idle = {name: 0. for (name, _, _) in stages}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: BaseException | None = None
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = error
+        self._stop.set()
+
+    def _feed(self, items: Iterable, q_out: queue.Queue, n_next: int) -> None:
+        try:
+            for item in items:
+                if not self._put(q_out, item):
+                    return
+        except BaseException as error:
+            self._fail(error)
+            return
+        for _ in range(n_next):
+            self._put(q_out, _DONE)
+
+    def _work(
+            self,
+            name: str,
+            function: Callable[[Any], Any],
+            q_in: queue.Queue,
+            q_out: queue.Queue,
+            remaining: list[int],
+            n_next: int,
+    ) -> None:
+        while True:
+            start = time.perf_counter()
+            item = self._get(q_in)
+            waited = time.perf_counter() - start
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                output = function(item)
+            except BaseException as error:
+                self._fail(error)
+                return
+            with self._lock:
+                self.idle[name] += waited
+                self.busy[name] += time.perf_counter() - start
+            if not self._put(q_out, output):
+                return
+        # the last thread of the stage closes the next one
+        with self._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            for _ in range(n_next):
+                self._put(q_out, _DONE)
+
+    def run(self, items: Iterable) -> Iterator[Any]:
+        """Process the items. It yields the output of the last stage of each item as soon as it is finished.
+
+        Args:
+            items (Iterable): Inputs of the first stage. They are read lazily.
+
+        Yields:
+            Iterator[Any]: Outputs of the last stage.
+        """
+        queues = [queue.Queue(maxsize=self.maxsize) for _ in self.stages] + [queue.Queue(maxsize=self.maxsize)]
+        threads = [threading.Thread(
+            target=self._feed, args=(items, queues[0], self.stages[0][2]),
+            name="pipeline-feed", daemon=True,
+        )]
+        for (i, (name, function, n_threads)) in enumerate(self.stages):
+            n_next = self.stages[i+1][2] if i + 1 < len(self.stages) else 1
+            remaining = [n_threads]
+            threads += [
+                threading.Thread(
+                    target=self._work, args=(name, function, queues[i], queues[i+1], remaining, n_next),
+                    name=f"pipeline-{name}-{j}", daemon=True,
+                )
+                for j in range(n_threads)
+            ]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                output = self._get(queues[-1])
+                if output is _DONE:
+                    break
+                yield output
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
@@ -0,0 +1,200 @@
+import time
+import tracemalloc
+from contextlib import (ExitStack, contextmanager)
+from contextvars import ContextVar
+from typing import Iterator, TypedDict
+
+import numpy as np
+import pandas as pd
+
+from tm_solarshift.utils.cache import (count_requests, requests_counter)
+
+TIMING_METRICS = ["wall_time", "cpu_time", "mem_peak", "cache_hits", "cache_misses"]
+
+class StageTimings(TypedDict):
+    """Resources used by one stage of a simulation.
+
+    Parameters:
+        wall_time (float): Elapsed time [s].
+        cpu_time (float): CPU time of the python process [s]. External processes (i.e. TRNSYS) are not included, so a large wall_time with a small cpu_time means waiting.
+        mem_peak (float): Peak of memory allocated during the stage, over the memory at the start [MB]. Only python allocations are traced (pandas and numpy included), and only if the profiler traces memory (otherwise 0).
+        cache_hits (int): Number of datasets served from the in-memory cache (see utils.cache), requested by this simulation.
+        cache_misses (int): Number of datasets read from their files, requested by this simulation.
+    """
+    wall_time: float
+    cpu_time: float
+    mem_peak: float
+    cache_hits: int
+    cache_misses: int
+
+
+_ACTIVE: ContextVar["Profiler | None"] = ContextVar("profiler", default=None)
+# stack of open stages, shared by all profilers. A ContextVar (and not a thread local) so each asyncio task has its own stack
+_STACK: ContextVar[tuple[list[float], ...]] = ContextVar("profiler_stack", default=())
+
+#-------------------------
+class Profiler():
+    """Records the wall time, CPU time, memory peak and cache hits/misses of each stage of a simulation.
+
+    Stages are defined with the ``stage`` context manager. They can be nested, in which case the outer stage includes the inner ones. If a stage name is repeated, the values are accumulated (mem_peak keeps the maximum).
+
+    Parameters:
+        timings (dict[str, StageTimings]): Results. A dictionary can be given to be updated.
+        trace_memory (bool): Whether to trace memory with tracemalloc, to measure mem_peak. It slows down the simulation noticeably, so it is only enabled when mem_peak is needed. tracemalloc is global to the process, so do not use it if several simulations run concurrently (e.g. with Simulation.run_simulation_async). Defaults to False.
+
+    The cache hits and misses are counted per context (see utils.cache.count_requests), so simulations running concurrently in other threads or asyncio tasks are not included.
+    """
+    def __init__(
+            self,
+            timings: dict[str, StageTimings] | None = None,
+            trace_memory: bool = False,
+    ):
+        self.timings: dict[str, StageTimings] = {} if timings is None else timings
+        self.trace_memory = trace_memory
+
+    @contextmanager
+    def activate(self) -> Iterator["Profiler"]:
+        """Set this profiler as the active one, so module level ``stage()`` calls (e.g. inside TrnsysDEWH) are recorded here."""
+        started_here = False
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            started_here = True
+        token = _ACTIVE.set(self)
+        try:
+            with count_requests():
+                yield self
+        finally:
+            _ACTIVE.reset(token)
+            if started_here:
+                tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Context manager to measure a stage.
+
+        Args:
+            name (str): Label of the stage.
+        """
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        stack = _STACK.get()
+        mem_start = 0.
+        if tracing:
+            if stack:
+                stack[-1][1] = max(stack[-1][1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        frame = [mem_start, mem_start]
+        token = _STACK.set(stack + (frame,))
+        counting = ExitStack()
+        counter = requests_counter()
+        if counter is None:
+            counter = counting.enter_context(count_requests())
+        (hits_start, misses_start) = counter
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = time.process_time() - cpu_start
+            cache_hits = counter[0] - hits_start
+            cache_misses = counter[1] - misses_start
+            counting.close()
+            _STACK.reset(token)
+            (mem_start, mem_peak) = frame
+            if tracing:
+                mem_peak = max(mem_peak, tracemalloc.get_traced_memory()[1])
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], mem_peak)
+            self._record(name, wall_time, cpu_time, (mem_peak - mem_start) / 2**20, cache_hits, cache_misses)
+
+    def _record(
+            self,
+            name: str,
+            wall_time: float,
+            cpu_time: float,
+            mem_peak: float,
+            cache_hits: int,
+            cache_misses: int,
+    ) -> None:
+        if name in self.timings:
+            previous = self.timings[name]
+            previous["wall_time"] += wall_time
+            previous["cpu_time"] += cpu_time
+            previous["mem_peak"] = max(previous["mem_peak"], mem_peak)
+            previous["cache_hits"] += cache_hits
+            previous["cache_misses"] += cache_misses
+        else:
+            self.timings[name] = {
+                "wall_time": wall_time,
+                "cpu_time": cpu_time,
+                "mem_peak": mem_peak,
+                "cache_hits": cache_hits,
+                "cache_misses": cache_misses,
+            }
+
+
+#-------------------------
+def get_active() -> Profiler | None:
+    """Return the active Profiler (None if there is not one)."""
+    return _ACTIVE.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Measure a stage with the active Profiler. If there is no active profiler it does nothing.
+
+    Args:
+        name (str): Label of the stage.
+    """
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
+
+
+def flatten_timings(timings: dict[str, StageTimings]) -> dict[str, float]:
+    """Convert the timings dictionary into a flat dictionary, with keys "{stage}_{metric}". Useful to add them as columns in a results table.
+
+    Args:
+        timings (dict[str, StageTimings]): Timings as stored in Simulation.out["timings"].
+
+    Returns:
+        dict[str, float]: Flat dictionary.
+    """
+    return {
+        f"{stage}_{metric}": float(values[metric])  # type: ignore[literal-required]
+        for (stage, values) in timings.items()
+        for metric in TIMING_METRICS
+    }
+
+
+def summary(
+        runs: pd.DataFrame,
+        metric: str = "wall_time",
+        quantiles: list[float] = [0.5, 0.95],
+) -> pd.DataFrame:
+    """Aggregate the timing columns of a parametric results table (see parametric.analysis) to identify the hot spots.
+
+    Args:
+        runs (pd.DataFrame): Results table with columns "{stage}_{metric}".
+        metric (str, optional): One of TIMING_METRICS. Defaults to "wall_time".
+        quantiles (list[float], optional): Quantiles to include. Defaults to [0.5, 0.95].
+
+    Returns:
+        pd.DataFrame: One row per stage with total, mean, quantiles and max, sorted by total.
+    """
+    suffix = f"_{metric}"
+    cols = [col for col in runs.columns if str(col).endswith(suffix)]
+    data = runs[cols].astype(float)
+    data.columns = [str(col)[:-len(suffix)] for col in cols]
+    df = pd.DataFrame({
+        "total": data.sum(),
+        "mean": data.mean(),
+    })
+    for q in quantiles:
+        df[f"p{int(np.round(q*100)):02d}"] = data.quantile(q)
+    df["max"] = data.max()
+    return df.sort_values("total", ascending=False)
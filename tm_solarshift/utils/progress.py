@@ -0,0 +1,144 @@
+import json
+import os
+import sys
+import time
+from typing import (Any, Hashable, TextIO)
+
+import numpy as np
+
+#-------------------------
+class ProgressTracker():
+    """Progress and performance metrics of a sweep: runs per minute, ETA, latency percentiles of each stage, failures and cache hit rate.
+
+    The metrics are calculated from the timings of each run ("{stage}_wall_time", "total_cache_hits" and "total_cache_misses", see utils.profiling). They are written periodically to a JSON status file (replaced atomically, so it can be read at any time), and optionally shown as a one-line bar in the terminal.
+
+    Parameters:
+        total (int): Number of runs of the sweep.
+        path_status (str | None, optional): JSON file with the metrics. Defaults to None.
+        interval (float, optional): Minimum seconds between updates of the file and the bar. Defaults to 5.
+        show_bar (bool, optional): Show a progress bar (updated in place) in stream. Defaults to False.
+        log (bool, optional): Print one line with the metrics on each update (for logs, where the bar is not useful). Defaults to False.
+        stream (TextIO, optional): Output of the bar and the log lines. Defaults to sys.stderr.
+    """
+    def __init__(
+            self,
+            total: int,
+            path_status: str | None = None,
+            interval: float = 5.,
+            show_bar: bool = False,
+            log: bool = False,
+            stream: TextIO = sys.stderr,
+    ):
+        self.total = total
+        self.path_status = path_status
+        self.interval = interval
+        self.show_bar = show_bar
+        self.log = log
+        self.stream = stream
+        self.done = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.latencies: dict[str, list[float]] = {}
+        self.time_start = time.time()
+        self._last_write = -np.inf
+
+    def __enter__(self) -> "ProgressTracker":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def update(
+            self,
+            results: dict[Hashable, dict[str, Any]] | None = None,
+            failed: int = 0,
+    ) -> None:
+        """Add finished runs.
+
+        Args:
+            results (dict[Hashable, dict[str, Any]] | None, optional): Output values (with timings) of each finished run. Defaults to None.
+            failed (int, optional): Number of failed runs. Defaults to 0.
+        """
+        results = {} if results is None else results
+        for values_out in results.values():
+            for (key, value) in values_out.items():
+                if key.endswith("_wall_time"):
+                    self.latencies.setdefault(key[:-len("_wall_time")], []).append(float(value))
+            self.cache_hits += int(values_out.get("total_cache_hits", 0))
+            self.cache_misses += int(values_out.get("total_cache_misses", 0))
+        self.done += len(results)
+        self.failed += failed
+        if time.time() - self._last_write >= self.interval:
+            self.write()
+
+    def metrics(self) -> dict[str, Any]:
+        """Current metrics.
+
+        Returns:
+            dict[str, Any]: "total", "done", "failed", "elapsed" [s], "runs_per_min", "eta" [s], "cache_hit_rate", and "latency" with {stage: {"p50", "p95", "count"}} in seconds.
+        """
+        elapsed = time.time() - self.time_start
+        finished = self.done + self.failed
+        rate = finished / elapsed if elapsed > 0 else 0.
+        remaining = self.total - finished
+        cache_total = self.cache_hits + self.cache_misses
+        return {
+            "total": self.total,
+            "done": self.done,
+            "failed": self.failed,
+            "elapsed": elapsed,
+            "runs_per_min": rate * 60.,
+            "eta": remaining / rate if rate > 0 else None,
+            "cache_hit_rate": self.cache_hits / cache_total if cache_total > 0 else None,
+            "latency": {
+                stage: {
+                    "p50": float(np.percentile(values, 50)),
+                    "p95": float(np.percentile(values, 95)),
+                    "count": len(values),
+                }
+                for (stage, values) in self.latencies.items()
+            },
+            "updated": time.time(),
+        }
+
+    def line(self, metrics: dict[str, Any] | None = None) -> str:
+        """One-line summary of the metrics, e.g. "120/500 (24%) | 12.3 runs/min | ETA 0:31:00 | p50 2.10s p95 4.05s | 0 failed | cache 87%"."""
+        m = self.metrics() if metrics is None else metrics
+        finished = m["done"] + m["failed"]
+        pct = 100. * finished / m["total"] if m["total"] > 0 else 100.
+        eta = "-" if m["eta"] is None else time.strftime("%H:%M:%S", time.gmtime(m["eta"]))
+        text = f"{finished}/{m['total']} ({pct:.0f}%) | {m['runs_per_min']:.1f} runs/min | ETA {eta}"
+        if "total" in m["latency"]:
+            latency = m["latency"]["total"]
+            text += f" | p50 {latency['p50']:.2f}s p95 {latency['p95']:.2f}s"
+        text += f" | {m['failed']} failed"
+        if m["cache_hit_rate"] is not None:
+            text += f" | cache {100. * m['cache_hit_rate']:.0f}%"
+        return text
+
+    def write(self) -> None:
+        """Write the status file and update the bar (it does not check the interval)."""
+        self._last_write = time.time()
+        metrics = self.metrics()
+        if self.path_status is not None:
+            path_tmp = f"{self.path_status}.tmp"
+            with open(path_tmp, "w") as file:
+                json.dump(metrics, file, indent=2)
+            os.replace(path_tmp, self.path_status)
+        if self.show_bar:
+            finished = metrics["done"] + metrics["failed"]
+            width = 20
+            filled = int(width * finished / self.total) if self.total > 0 else width
+            bar = "#" * filled + "." * (width - filled)
+            self.stream.write(f"\r[{bar}] {self.line(metrics)}")
+            self.stream.flush()
+        if self.log:
+            print(self.line(metrics), file=self.stream)
+
+    def close(self) -> None:
+        """Final update of the status file and the bar."""
+        self.write()
+        if self.show_bar:
+            self.stream.write("\n")
+            self.stream.flush()
@@ -0,0 +1,132 @@
+"""Worker of the parametric sweeps submitted to a WorkQueue (see analysis.workqueue).
+
+Start one in each machine that shares the queue file:
+
+    python -m tm_solarshift.worker path/to/queue.db
+
+"""
+import argparse
+import threading
+import time
+import traceback
+from typing import (Any, Callable)
+
+from tm_solarshift.analysis.workqueue import (Job, WorkQueue, default_worker_id)
+
+#-------------------------
+def run_job(
+        queue: WorkQueue,
+        job: Job,
+        config: dict[str, Any],
+) -> bool:
+    """Run a job with parametric.run_cases, renewing its lease while it runs.
+
+    Args:
+        queue (WorkQueue): Queue where the job was claimed.
+        job (Job): Claimed job.
+        config (dict[str, Any]): Configuration of the job's sweep (see WorkQueue.submit).
+
+    Returns:
+        bool: True if the job finished, False if it failed (the error is stored in the queue) or its results were discarded because the job was claimed by other worker.
+    """
+    from tm_solarshift.analysis.parametric import run_cases
+    finished = threading.Event()
+
+    def heartbeat() -> None:
+        while not finished.wait(queue.lease_time / 3.):
+            queue.renew(job)
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        results = run_cases(cases=job.cases, **config)
+    except Exception:
+        queue.fail(job, traceback.format_exc())
+        return False
+    finally:
+        finished.set()
+        thread.join()
+    return queue.complete(job, results)
+
+
+def work(
+        queue: WorkQueue,
+        sweep: str | None = None,
+        worker: str | None = None,
+        poll: float = 5.,
+        until_done: bool = False,
+        max_jobs: int | None = None,
+        on_progress: Callable[[], None] | None = None,
+        verbose: bool = True,
+) -> int:
+    """Claim and run jobs from a queue.
+
+    Args:
+        queue (WorkQueue): Queue with the jobs.
+        sweep (str | None, optional): Only run jobs of this sweep. Defaults to None (any sweep).
+        worker (str | None, optional): Worker identifier. Defaults to "{hostname}-{pid}".
+        poll (float, optional): Seconds between checks when there are no jobs available. Defaults to 5.
+        until_done (bool, optional): Return when the sweep (or all sweeps) has no pending or running jobs. Otherwise, it waits for new jobs forever. Defaults to False.
+        max_jobs (int | None, optional): Return after running this number of jobs. Defaults to None.
+        on_progress (Callable[[], None] | None, optional): Function called after each job and each check without jobs available, e.g. to collect the results of the sweep (of this and other workers) as they finish. Defaults to None.
+        verbose (bool, optional): Defaults to True.
+
+    Returns:
+        int: Number of jobs run.
+    """
+    worker = default_worker_id() if worker is None else worker
+    configs: dict[str, dict[str, Any]] = {}
+    n_jobs = 0
+    while max_jobs is None or n_jobs < max_jobs:
+        job = queue.claim(worker, sweep=sweep)
+        if job is None:
+            status = queue.status(sweep)
+            if until_done and status["pending"] + status["running"] == 0:
+                break
+            if on_progress is not None:
+                on_progress()
+            time.sleep(poll)
+            continue
+        if job.sweep not in configs:
+            configs[job.sweep] = queue.config(job.sweep)
+        if verbose:
+            print(f"{worker}: RUNNING JOB {job.id} (sweep {job.sweep}, cases {list(job.cases.index)})")
+        ok = run_job(queue, job, configs[job.sweep])
+        n_jobs += 1
+        if verbose and not ok:
+            print(f"{worker}: JOB {job.id} FAILED OR LOST ITS LEASE (attempt {job.attempts})")
+        if on_progress is not None:
+            on_progress()
+    return n_jobs
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m tm_solarshift.worker",
+        description="Run the parametric sweeps submitted to a work queue.",
+    )
+    parser.add_argument("queue", help="SQLite file of the work queue")
+    parser.add_argument("--sweep", default=None, help="only run jobs of this sweep")
+    parser.add_argument("--worker", default=None, help="worker identifier (default: hostname-pid)")
+    parser.add_argument("--lease", type=float, default=600., help="lease time in seconds")
+    parser.add_argument("--poll", type=float, default=5., help="seconds between checks for new jobs")
+    parser.add_argument("--until-done", action="store_true", help="exit when there are no pending or running jobs")
+    parser.add_argument("--max-jobs", type=int, default=None, help="exit after running this number of jobs")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    with WorkQueue(args.queue, lease_time=args.lease) as queue:
+        work(
+            queue,
+            sweep = args.sweep,
+            worker = args.worker,
+            poll = args.poll,
+            until_done = args.until_done,
+            max_jobs = args.max_jobs,
+            verbose = not args.quiet,
+        )
+    return None
+
+
+if __name__ == "__main__":
+    main()